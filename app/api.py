@@ -0,0 +1,263 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import ElasticsearchException
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+# Modules partagés avec le scraper (../scraper en local, copié dans /scraper dans l'image Docker)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from stats import STATS_COLLECTION, kpi_pipeline, merge_stats, stats_from_facets
+from publish import META_COLLECTION, DATA_VERSION_ID
+from indexing import INDEX_ALIAS
+import metrics
+from cache import QueryCache
+from queries import classic_query, fridge_query, paged_query, split_ingredients
+from pantry import PantryIndex
+from suggest import build_suggestions
+from similar import SIMILAR_COLLECTION
+from localsearch import LOCAL_FIELDS, LOCAL_INDEX_DIR, EsBreaker, LocalSearchIndex
+from service import (CATEGORIES, LIVE_FILTER, PANTRY_FIELDS, SUGGEST_FIELDS, CARD_FIELDS, SIMILAR_PROJECTION,
+                     MAX_RESULT_WINDOW, card_filter, materialized_kpis, pantry_page, pantry_response, stats_filter, to_results)
+
+logger = logging.getLogger("ScraperBot")
+
+# --- API REST ASYNCHRONE ---
+# Mêmes requêtes que l'app Streamlit (couche service), sans rerun de script par interaction :
+# clients Elasticsearch / Mongo asynchrones partagés par toutes les requêtes, avec un pool de
+# connexions chacun. Lancement : uvicorn api:app --host 0.0.0.0 --port 8000
+
+MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
+ELASTIC_HOST = os.getenv("ELASTIC_HOST", "localhost")
+ES_SEARCH_TIMEOUT = float(os.getenv("ES_SEARCH_TIMEOUT", "2"))
+ES_POOL_SIZE = int(os.getenv("API_ES_POOL_SIZE", "32"))
+MONGO_POOL_SIZE = int(os.getenv("API_MONGO_POOL_SIZE", "64"))
+VERSION_POLL_INTERVAL = float(os.getenv("API_VERSION_POLL_INTERVAL", "5"))
+DEFAULT_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = 100
+HIT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+class Backend:
+    """Clients partagés, cache de requêtes et index en mémoire de la version des données en ligne."""
+
+    def __init__(self):
+        self.es = AsyncElasticsearch([f"http://{ELASTIC_HOST}:9200"], maxsize=ES_POOL_SIZE)
+        self.mongo = AsyncIOMotorClient(f"mongodb://{MONGO_HOST}:27017/", maxPoolSize=MONGO_POOL_SIZE)
+        self.db = self.mongo["marmiton_db"]
+        # Pas de version_loader : la version est suivie par `watch_version`, qui vide le cache
+        self.cache = QueryCache(maxsize=int(os.getenv("QUERY_CACHE_SIZE", "256")),
+                                ttl=float(os.getenv("QUERY_CACHE_TTL", "300")))
+        self.breaker = EsBreaker()
+        self.version = None
+        self.pantry = None
+        self.suggest = None
+        self.local = None
+
+    async def data_version(self):
+        doc = await self.db[META_COLLECTION].find_one({"_id": DATA_VERSION_ID}, {"version": 1})
+        return doc["version"] if doc else 0
+
+    async def load_indexes(self):
+        # Lecture asynchrone, construction (numpy, tri) hors de la boucle d'événements
+        pantry_docs = await self.db["recipes"].find(LIVE_FILTER, PANTRY_FIELDS).to_list(None)
+        suggest_docs = await self.db["recipes"].find(LIVE_FILTER, SUGGEST_FIELDS).to_list(None)
+        self.pantry = await asyncio.to_thread(PantryIndex.from_docs, pantry_docs)
+        self.suggest = await asyncio.to_thread(build_suggestions, suggest_docs)
+        # Index BM25 de secours : relu sur disque s'il existe déjà pour cette version
+        local_docs = await self.db["recipes"].find(LIVE_FILTER, LOCAL_FIELDS).to_list(None)
+        os.makedirs(LOCAL_INDEX_DIR, exist_ok=True)
+        self.local = await asyncio.to_thread(LocalSearchIndex.open, LOCAL_INDEX_DIR, f"mongo:v{self.version}",
+                                             lambda: local_docs, self.local)
+        logger.info(f" API : index en mémoire prêts ({len(self.pantry)} recettes, v{self.version}).")
+
+    async def watch_version(self):
+        """Nouvelle version publiée -> cache vidé et index Frigo / suggestions reconstruits."""
+        while True:
+            try:
+                version = await self.data_version()
+                if version != self.version:
+                    if self.version is not None:
+                        self.cache.clear(invalidation=True)
+                    self.version = version
+                    await self.load_indexes()
+            except PyMongoError as e:
+                logger.warning(f" API : Mongo indisponible ({e}), index en mémoire inchangés.")
+            except Exception:
+                # Une erreur inattendue ne doit pas arrêter la surveillance des versions
+                logger.exception(" API : erreur pendant le rechargement des index, index en mémoire inchangés.")
+            await asyncio.sleep(VERSION_POLL_INTERVAL)
+
+    async def close(self):
+        await self.es.close()
+        self.mongo.close()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    backend = app.state.backend = Backend()
+    watcher = asyncio.create_task(backend.watch_version())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+        await backend.close()
+
+
+app = FastAPI(title="Marmiton API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Gabarit de la route (/recipes/{product_id}) et non le chemin : une série par endpoint
+    route = getattr(request.scope.get("route"), "path", "other")
+    metrics.observe("api_request_seconds", time.perf_counter() - start, route=route)
+    metrics.inc("api_requests_total", route=route, status=str(response.status_code))
+    return response
+
+
+def check_page(page, size):
+    if page * size > MAX_RESULT_WINDOW:
+        raise HTTPException(400, f"Fenêtre de résultats limitée à {MAX_RESULT_WINDOW} (page x size).")
+
+
+async def es_search(backend, mode, body, local_request):
+    """Recherche Elastic ; index local (même format de réponse) si le cluster est en panne ou trop lent."""
+    async def run():
+        with metrics.span("app_search", mode=mode):
+            resp = await backend.es.search(index=INDEX_ALIAS, body=body, request_timeout=ES_SEARCH_TIMEOUT)
+        metrics.observe("app_search_hits", resp["hits"]["total"]["value"], buckets=HIT_BUCKETS, mode=mode)
+        return resp
+
+    if backend.breaker.available():
+        try:
+            # Toujours l'alias : il bascule d'une génération à l'autre sans interruption
+            return await backend.cache.aget_or_compute(f"es:{INDEX_ALIAS}", body, run)
+        except ElasticsearchException as e:
+            backend.breaker.failed()
+            logger.warning(f" API : Elasticsearch indisponible ({type(e).__name__}), recherche locale.")
+    local = backend.local
+    if local is None:
+        raise HTTPException(503, "Elasticsearch indisponible et index local pas encore construit.")
+    page_num, page_size = body["from"] // body["size"] + 1, body["size"]
+
+    async def run_local():
+        with metrics.span("app_search", mode=mode.replace("api_", "api_local_")):
+            return await asyncio.to_thread(local.search, *local_request, page_num, page_size)
+    return await backend.cache.aget_or_compute(f"local:{local.meta['fingerprint']}",
+                                               [local_request, page_num, page_size], run_local)
+
+
+@app.get("/search")
+async def search(request: Request, q: str = Query(..., min_length=1), page: int = Query(1, ge=1),
+                 size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """Mode Classique : mot-clé sur le nom, les ingrédients et les étapes."""
+    check_page(page, size)
+    resp = await es_search(request.app.state.backend, "api_classique", paged_query(classic_query(q), page, size),
+                           ["classic", q])
+    return to_results(resp, page, size)
+
+
+@app.get("/fridge")
+async def fridge(request: Request, ingredients: str = Query(..., min_length=1), page: int = Query(1, ge=1),
+                 size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """Mode Frigo : `ingredients=oeufs,farine,lait`. Index en mémoire, ou Elasticsearch s'il n'est pas prêt."""
+    check_page(page, size)
+    backend = request.app.state.backend
+    pantry = split_ingredients(ingredients)
+    if not pantry:
+        raise HTTPException(400, "Aucun ingrédient.")
+    if backend.pantry is None:
+        resp = await es_search(backend, "api_frigo_es", paged_query(fridge_query(pantry), page, size),
+                               ["fridge", pantry])
+        return to_results(resp, page, size)
+
+    index = backend.pantry
+
+    async def run():
+        with metrics.span("app_search", mode="api_frigo_pantry"):
+            total, hits = await asyncio.to_thread(pantry_page, index, pantry, page, size)
+            cards = {doc["product_id"]: doc
+                     for doc in await backend.db["recipes"].find(card_filter(hits), CARD_FIELDS).to_list(None)}
+        return pantry_response(total, hits, cards)
+    resp = await backend.cache.aget_or_compute("pantry", [pantry, page, size], run)
+    return to_results(resp, page, size)
+
+
+@app.get("/recipes/{product_id}")
+async def recipe(request: Request, product_id: str):
+    backend = request.app.state.backend
+
+    async def run():
+        with metrics.span("app_mongo_query", query="recipe"):
+            return await backend.db["recipes"].find_one({"product_id": product_id}, {"_id": 0})
+    doc = await backend.cache.aget_or_compute("mongo:recipe_full", product_id, run)
+    if doc is None:
+        raise HTTPException(404, f"Recette {product_id} introuvable.")
+    return doc
+
+
+@app.get("/recipes/{product_id}/similar")
+async def similar(request: Request, product_id: str):
+    """Recettes similaires précalculées (collection `recipe_similar`)."""
+    backend = request.app.state.backend
+
+    async def run():
+        with metrics.span("app_mongo_query", query="similar"):
+            doc = await backend.db[SIMILAR_COLLECTION].find_one({"_id": product_id}, SIMILAR_PROJECTION)
+        return doc["similar"] if doc else []
+    return {"product_id": product_id, "similar": await backend.cache.aget_or_compute("mongo:similar", product_id, run)}
+
+
+@app.get("/stats")
+async def stats(request: Request, categories: list[str] = Query(CATEGORIES)):
+    """KPIs du dashboard : `recipe_stats` matérialisée, sinon agrégation $facet."""
+    backend = request.app.state.backend
+    cats = sorted(set(categories))
+
+    async def run():
+        with metrics.span("app_mongo_query", query="kpis"):
+            materialized = await backend.db[STATS_COLLECTION].find(stats_filter(cats)).to_list(None)
+            kpis = materialized_kpis(cats, materialized)
+            if kpis is None:
+                facets = await backend.db["recipes"].aggregate(kpi_pipeline(cats)).to_list(1)
+                kpis = merge_stats(list(stats_from_facets(facets[0] if facets else None).values()))
+        return {"categories": cats, **kpis}
+    return await backend.cache.aget_or_compute("mongo:kpis", cats, run)
+
+
+@app.get("/suggest")
+async def suggest(request: Request, q: str = Query(..., min_length=1), k: int = Query(8, ge=1, le=50)):
+    backend = request.app.state.backend
+    if backend.suggest is None:
+        return {"names": [], "ingredients": []}
+    names, ingredients = backend.suggest
+    with metrics.span("app_suggest"):
+        return {"names": names.suggest(q, k), "ingredients": ingredients.suggest(q, k)}
+
+
+@app.get("/health")
+async def health(request: Request):
+    backend = request.app.state.backend
+    status = {"version": backend.version, "pantry_ready": backend.pantry is not None}
+    try:
+        await backend.db.command("ping")
+        status["mongo"] = "ok"
+    except PyMongoError as e:
+        status["mongo"] = str(e)
+    status["elasticsearch"] = "ok" if await backend.es.ping() else "unreachable"
+    return status
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,96 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Cache LRU + TTL des résultats de requêtes (Elasticsearch, Mongo), partagé entre sessions.
+
+    La clé est la requête normalisée (JSON trié). Le cache est vidé dès que la
+    version des données publiée par le scraper / restore_data.py change ; cette
+    version n'est relue qu'une fois toutes les `version_check_interval` secondes.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, version_loader=None, version_check_interval=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_loader = version_loader
+        self.version_check_interval = version_check_interval
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+
+    @staticmethod
+    def make_key(namespace, query):
+        return namespace + ":" + json.dumps(query, sort_keys=True, ensure_ascii=False, default=str)
+
+    def _check_version(self):
+        if self.version_loader is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._version_checked_at < self.version_check_interval:
+                return
+            self._version_checked_at = now  # un seul appelant relit la version par intervalle
+        # Lecture hors verrou : Mongo lent ou absent ne bloque pas les lectures du cache des autres sessions
+        try:
+            version = self.version_loader()
+        except Exception:
+            return
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+                self.stats["invalidations"] += 1
+            self._version = version
+
+    def _lookup(self, key):
+        self._check_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return True, entry[1]
+            self.stats["misses"] += 1
+            return False, None
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_or_compute(self, namespace, query, compute):
+        """Renvoie le résultat en cache pour (namespace, query), sinon l'obtient via `compute()`."""
+        key = self.make_key(namespace, query)
+        found, value = self._lookup(key)
+        if found:
+            return value
+        # Calcul hors verrou : une requête lente ne bloque pas les autres sessions
+        value = compute()
+        self._store(key, value)
+        return value
+
+    async def aget_or_compute(self, namespace, query, compute):
+        """Variante asynchrone (API) : `compute()` renvoie une coroutine."""
+        key = self.make_key(namespace, query)
+        found, value = self._lookup(key)
+        if found:
+            return value
+        value = await compute()
+        self._store(key, value)
+        return value
+
+    def clear(self, invalidation=False):
+        with self._lock:
+            self._entries.clear()
+            if invalidation:
+                self.stats["invalidations"] += 1
+
+    def __len__(self):
+        return len(self._entries)
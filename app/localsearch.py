@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+from bisect import bisect_left
+
+import numpy as np
+
+# Modules partagés avec le scraper (../scraper en local, copié dans /scraper dans l'image Docker)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from ingredients import RE_WORD, STOPWORDS, fold, singular
+from queries import LIST_FIELDS
+
+logger = logging.getLogger("ScraperBot")
+
+# --- RECHERCHE LOCALE (SECOURS D'ELASTICSEARCH) ---
+# Index inversé BM25 embarqué, construit depuis Mongo ou le snapshot local et écrit sur disque
+# (tableaux NumPy relus en mmap : un redémarrage ne recalcule rien). Même normalisation que
+# l'analyseur `french_folded` (minuscules, accents, élisions, pluriels) et même format de réponse
+# qu'Elasticsearch : l'app bascule dessus quand le cluster ne répond pas, ou avec SEARCH_BACKEND=local.
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+K1, B = 1.2, 0.75
+# Champ "all" (mode Classique) : BM25F simplifié, une occurrence dans le nom pèse plus
+FIELD_WEIGHTS = {"name": 3.0, "ingredients": 2.0, "steps": 1.0}
+FIELDS = ("all", "ingredients")
+DOC_FIELDS = LIST_FIELDS + ["ingredients", "steps", "url"]
+LOCAL_FIELDS = {"_id": 0, "duplicate_of": 1, **{f: 1 for f in DOC_FIELDS}}
+FORMAT_VERSION = 1
+KEEP_BUILDS = 2
+
+
+def analyze(text):
+    """Texte -> termes : minuscules, accents et élisions supprimés, mots vides retirés, singulier."""
+    return [singular(w) for w in RE_WORD.findall(fold(text or "")) if w not in STOPWORDS]
+
+
+def _field_terms(doc):
+    texts = {"name": doc.get("name"), "ingredients": " ".join(doc.get("ingredients") or []),
+             "steps": " ".join(doc.get("steps") or [])}
+    all_terms, ingredient_terms = {}, {}
+    for field, text in texts.items():
+        for term in analyze(text):
+            all_terms[term] = all_terms.get(term, 0.0) + FIELD_WEIGHTS[field]
+            if field == "ingredients":
+                ingredient_terms[term] = ingredient_terms.get(term, 0.0) + 1.0
+    return {"all": all_terms, "ingredients": ingredient_terms}
+
+
+def _within_edits(a, b, max_edits):
+    """Distance de Levenshtein <= max_edits (bornée : on abandonne dès que la ligne dépasse)."""
+    if abs(len(a) - len(b)) > max_edits:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_edits:
+            return False
+        previous = current
+    return previous[-1] <= max_edits
+
+
+class FieldIndex:
+    """Listes de postings d'un champ au format CSR : termes triés, (recette, tf) par terme."""
+
+    def __init__(self, vocab, indptr, docs, tfs, lengths):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.avgdl = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+    @classmethod
+    def build(cls, rows):
+        vocab = sorted({t for row in rows for t in row})
+        ids = {t: i for i, t in enumerate(vocab)}
+        term_ids = np.fromiter((ids[t] for row in rows for t in row), dtype=np.int32)
+        doc_ids = np.repeat(np.arange(len(rows), dtype=np.int32), [len(row) for row in rows])
+        tfs = np.fromiter((tf for row in rows for tf in row.values()), dtype=np.float32)
+        order = np.argsort(term_ids, kind="stable")
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=indptr[1:])
+        lengths = np.fromiter((sum(row.values()) for row in rows), dtype=np.float32, count=len(rows))
+        return cls(vocab, indptr, doc_ids[order], tfs[order], lengths)
+
+    def save(self, path, name):
+        with open(os.path.join(path, f"{name}.vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        for part in ("indptr", "docs", "tfs", "lengths"):
+            np.save(os.path.join(path, f"{name}.{part}.npy"), getattr(self, part))
+
+    @classmethod
+    def load(cls, path, name):
+        with open(os.path.join(path, f"{name}.vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        arrays = [np.load(os.path.join(path, f"{name}.{part}.npy"), mmap_mode="r")
+                  for part in ("indptr", "docs", "tfs", "lengths")]
+        return cls(vocab, *arrays)
+
+    def lookup(self, term, prefix=False, fuzzy=False):
+        """Identifiants des termes du vocabulaire : exact, début de mot, ou faute de frappe (fuzziness AUTO)."""
+        lo = bisect_left(self.vocab, term)
+        if not prefix and lo < len(self.vocab) and self.vocab[lo] == term:
+            return [lo]
+        if prefix:
+            hi = bisect_left(self.vocab, term + "\uffff", lo)
+            if hi > lo:
+                return list(range(lo, hi))
+        if not fuzzy or len(term) < 3:
+            return []
+        max_edits = 1 if len(term) <= 5 else 2
+        # Comme Elasticsearch (prefix_length=0 mais premier caractère presque toujours juste) : même initiale
+        lo, hi = bisect_left(self.vocab, term[0]), bisect_left(self.vocab, term[0] + "\uffff")
+        return [i for i in range(lo, hi) if _within_edits(term, self.vocab[i], max_edits)]
+
+    def bm25(self, term_ids, n_docs):
+        """Scores BM25 d'un groupe de termes (variantes d'un même mot : on garde la meilleure)."""
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for t in term_ids:
+            docs = self.docs[self.indptr[t]:self.indptr[t + 1]]
+            tfs = self.tfs[self.indptr[t]:self.indptr[t + 1]]
+            idf = np.log1p((n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[docs] / self.avgdl)
+            np.maximum.at(scores, docs, idf * tfs * (K1 + 1) / (tfs + norm))
+        return scores
+
+
+class LocalSearchIndex:
+    """Moteur de recherche embarqué : modes Classique et Frigo, réponses au format Elasticsearch."""
+
+    def __init__(self, path, fields, product_ids, offsets, meta):
+        self.path = path
+        self.fields = fields
+        self.product_ids = product_ids
+        self.rows = {pid: i for i, pid in enumerate(product_ids)}
+        self.offsets = offsets
+        self.meta = meta
+        # mmap comme les tableaux : libéré par le GC quand plus aucune recherche n'utilise cet index
+        docs = os.path.join(path, "docs.jsonl")
+        self._docs = np.memmap(docs, dtype=np.uint8, mode="r") if os.path.getsize(docs) else b""
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    # --- Construction / chargement ---
+    @staticmethod
+    def build_dir(root, fingerprint):
+        key = hashlib.sha1(f"{FORMAT_VERSION}:{fingerprint}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(root, key)
+
+    @classmethod
+    def build(cls, docs, root, fingerprint):
+        start = time.time()
+        path = cls.build_dir(root, fingerprint)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        product_ids, offsets, rows = [], [0], {name: [] for name in FIELDS}
+        with open(os.path.join(tmp, "docs.jsonl"), "wb") as f:
+            for doc in docs:
+                # Quasi-doublons exclus, comme dans l'index Elastic interrogé par l'app
+                if doc.get("duplicate_of") or not doc.get("product_id"):
+                    continue
+                terms = _field_terms(doc)
+                for name in FIELDS:
+                    rows[name].append(terms[name])
+                product_ids.append(doc["product_id"])
+                line = json.dumps({f: doc.get(f) for f in DOC_FIELDS}, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        for name in FIELDS:
+            FieldIndex.build(rows[name]).save(tmp, name)
+        np.save(os.path.join(tmp, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        meta = {"format": FORMAT_VERSION, "fingerprint": fingerprint, "count": len(product_ids),
+                "built_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(os.path.join(tmp, "product_ids.json"), "w") as f:
+            json.dump(product_ids, f)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        # Renommage atomique : un autre processus ne voit jamais d'index à moitié écrit
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # construit en parallèle par un autre processus
+        logger.info(f" Index de recherche locale construit : {len(product_ids)} recettes en {time.time() - start:.2f}s.")
+        cls.prune(root, keep=path)
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "product_ids.json")) as f:
+            product_ids = json.load(f)
+        fields = {name: FieldIndex.load(path, name) for name in FIELDS}
+        return cls(path, fields, product_ids, np.load(os.path.join(path, "offsets.npy"), mmap_mode="r"), meta)
+
+    @classmethod
+    def open(cls, root, fingerprint, load_docs, current=None):
+        """Index de cette version des données : `current` s'il y correspond déjà, relu sur disque s'il
+        existe, construit sinon."""
+        if current is not None and current.meta["fingerprint"] == fingerprint:
+            return current
+        path = cls.build_dir(root, fingerprint)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            return cls.load(path)
+        return cls.build(load_docs(), root, fingerprint)
+
+    @staticmethod
+    def prune(root, keep, builds=KEEP_BUILDS):
+        # Un index encore ouvert par un autre processus reste lisible (fichiers mmap) après suppression
+        others = sorted((os.path.join(root, name) for name in os.listdir(root)
+                         if os.path.join(root, name) != keep and ".tmp-" not in name),
+                        key=os.path.getmtime, reverse=True)
+        for path in others[max(builds - 1, 0):]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    # --- Requêtes ---
+    def classic(self, query, page_num, page_size):
+        """Mode Classique : au moins un mot (tolérance aux fautes), BM25F sur nom / ingrédients / étapes."""
+        field = self.fields["all"]
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in dict.fromkeys(analyze(query)):
+            scores += field.bm25(field.lookup(term, fuzzy=True), len(self))
+        return self._response(scores, page_num, page_size)
+
+    def fridge(self, ingredients, page_num, page_size):
+        """Mode Frigo : au moins un ingrédient, dont tous les mots (ou débuts de mot) sont dans la recette."""
+        field = self.fields["ingredients"]
+        scores = np.zeros(len(self), dtype=np.float32)
+        for ingredient in ingredients:
+            terms = analyze(ingredient)
+            if not terms:
+                continue
+            matched = np.ones(len(self), dtype=bool)
+            ingredient_scores = np.zeros(len(self), dtype=np.float32)
+            for term in terms:
+                term_scores = field.bm25(field.lookup(term, prefix=True), len(self))
+                matched &= term_scores > 0
+                ingredient_scores += term_scores
+            scores += np.where(matched, ingredient_scores, 0)
+        return self._response(scores, page_num, page_size)
+
+    def search(self, kind, value, page_num, page_size):
+        """`kind` : "classic" (texte saisi) ou "fridge" (liste d'ingrédients)."""
+        if kind == "fridge":
+            return self.fridge(value, page_num, page_size)
+        return self.classic(value, page_num, page_size)
+
+    def document(self, product_id):
+        """Recette stockée avec l'index (ingrédients, étapes, url) : détail des cartes sans Mongo."""
+        row = self.rows.get(product_id)
+        return self._doc(row) if row is not None else None
+
+    def _doc(self, row):
+        start, stop = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(bytes(self._docs[start:stop]))
+
+    def _response(self, scores, page_num, page_size):
+        candidates = np.flatnonzero(scores > 0)
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        start = (page_num - 1) * page_size
+        hits = []
+        for row in order[start:start + page_size]:
+            doc = self._doc(row)
+            hits.append({"_id": self.product_ids[row], "_score": float(scores[row]),
+                         "_source": {f: doc.get(f) for f in LIST_FIELDS}})
+        return {"hits": {"total": {"value": len(candidates)}, "hits": hits}, "local": True}
+
+
+class EsBreaker:
+    """Coupe-circuit : après un échec (erreur, délai dépassé), Elasticsearch n'est retenté
+    qu'au bout de `retry_after` secondes ; entre-temps les recherches vont à l'index local."""
+
+    def __init__(self, retry_after=float(os.getenv("ES_RETRY_AFTER", "30"))):
+        self.retry_after = retry_after
+        self.down_until = 0.0
+
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    def failed(self):
+        self.down_until = time.monotonic() + self.retry_after
+
+
+def snapshot_source(source=None):
+    """(empreinte, chargeur) du snapshot local (LOCAL_SEARCH_SOURCE, sinon snapshot / marmiton_data.json)."""
+    from snapshot import MANIFEST, find_snapshot, iter_snapshot
+
+    source = source or os.getenv("LOCAL_SEARCH_SOURCE") or find_snapshot()
+    if source is None:
+        return None, None
+    stamp = os.path.join(source, MANIFEST) if os.path.isdir(source) else source
+    st = os.stat(stamp)
+    return f"file:{os.path.abspath(source)}:{int(st.st_mtime)}:{st.st_size}", lambda: iter_snapshot(source)
+
+
+def mongo_source(db):
+    """(empreinte, chargeur) de la collection en ligne, versionnée par `data_version`."""
+    from publish import get_data_version
+
+    version = get_data_version(db)
+    return f"mongo:v{version}", lambda: db["recipes"].find({}, LOCAL_FIELDS)
+
+
+def open_local_index(db=None, root=LOCAL_INDEX_DIR, current=None):
+    """Index local de la version en ligne (Mongo), ou du snapshot si Mongo ne répond pas ou est vide ;
+    None sans données. `current` (index déjà ouvert) est gardé tel quel si les données n'ont pas changé."""
+    os.makedirs(root, exist_ok=True)
+    if db is not None:
+        try:
+            fingerprint, load = mongo_source(db)
+            index = LocalSearchIndex.open(root, fingerprint, load, current)
+            if len(index):
+                return index
+            logger.warning(" Recherche locale : collection Mongo vide, lecture du snapshot.")
+        except Exception as e:
+            logger.warning(f" Recherche locale : Mongo indisponible ({type(e).__name__}), lecture du snapshot.")
+    fingerprint, load = snapshot_source()
+    if fingerprint is None:
+        return None
+    return LocalSearchIndex.open(root, fingerprint, load, current)
+
+
+if __name__ == "__main__":
+    # Construction à l'avance (ex: image Docker, poste de dev sans Elasticsearch) puis requête de test
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    fingerprint, load = snapshot_source(sys.argv[1] if len(sys.argv) > 1 else None)
+    if fingerprint is None:
+        sys.exit("Aucun snapshot trouvé.")
+    index = LocalSearchIndex.open(LOCAL_INDEX_DIR, fingerprint, load)
+    for hit in index.classic(sys.argv[2] if len(sys.argv) > 2 else "chocolat", 1, 5)["hits"]["hits"]:
+        print(f"{hit['_score']:.2f}  {hit['_source']['name']}")
@@ -2,8 +2,29 @@ import streamlit as st
 from elasticsearch import Elasticsearch
 from pymongo import MongoClient
 import os
+import sys
+import time
+import threading
 import pandas as pd
 
+# Modules partagés avec le scraper (../scraper en local, copié dans /scraper dans l'image Docker)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from stats import STATS_COLLECTION, compute_category_stats, merge_stats
+from publish import get_data_version
+from indexing import INDEX_ALIAS
+import metrics
+from cache import QueryCache
+from queries import classic_query, fridge_query, paged_query, split_ingredients
+from pantry import PantryIndex
+from thumbs import start_thumbnail_server, thumbnail_url
+from suggest import build_suggestions
+from similar import SIMILAR_COLLECTION
+from localsearch import EsBreaker, open_local_index
+from service import (CATEGORIES, LIVE_FILTER, PANTRY_FIELDS, SUGGEST_FIELDS, CARD_FIELDS, DETAIL_FIELDS, PREVIEW_FIELDS,
+                     SIMILAR_PROJECTION,
+                     card_filter, materialized_kpis, page_count, pantry_page, pantry_response,
+                     preview_filter, stats_filter)
+
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Marmiton Data Project", page_icon="👨‍🍳", layout="wide")
@@ -11,12 +32,17 @@ st.set_page_config(page_title="Marmiton Data Project", page_icon="👨‍🍳",
 # Connexion aux services Docker (ou localhost si lancé en local)
 MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
 ELASTIC_HOST = os.getenv("ELASTIC_HOST", "localhost")
+# `local` : recherche sur l'index embarqué uniquement (poste de dev sans Elasticsearch)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "elastic")
+ES_SEARCH_TIMEOUT = float(os.getenv("ES_SEARCH_TIMEOUT", "2"))
 
 @st.cache_resource
 def init_connection():
     try:
-        es = Elasticsearch([f"http://{ELASTIC_HOST}:9200"])
-        client = MongoClient(f"mongodb://{MONGO_HOST}:27017/")
+        es = Elasticsearch([f"http://{ELASTIC_HOST}:9200"]) if SEARCH_BACKEND != "local" else None
+        # Délai court : un Mongo absent ne doit pas figer chaque interaction 30 s
+        client = MongoClient(f"mongodb://{MONGO_HOST}:27017/",
+                             serverSelectionTimeoutMS=int(os.getenv("MONGO_TIMEOUT_MS", "5000")))
         db = client["marmiton_db"]
         return es, db
     except Exception as e:
@@ -24,48 +50,206 @@ def init_connection():
 
 es, db = init_connection()
 
+# Recherche : pagination de la liste de résultats (le détail est chargé à la demande)
+DEFAULT_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+PAGE_SIZES = sorted({10, 20, 50, DEFAULT_PAGE_SIZE})
+
+@st.cache_resource
+def get_query_cache():
+    # Un seul cache pour toutes les sessions ; vidé quand le scraper / restore_data.py publie une nouvelle version
+    return QueryCache(
+        maxsize=int(os.getenv("QUERY_CACHE_SIZE", "256")),
+        ttl=float(os.getenv("QUERY_CACHE_TTL", "300")),
+        version_loader=(lambda: get_data_version(db)) if db is not None else None,
+    )
+
+query_cache = get_query_cache()
+
+
+@st.cache_resource
+def start_thumbnails():
+    # Vignettes générées par le scraper (volume THUMB_DIR), servies avec des en-têtes de cache longs
+    try:
+        return start_thumbnail_server()
+    except OSError as e:
+        st.warning(f"Serveur de vignettes indisponible : {e}")
+        return None
+
+
+@st.cache_resource
+def start_metrics():
+    # Un seul exporteur pour toutes les sessions (METRICS_PORT / METRICS_FILE)
+    metrics.start_exporter_from_env()
+    return True
+
+start_metrics()
+start_thumbnails()
+HIT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def timed_search(mode, run):
+    """Recherche exécutée (cache manqué) : latence et nombre de résultats par mode."""
+    with metrics.span("app_search", mode=mode):
+        resp = run()
+    metrics.observe("app_search_hits", resp["hits"]["total"]["value"], buckets=HIT_BUCKETS, mode=mode)
+    return resp
+
+
+def load_kpis(cats):
+    with metrics.span("app_mongo_query", query="kpis"):
+        return _load_kpis(cats)
+
+
+def _load_kpis(cats):
+    # KPIs calculés côté Mongo : collection matérialisée `recipe_stats` (mise à jour par le scraper),
+    # ou agrégation $facet projetée si elle n'est pas encore disponible pour ces catégories
+    kpis = materialized_kpis(cats, list(db[STATS_COLLECTION].find(stats_filter(cats))))
+    if kpis is None:
+        kpis = merge_stats(list(compute_category_stats(db["recipes"], cats).values()))
+    return kpis
+
+
+def load_recipe_details(product_id, local=False):
+    """Ingrédients / étapes d'une recette, lus dans Mongo au moment où la carte est ouverte
+    (dans l'index local si la recherche y est passée)."""
+    def fetch():
+        if local or db is None:
+            index = get_local_search()
+            return (index.document(product_id) if index else None) or {}
+        return db["recipes"].find_one({"product_id": product_id}, DETAIL_FIELDS) or {}
+    return query_cache.get_or_compute("local:recipe" if local else "mongo:recipe", product_id, fetch)
+
+
+def load_similar(product_id):
+    """Recettes similaires précalculées par le scraper / restore_data.py (une lecture, aucun calcul)."""
+    def fetch():
+        if db is None:
+            return []
+        try:
+            doc = db[SIMILAR_COLLECTION].find_one({"_id": product_id}, SIMILAR_PROJECTION)
+        except Exception:
+            return []
+        return doc["similar"] if doc else []
+    return query_cache.get_or_compute("mongo:similar", product_id, fetch)
+
+
+@st.cache_resource
+def get_es_breaker():
+    return EsBreaker()
+
+es_breaker = get_es_breaker()
+
+
+@st.cache_resource
+def get_local_state():
+    # Partagé par toutes les sessions ; construit (ou relu sur disque) en tâche de fond dès le démarrage
+    state = {"index": None, "error": None, "checked_at": 0.0, "lock": threading.Lock()}
+    threading.Thread(target=refresh_local_search, args=(state,), name="local-search", daemon=True).start()
+    return state
+
+
+def refresh_local_search(state):
+    """Index de recherche local de la version en ligne, revérifiée au plus toutes les 30 s."""
+    with state["lock"]:
+        if state["index"] is None or time.monotonic() - state["checked_at"] > 30:
+            try:
+                state["index"] = open_local_index(db, current=state["index"]) or state["index"]
+                state["error"] = None if state["index"] else "aucune donnée (Mongo ni snapshot)"
+            except Exception as e:
+                state["error"] = f"{type(e).__name__}: {e}"
+            state["checked_at"] = time.monotonic()
+        return state["index"]
+
+
+def get_local_search():
+    return refresh_local_search(get_local_state())
+
+get_local_state()  # construction de l'index de secours lancée dès le démarrage
+
+
+@st.cache_resource
+def get_pantry_index(version):
+    # Index recette x ingrédient en mémoire, reconstruit seulement quand une nouvelle version des données est publiée
+    return PantryIndex.from_docs(db["recipes"].find(LIVE_FILTER, PANTRY_FIELDS))
+
+
+@st.cache_resource
+def get_suggest_index(version):
+    # Suggestions (noms de recettes, ingrédients) en mémoire, reconstruites à chaque nouvelle version des données
+    return build_suggestions(db["recipes"].find(LIVE_FILTER, SUGGEST_FIELDS))
+
+
+def suggest(text, names=5, ingredients=3):
+    """Libellés proposés pour une saisie partielle : ingrédients d'abord, puis noms de recettes."""
+    if db is None or not text.strip():
+        return []
+    try:
+        name_index, ingredient_index = get_suggest_index(get_data_version(db))
+    except Exception:
+        return []  # Mongo indisponible : pas de suggestions, la recherche reste utilisable
+    with metrics.span("app_suggest"):
+        labels = [s["label"] for s in ingredient_index.suggest(text, ingredients)] + \
+                 [s["label"] for s in name_index.suggest(text, names)]
+    return list(dict.fromkeys(labels))
+
+
+def show_suggestions(labels, key, apply):
+    """Suggestions cliquables sous le champ de recherche ; `apply(label)` met à jour la saisie."""
+    if not labels:
+        return
+    cols = st.columns(len(labels))
+    for col, label in zip(cols, labels):
+        col.button(label if len(label) <= 28 else label[:27] + "…", key=f"{key}-{label}",
+                   on_click=apply, args=(label,), use_container_width=True)
+
+
+def pantry_search(pantry, page_num, page_size):
+    """Mode Frigo : recettes classées par couverture du frigo, au même format qu'une réponse Elastic."""
+    total, page = pantry_page(get_pantry_index(get_data_version(db)), pantry, page_num, page_size)
+    cards = {doc["product_id"]: doc for doc in db["recipes"].find(card_filter(page), CARD_FIELDS)}
+    return pantry_response(total, page, cards)
+
+
+def load_preview(cats):
+    return list(db["recipes"].find(preview_filter(cats), PREVIEW_FIELDS).limit(10))
+
 # --- SIDEBAR NAVIGATION ---
 st.sidebar.title("👨‍🍳 Navigation")
 page = st.sidebar.radio("Menu", ["Dashboard & KPIs", "Moteur de Recherche", "Specs & Doc"])
 
 st.sidebar.markdown("---")
 st.sidebar.header("Filtres Dynamiques")
-selected_cats = st.sidebar.multiselect("Catégories", ["entree", "plat-principal", "dessert"], default=["plat-principal"])
+selected_cats = st.sidebar.multiselect("Catégories", CATEGORIES, default=["plat-principal"])
 
 # --- PAGE 1: DASHBOARD ---
 if page == "Dashboard & KPIs":
     st.title(" Dashboard Analytique")
     
     if db is not None:
-        # Récupération des données Mongo pour les stats
-        recipes = list(db["recipes"].find({"category": {"$in": selected_cats}}))
+        cats = sorted(selected_cats)
+        kpis = query_cache.get_or_compute("mongo:kpis", cats, lambda: load_kpis(cats))
         
-        if recipes:
-            df = pd.DataFrame(recipes)
-            
+        if kpis["count"]:
             # KPI Cards
             col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Recettes Totales", len(df))
-            col2.metric("Note Moyenne", f"{df['rating'].mean():.2f}/5")
+            col1.metric("Recettes Totales", kpis["count"])
+            col2.metric("Note Moyenne", f"{kpis['rating_avg']:.2f}/5")
             
-            # Calcul difficulté la plus fréquente
-            top_diff = df['difficulty'].mode()[0] if 'difficulty' in df.columns else "N/A"
-            col3.metric("Difficulté Top", top_diff)
+            # Difficulté la plus fréquente
+            col3.metric("Difficulté Top", kpis["top_difficulty"])
             
             # Temps moyen
-            avg_time = df['duration_min'].mean() if 'duration_min' in df.columns else 0
-            col4.metric("Temps Moyen", f"{int(avg_time)} min")
+            col4.metric("Temps Moyen", f"{int(kpis['duration_avg'])} min")
 
             st.markdown("### 🥧 Répartition par Difficulté")
-            if 'difficulty' in df.columns:
-                st.bar_chart(df['difficulty'].value_counts())
+            st.bar_chart(pd.Series(kpis["difficulty_counts"]).sort_values(ascending=False))
             
             st.markdown("### ⭐ Distribution des Notes")
-            if 'rating' in df.columns:
-                st.line_chart(df['rating'].value_counts())
+            st.line_chart(pd.Series(kpis["rating_counts"]).sort_index())
                 
             st.markdown("###  Aperçu des Données Brutes")
-            st.dataframe(df[["name", "category", "rating", "difficulty"]].head(10))
+            preview = query_cache.get_or_compute("mongo:preview", cats, lambda: load_preview(cats))
+            st.dataframe(pd.DataFrame(preview, columns=["name", "category", "rating", "difficulty"]))
         else:
             st.info("Aucune donnée trouvée dans MongoDB pour les catégories sélectionnées.")
     else:
@@ -79,87 +263,88 @@ elif page == "Moteur de Recherche":
     search_mode = st.sidebar.radio("Mode de recherche", ["Classique", "Frigo (aliments) "])
     
     search_body = None
+    pantry = None
+    local_request = None
     
     # --- MODE 1 : RECHERCHE CLASSIQUE ---
     if search_mode == "Classique":
-        query = st.text_input("Ingrédient ou plat (ex: chocolat, tarte)...", "chocolat")
-        
+        query = st.text_input("Ingrédient ou plat (ex: chocolat, tarte)...", "chocolat", key="classic_query")
+
+        def use_suggestion(label):
+            st.session_state["classic_query"] = label
+        show_suggestions(suggest(query), "suggest-classic", use_suggestion)
+
         if query:
-            search_body = {
-                "query": {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["name", "ingredients_text", "steps_text"],
-                        "fuzziness": "AUTO"
-                    }
-                },
-                "size": 500
-            }
+            search_body = classic_query(query)
+            local_request = ["classic", query]
 
 
     # --- MODE 2 : FRIGO VIDE ---
     elif search_mode == "Frigo (aliments) ":
         st.info("Indiquez ce qu'il vous reste, on trouve la recette !")
-        ingredients_input = st.text_input("Vos ingrédients (séparés par une virgule)", "oeufs, farine, lait")
-        
+        ingredients_input = st.text_input("Vos ingrédients (séparés par une virgule)", "oeufs, farine, lait",
+                                          key="fridge_query")
+
+        def complete_ingredient(label):
+            # La suggestion remplace le dernier ingrédient saisi
+            done = st.session_state["fridge_query"].split(",")[:-1]
+            st.session_state["fridge_query"] = ", ".join([x.strip() for x in done if x.strip()] + [label])
+        show_suggestions(suggest(ingredients_input.split(",")[-1], names=0, ingredients=6),
+                         "suggest-fridge", complete_ingredient)
+
         if ingredients_input:
-            # 1. Nettoyage : minuscules et suppression des espaces
-            ing_list = [x.strip().lower() for x in ingredients_input.split(",")]
-            
-            should_clauses = []
-            for ing in ing_list:
-                if not ing: continue # ignorer les chaines vides
-                
-                # On crée une sous-requête "OU" pour chaque ingrédient
-                # Soit ça match exactement (avec tolérance faute), soit ça match avec des jokers (*mot*)
-                should_clauses.append({
-                    "bool": {
-                        "should": [
-                            # Option A: Recherche classique tolérante (gère "oeuf" vs "oeufs")
-                            {
-                                "match": {
-                                    "ingredients_text": {
-                                        "query": ing,
-                                        "fuzziness": "AUTO",
-                                        "operator": "and"
-                                    }
-                                }
-                            },
-                            # Option B: Recherche Joker (Sauve le cas "1oeuf" collé)
-                            {
-                                "wildcard": {
-                                    "ingredients_text": {
-                                        "value": f"*{ing}*", # Trouve "oeuf" dans "1oeuf"
-                                        "case_insensitive": True
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                })
-            
-            # 2. Construction de la requête principale
-            search_body = {
-                "query": {
-                    "bool": {
-                        # "must" ici signifie que la recette DOIT matcher au moins une des conditions
-                        # Mais pour être flexible on utilise often 'should' avec minimum_should_match
-                        "should": should_clauses,
-                        # On demande qu'au moins 50% des ingrédients demandés soient présents
-                        # Tu peux monter à "100%" si tu es strict
-                        "minimum_should_match": "1" 
-                    }
-                },
-                "size": 500
-            }
-
-    # --- EXÉCUTION COMMUNE (Elasticsearch) ---
-    if es and search_body:
+            # Nettoyage : minuscules, suppression des espaces et des entrées vides
+            ing_list = split_ingredients(ingredients_input)
+            # Avec Mongo : index en mémoire (couverture + ingrédients manquants) ; sinon requête Elastic
+            if db is not None:
+                pantry = ing_list
+            search_body = fridge_query(ing_list)
+            local_request = ["fridge", ing_list]
+
+    # --- EXÉCUTION COMMUNE (Elasticsearch, index Frigo, ou recherche locale en secours) ---
+    if search_body or pantry:
+        # Pagination : on ne ramène qu'une page, et seulement les champs de la liste
+        page_size = st.sidebar.selectbox("Résultats par page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+        search_key = QueryCache.make_key(search_mode, pantry or search_body)
+        if st.session_state.get("search_key") != search_key:
+            st.session_state["search_key"] = search_key
+            st.session_state["result_page"] = 1
+        page_num = st.session_state.get("result_page", 1)
+
+        paged_body = paged_query(search_body, page_num, page_size)
         try:
-            resp = es.search(index="recipes-idx", body=search_body)
+            # Requête identique déjà exécutée (et données inchangées) : pas d'appel à Elasticsearch
+            resp = None
+            try:
+                if pantry:
+                    resp = query_cache.get_or_compute(
+                        "pantry", [pantry, page_num, page_size],
+                        lambda: timed_search("frigo_pantry", lambda: pantry_search(pantry, page_num, page_size)))
+                elif es is not None and es_breaker.available():
+                    # Toujours l'alias : il bascule d'une génération à l'autre sans interruption
+                    mode = "classique_es" if search_mode == "Classique" else "frigo_es"
+                    resp = query_cache.get_or_compute(
+                        f"es:{INDEX_ALIAS}", paged_body,
+                        lambda: timed_search(mode, lambda: es.search(index=INDEX_ALIAS, body=paged_body,
+                                                                     request_timeout=ES_SEARCH_TIMEOUT)))
+            except Exception as e:
+                # Elastic (ou Mongo) en panne / trop lent : index local, et Elastic mis de côté un moment
+                if not pantry:
+                    es_breaker.failed()
+                st.warning(f"Recherche de secours (index local) : {type(e).__name__}")
+            if resp is None:
+                local = get_local_search()
+                if local is None:
+                    raise RuntimeError(f"ni Elasticsearch ni index local ({get_local_state()['error']})")
+                mode = "classique_local" if local_request[0] == "classic" else "frigo_local"
+                resp = query_cache.get_or_compute(
+                    f"local:{local.meta['fingerprint']}", [local_request, page_num, page_size],
+                    lambda: timed_search(mode, lambda: local.search(*local_request, page_num, page_size)))
             hits = resp['hits']['hits']
+            total = resp['hits']['total']['value']
+            nb_pages = page_count(total, page_size)
             
-            st.success(f"{len(hits)} résultats trouvés.")
+            st.success(f"{total} résultats trouvés (page {page_num}/{nb_pages}).")
             
             for hit in hits:
                 source = hit['_source']
@@ -167,13 +352,19 @@ elif page == "Moteur de Recherche":
                 duration = source.get('duration_min', 0)
                 
                 # --- AFFICHAGE DE LA CARTE RECETTE (Même affichage pour les 2 modes) ---
-                with st.expander(f"{source.get('name')} ({source.get('category')}) - Pertinence: {score:.2f}"):
+                coverage = hit.get('pantry')
+                if coverage:
+                    label = f"{coverage['matched']}/{coverage['total']} ingrédients"
+                else:
+                    label = f"Pertinence: {score:.2f}"
+                categories = ", ".join(source.get('categories') or [source.get('category')])
+                with st.expander(f"{source.get('name')} ({categories}) - {label}"):
                     
                     c1, c2 = st.columns([1, 3])
                     
                     with c1:
-                        # Gestion de l'image
-                        img_url = source.get('image_url')
+                        # Gestion de l'image : vignette locale, sinon image d'origine
+                        img_url = thumbnail_url(source.get('product_id', hit['_id'])) or source.get('image_url')
                         if img_url and img_url.startswith("http"):
                             st.image(img_url, use_container_width=True)
                         else:
@@ -184,8 +375,19 @@ elif page == "Moteur de Recherche":
                         st.metric("Temps", f"{duration} min")
 
                     with c2:
+                        # Ingrédients et étapes chargés seulement à l'ouverture de la recette
+                        if coverage:
+                            if coverage['missing']:
+                                st.warning("Il manque : " + ", ".join(coverage['missing']))
+                            else:
+                                st.success("Vous avez tout ce qu'il faut !")
+                        pid = source.get('product_id', hit['_id'])
+                        if not st.checkbox("Afficher la recette complète", key=f"detail-{pid}"):
+                            continue
+                        details = load_recipe_details(pid, local=resp.get('local', False))
+
                         st.markdown("#### 🥕 Ingrédients")
-                        ingredients = source.get('ingredients', [])
+                        ingredients = details.get('ingredients', [])
                         if ingredients:
                             for ing in ingredients:
                                 st.markdown(f"- {ing}")
@@ -195,15 +397,30 @@ elif page == "Moteur de Recherche":
                         st.markdown("---")
                         
                         st.markdown("#### 🍳 Préparation")
-                        steps = source.get('steps', [])
+                        steps = details.get('steps', [])
                         if steps:
                             for i, step in enumerate(steps):
                                 st.markdown(f"**{i+1}.** {step}")
                         
-                        st.markdown(f"[Voir la recette originale sur Marmiton]({source.get('url')})")
+                        st.markdown(f"[Voir la recette originale sur Marmiton]({details.get('url')})")
+
+                        similar = load_similar(pid)
+                        if similar:
+                            st.markdown("#### 🍽️ Recettes similaires")
+                            for s in similar:
+                                st.markdown(f"- [{s['name']}]({s['url']}) · {s.get('rating') or 0}/5")
+
+            # --- NAVIGATION ENTRE LES PAGES ---
+            prev_col, _, next_col = st.columns([1, 4, 1])
+            if prev_col.button("← Précédent", disabled=page_num <= 1):
+                st.session_state["result_page"] = page_num - 1
+                st.rerun()
+            if next_col.button("Suivant →", disabled=page_num >= nb_pages):
+                st.session_state["result_page"] = page_num + 1
+                st.rerun()
 
         except Exception as e:
-            st.error(f"Erreur Elastic: {e}")
+            st.error(f"Erreur de recherche: {e}")
 # --- PAGE 3: SPECS & DOC ---
 elif page == "Specs & Doc":
     st.title(" Documentation Technique")
@@ -247,4 +464,14 @@ elif page == "Specs & Doc":
         MongoDB -> Streamlit_App [label="Dashboard"];
         Elasticsearch -> Streamlit_App [label="Recherche"];
     }
-    """)
\ No newline at end of file
+    """)
+# --- CACHE DE REQUÊTES (compteurs visibles dans la sidebar) ---
+cache_stats = query_cache.stats
+for event in ("hits", "misses", "evictions", "invalidations"):
+    metrics.set_gauge("app_query_cache_events", cache_stats[event], event=event)
+metrics.set_gauge("app_query_cache_entries", len(query_cache))
+st.sidebar.markdown("---")
+st.sidebar.caption(
+    f"Cache requêtes : {cache_stats['hits']} hits / {cache_stats['misses']} miss · "
+    f"{len(query_cache)} entrées · {cache_stats['invalidations']} invalidations"
+)
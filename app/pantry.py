@@ -0,0 +1,83 @@
+import numpy as np
+
+from ingredients import canonical_ingredients, normalize_ingredient
+
+
+class PantryIndex:
+    """Index en mémoire recette x ingrédient (matrice creuse CSR) pour le mode Frigo.
+
+    Une requête "qu'est-ce que je peux cuisiner" = un masque booléen sur le
+    vocabulaire ; le nombre d'ingrédients couverts par recette est un simple
+    `bincount` vectorisé sur toutes les recettes à la fois.
+    """
+
+    def __init__(self, product_ids, vocab, indptr, indices, ratings):
+        self.product_ids = np.asarray(product_ids)
+        self.vocab = vocab
+        self.vocab_ids = {tok: i for i, tok in enumerate(vocab)}
+        self.indptr = indptr
+        self.indices = indices
+        self.sizes = np.diff(indptr)
+        self.rows = np.repeat(np.arange(len(product_ids), dtype=np.int32), self.sizes)
+        self.ratings = ratings
+        # "huile" couvre aussi "huile olive", "huile tournesol"...
+        self.heads = {}
+        for i, tok in enumerate(vocab):
+            self.heads.setdefault(tok.split(" ", 1)[0], []).append(i)
+
+    @classmethod
+    def from_docs(cls, docs):
+        product_ids, ratings, indptr, indices = [], [], [0], []
+        vocab_ids = {}
+        for doc in docs:
+            tokens = doc.get("ingredients_canon") or canonical_ingredients(doc.get("ingredients"))
+            if not tokens:
+                continue
+            product_ids.append(doc["product_id"])
+            ratings.append(doc.get("rating") or 0.0)
+            indices.extend(vocab_ids.setdefault(tok, len(vocab_ids)) for tok in tokens)
+            indptr.append(len(indices))
+        vocab = [None] * len(vocab_ids)
+        for tok, i in vocab_ids.items():
+            vocab[i] = tok
+        return cls(product_ids, vocab,
+                   np.asarray(indptr, dtype=np.int64),
+                   np.asarray(indices, dtype=np.int32),
+                   np.asarray(ratings, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def pantry_mask(self, pantry):
+        mask = np.zeros(len(self.vocab), dtype=bool)
+        for raw in pantry:
+            tok = normalize_ingredient(raw)
+            if not tok:
+                continue
+            if tok in self.vocab_ids:
+                mask[self.vocab_ids[tok]] = True
+            mask[self.heads.get(tok, [])] = True
+        return mask
+
+    def query(self, pantry, min_matched=1):
+        """Recettes triées par taux de couverture, puis nombre d'ingrédients manquants, puis note.
+
+        Renvoie (lignes triées, matched, mask) ; voir `describe` pour le détail.
+        """
+        mask = self.pantry_mask(pantry)
+        matched = np.bincount(self.rows, weights=mask[self.indices], minlength=len(self)).astype(np.int32)
+        candidates = np.flatnonzero(matched >= min_matched)
+        coverage = matched[candidates] / self.sizes[candidates]
+        missing = self.sizes[candidates] - matched[candidates]
+        order = np.lexsort((-self.ratings[candidates], missing, -coverage))
+        return candidates[order], matched, mask
+
+    def describe(self, row, matched, mask):
+        tokens = self.indices[self.indptr[row]:self.indptr[row + 1]]
+        return {
+            "product_id": str(self.product_ids[row]),
+            "matched": int(matched[row]),
+            "total": int(self.sizes[row]),
+            "coverage": float(matched[row] / self.sizes[row]),
+            "missing": [self.vocab[t] for t in tokens if not mask[t]],
+        }
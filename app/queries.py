@@ -0,0 +1,69 @@
+# --- CONSTRUCTION DES REQUÊTES ELASTICSEARCH ---
+# Partagé par l'app Streamlit et le banc de mesure (bench/).
+
+# Recherche : champs ramenés pour la liste de résultats (le détail est chargé à la demande)
+LIST_FIELDS = ["product_id", "name", "category", "categories", "rating", "duration_min", "difficulty", "image_url"]
+
+# Quasi-doublons (reposts, variantes) marqués à l'ingestion : seule la recette de référence est proposée
+HIDE_DUPLICATES = {"exists": {"field": "duplicate_of"}}
+
+
+def classic_query(query):
+    """Mode Classique : mot-clé sur le nom, les ingrédients et les étapes, avec tolérance aux fautes."""
+    return {
+        "query": {
+            "bool": {
+                "must": {
+                    "multi_match": {
+                        "query": query,
+                        "fields": ["name", "ingredients_text", "steps_text"],
+                        "fuzziness": "AUTO"
+                    }
+                },
+                "must_not": [HIDE_DUPLICATES]
+            }
+        }
+    }
+
+
+def split_ingredients(text):
+    """"oeufs, farine , lait" -> ["oeufs", "farine", "lait"] (minuscules, vides ignorés)."""
+    return [x.strip().lower() for x in text.split(",") if x.strip()]
+
+
+def fridge_query(ingredients):
+    """Mode Frigo (Elasticsearch) : au moins un des ingrédients présent dans la recette."""
+    should_clauses = []
+    for ing in ingredients:
+        # Une sous-requête "OU" par ingrédient, sans wildcard :
+        # l'analyseur français de l'index gère déjà "œufs"/"oeufs"/"oeuf" et "1oeuf"
+        should_clauses.append({
+            "bool": {
+                "should": [
+                    # Option A: mot complet (pluriels, accents, élisions normalisés)
+                    {"match": {"ingredients_text": {"query": ing, "operator": "and"}}},
+                    # Option B: début de mot via le sous-champ edge n-gram ("choco" -> chocolat)
+                    {"match": {"ingredients_text.ngram": {"query": ing, "operator": "and"}}},
+                ]
+            }
+        })
+    return {
+        "query": {
+            "bool": {
+                "should": should_clauses,
+                "minimum_should_match": "1",
+                "must_not": [HIDE_DUPLICATES]
+            }
+        }
+    }
+
+
+def paged_query(body, page_num, page_size, fields=LIST_FIELDS):
+    """Une seule page de résultats, limitée aux champs affichés sur la carte."""
+    return {
+        **body,
+        "from": (page_num - 1) * page_size,
+        "size": page_size,
+        "_source": fields,
+        "track_total_hits": True,
+    }
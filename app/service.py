@@ -0,0 +1,69 @@
+from stats import merge_stats
+from queries import LIST_FIELDS
+
+# --- COUCHE SERVICE ---
+# Logique commune à l'app Streamlit (clients synchrones) et à l'API REST (clients asynchrones) :
+# filtres et projections Mongo, pagination du mode Frigo, KPIs et mise en forme des réponses.
+# Rien ici ne fait d'entrée/sortie : chaque interface exécute les requêtes avec son propre client.
+
+# Recettes proposées : les quasi-doublons marqués à l'ingestion sont écartés
+LIVE_FILTER = {"duplicate_of": None}
+PANTRY_FIELDS = {"_id": 0, "product_id": 1, "ingredients_canon": 1, "ingredients": 1, "rating": 1}
+SUGGEST_FIELDS = {"_id": 0, "product_id": 1, "name": 1, "rating": 1, "reviews_count": 1,
+                  "ingredients_canon": 1, "ingredients": 1}
+CARD_FIELDS = {"_id": 0, **{f: 1 for f in LIST_FIELDS}}
+DETAIL_FIELDS = {"_id": 0, "ingredients": 1, "steps": 1, "url": 1}
+PREVIEW_FIELDS = {"_id": 0, "name": 1, "category": 1, "rating": 1, "difficulty": 1}
+SIMILAR_PROJECTION = {"_id": 0, "similar": 1}
+MAX_RESULT_WINDOW = 10000  # limite from + size d'Elasticsearch
+CATEGORIES = ["entree", "plat-principal", "dessert"]
+
+
+def stats_filter(categories):
+    return {"_id": {"$in": list(categories)}}
+
+
+def preview_filter(categories):
+    return {"category": {"$in": list(categories)}}
+
+
+def materialized_kpis(categories, materialized):
+    """KPIs depuis `recipe_stats`, ou None s'il manque une catégorie (agrégation $facet à lancer)."""
+    if len(materialized) != len(categories):
+        return None
+    return merge_stats(materialized)
+
+
+def pantry_page(index, pantry, page_num, page_size):
+    """Mode Frigo : (nombre total de recettes, couverture des recettes de la page demandée)."""
+    rows, matched, mask = index.query(pantry)
+    start = (page_num - 1) * page_size
+    return len(rows), [index.describe(row, matched, mask) for row in rows[start:start + page_size]]
+
+
+def card_filter(page):
+    return {"product_id": {"$in": [p["product_id"] for p in page]}}
+
+
+def pantry_response(total, page, cards):
+    """Page du mode Frigo au même format qu'une réponse Elastic (`cards` : product_id -> champs de la liste)."""
+    hits = [{"_id": p["product_id"], "_score": p["coverage"], "_source": cards.get(p["product_id"], {}), "pantry": p}
+            for p in page]
+    return {"hits": {"total": {"value": total}, "hits": hits}}
+
+
+def page_count(total, page_size):
+    return max(1, -(-min(total, MAX_RESULT_WINDOW) // page_size))
+
+
+def to_results(resp, page_num, page_size):
+    """Réponse Elastic (ou Frigo) -> JSON de l'API : une entrée par recette, score et couverture à plat."""
+    total = resp["hits"]["total"]["value"]
+    results = []
+    for hit in resp["hits"]["hits"]:
+        item = {**hit["_source"], "product_id": hit["_source"].get("product_id", hit["_id"]), "score": hit["_score"]}
+        if "pantry" in hit:
+            item["pantry"] = hit["pantry"]
+        results.append(item)
+    return {"total": total, "page": page_num, "page_size": page_size, "pages": page_count(total, page_size),
+            "engine": "local" if resp.get("local") else "elasticsearch", "results": results}
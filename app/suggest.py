@@ -0,0 +1,85 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from ingredients import RE_WORD, STOPWORDS, canonical_ingredients, fold
+
+# --- SUGGESTIONS À LA FRAPPE ---
+# Clés triées (une par mot de début possible : "gateau chocolat", "chocolat") + rang de l'entrée.
+# Un préfixe = une plage contiguë de clés trouvée par dichotomie ; les k meilleures entrées sont les
+# k plus petits rangs distincts de la plage (les libellés qui commencent par la saisie d'abord). Quelques microsecondes à quelques ms, sans Elasticsearch.
+
+PRIOR_WEIGHT = 20  # avis "fictifs" à la note moyenne : 5/5 sur 2 avis ne passe pas devant 4,7/5 sur 300
+
+
+def words(text):
+    return [w for w in RE_WORD.findall(fold(text or "")) if w not in STOPWORDS]
+
+
+def weighted_ratings(docs, prior_weight=PRIOR_WEIGHT):
+    """Note bayésienne (note moyenne pondérée par le nombre d'avis) de chaque recette."""
+    ratings = np.array([d.get("rating") or 0.0 for d in docs], dtype=np.float64)
+    reviews = np.array([d.get("reviews_count") or 0 for d in docs], dtype=np.float64)
+    rated = reviews > 0
+    prior = ratings[rated].mean() if rated.any() else 0.0
+    return (ratings * reviews + prior * prior_weight) / (reviews + prior_weight)
+
+
+class SuggestIndex:
+    """Index de préfixes sur une liste d'entrées classées de la meilleure à la moins bonne."""
+
+    def __init__(self, entries, keys, ranks):
+        self.entries = entries
+        self.keys = keys
+        self.ranks = ranks
+
+    @classmethod
+    def build(cls, labeled):
+        """`labeled` : (libellé, entrée) déjà triés par pertinence décroissante."""
+        labeled = [(words(label), entry) for label, entry in labeled]
+        n = len(labeled)
+        pairs = []
+        for rank, (tokens, _) in enumerate(labeled):
+            # Chaque mot peut commencer la saisie : "choco" trouve "Gâteau au chocolat",
+            # mais derrière les libellés qui commencent par "choco" (rang décalé de n)
+            for i in range(len(tokens)):
+                pairs.append((" ".join(tokens[i:]), rank + (n if i else 0)))
+        pairs.sort()
+        return cls([entry for _, entry in labeled], [k for k, _ in pairs],
+                   np.array([r for _, r in pairs], dtype=np.int64))
+
+    def suggest(self, text, k=8):
+        prefix = " ".join(words(text))
+        if text and text[-1].isspace():
+            prefix += " "  # "tarte " : le mot est complet, on ne propose plus "tartelette"
+        if not prefix.strip() or k <= 0:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        found = []
+        for r in np.unique(self.ranks[lo:hi]) % len(self.entries):
+            if r not in found:
+                found.append(r)
+                if len(found) == k:
+                    break
+        return [self.entries[r] for r in found]
+
+
+def build_suggestions(docs):
+    """(noms de recettes, ingrédients) ; recettes classées par note pondérée, ingrédients par fréquence."""
+    docs = list(docs)
+    scores = weighted_ratings(docs)
+    order = np.lexsort((-np.array([d.get("reviews_count") or 0 for d in docs]), -scores))
+    names = SuggestIndex.build(
+        (docs[i]["name"], {"label": docs[i]["name"], "product_id": docs[i]["product_id"],
+                           "rating": docs[i].get("rating"), "reviews_count": docs[i].get("reviews_count")})
+        for i in order if docs[i].get("name"))
+
+    counts, reviews = {}, {}
+    for d in docs:
+        for tok in d.get("ingredients_canon") or canonical_ingredients(d.get("ingredients")):
+            counts[tok] = counts.get(tok, 0) + 1
+            reviews[tok] = reviews.get(tok, 0) + (d.get("reviews_count") or 0)
+    ranked = sorted(counts, key=lambda t: (-counts[t], -reviews[t], t))
+    ingredients = SuggestIndex.build((tok, {"label": tok, "recipes": counts[tok]}) for tok in ranked)
+    return names, ingredients
@@ -0,0 +1,74 @@
+import os
+import re
+import logging
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from images import THUMB_DIR, THUMB_FORMAT, thumb_relpath
+
+logger = logging.getLogger("ScraperBot")
+
+# --- SERVEUR DE VIGNETTES ---
+# Les cartes de résultats pointent sur des vignettes locales (quelques Ko) au lieu des images
+# d'origine. L'URL contient la date de la vignette (?v=...) : le navigateur peut la garder un an
+# sans revalider, et une vignette régénérée change d'URL.
+
+THUMB_PORT = int(os.getenv("THUMB_PORT", "8502"))
+THUMB_BASE_URL = os.getenv("THUMB_BASE_URL", f"http://localhost:{THUMB_PORT}").rstrip("/")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+CONTENT_TYPES = {".webp": "image/webp", ".jpg": "image/jpeg"}
+RE_THUMB = re.compile(r"^/([0-9a-f_]{2})/([0-9a-f_]+)(\.webp|\.jpg)$")
+
+
+def thumbnail_url(product_id, root=THUMB_DIR):
+    """URL de la vignette d'une recette, ou None si elle n'a pas (encore) été générée."""
+    if not product_id:
+        return None
+    rel = thumb_relpath(product_id, THUMB_FORMAT)
+    try:
+        version = int(os.stat(os.path.join(root, rel)).st_mtime)
+    except OSError:
+        return None
+    return f"{THUMB_BASE_URL}/{rel}?v={version}"
+
+
+def start_thumbnail_server(port=THUMB_PORT, root=THUMB_DIR):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = RE_THUMB.match(self.path.split("?")[0])
+            path = os.path.join(root, match.group(1), match.group(2) + match.group(3)) if match else None
+            try:
+                st = os.stat(path) if path else None
+            except OSError:
+                st = None
+            if st is None:
+                self.send_error(404)
+                return
+            etag = f'"{int(st.st_mtime)}-{st.st_size}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", CACHE_CONTROL)
+                self.end_headers()
+                return
+            with open(path, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPES[match.group(3)])
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(st.st_mtime, usegmt=True))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="thumbs-http", daemon=True).start()
+    logger.info(f" Vignettes servies sur :{port} depuis {root}")
+    return httpd
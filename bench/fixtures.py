@@ -0,0 +1,120 @@
+import os
+import html
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+# --- PAGES MARMITON HORS LIGNE ---
+# Pages recettes et listes reconstruites à partir d'un snapshot, avec le même balisage que le
+# site (JSON-LD schema.org, classes des blocs ingrédients / étapes / infos) et un remplissage
+# (menus, scripts) pour approcher le poids d'une vraie page. Des pages enregistrées (*.html)
+# peuvent être servies à la place avec --fixtures.
+
+PAD_BLOCK = "<li class='nav-item'><a href='/recettes/'>Recettes</a><span>Idées de menus, astuces</span></li>\n"
+PAD_SCRIPT = "window.__CONF__ = " + json.dumps({"ads": ["slot-%d" % i for i in range(40)]}) + ";\n"
+
+
+def _padding(kb):
+    block = PAD_BLOCK * 10 + "<script>" + PAD_SCRIPT * 5 + "</script>\n"
+    return block * max(1, kb * 1024 // len(block))
+
+
+def render_recipe(recipe, with_jsonld=True, padding_kb=150):
+    e = html.escape
+    ld = ""
+    if with_jsonld:
+        ld = json.dumps({
+            "@context": "https://schema.org", "@type": "Recipe",
+            "name": recipe["name"], "image": [recipe.get("image_url", "")],
+            "recipeIngredient": recipe.get("ingredients", []),
+            "recipeInstructions": [{"@type": "HowToStep", "text": s} for s in recipe.get("steps", [])],
+            "totalTime": f"PT{recipe.get('duration_min', 0)}M",
+            "aggregateRating": {"ratingValue": recipe.get("rating", 0), "ratingCount": recipe.get("reviews_count", 0)},
+        }, ensure_ascii=False)
+        ld = f"<script type='application/ld+json'>{ld}</script>"
+    ingredients = "".join(
+        f"<div class='card-ingredient'><span class='item__ingredient'><span class='ingredient-name'>{e(i)}</span></span></div>"
+        for i in recipe.get("ingredients", []))
+    steps = "".join(f"<div class='recipe-step-list__container'><p>{e(s)}</p></div>" for s in recipe.get("steps", []))
+    return f"""<!DOCTYPE html><html lang="fr"><head><meta charset="utf-8">
+<title>{e(recipe['name'])} - Marmiton</title>
+<link rel="canonical" href="{e(recipe['url'])}">
+<meta property="og:image" content="{e(recipe.get('image_url', ''))}">{ld}
+</head><body><header><ul>{_padding(padding_kb // 2)}</ul></header>
+<main><h1>{e(recipe['name'])}</h1>
+<div class="recipe-header__rating-text">{recipe.get('rating', 0)}/5</div>
+<div class="recipe-header__rating-count">{recipe.get('reviews_count', 0)} avis</div>
+<div class="recipe-primary__item"><span>{recipe.get('duration_min', 0)} min</span></div>
+<div class="recipe-primary__item"><span>{e(recipe.get('difficulty') or '')}</span></div>
+<div class="recipe-ingredients">{ingredients}</div>
+<div class="recipe-steps">{steps}</div></main>
+<footer><ul>{_padding(padding_kb // 2)}</ul></footer></body></html>"""
+
+
+def render_listing(paths, padding_kb=100):
+    cards = "".join(f"<a class='recipe-card-link' href='{p}'><div class='recipe-card'>Recette</div></a>" for p in paths)
+    # Quelques liens hors recettes, comme sur le site
+    others = "".join(f"<a href='/recettes/selection_{i}.aspx'>Sélection</a>" for i in range(20))
+    return (f"<!DOCTYPE html><html><body><ul>{_padding(padding_kb // 2)}</ul>"
+            f"<div class='recipe-results'>{cards}</div>{others}<ul>{_padding(padding_kb // 2)}</ul></body></html>")
+
+
+def build_site(recipes, per_listing=12, padding_kb=150):
+    """{chemin: (html, catégorie)} pour les recettes + pages de liste, et la liste des chemins recettes."""
+    pages, recipe_paths = {}, []
+    for i, r in enumerate(recipes):
+        path = urlsplit(r["url"]).path or f"/recettes/recette_bench_{i}.aspx"
+        # Une page sur deux sans JSON-LD : on mesure aussi les sélecteurs HTML de secours
+        pages[path] = (render_recipe(r, with_jsonld=i % 2 == 0, padding_kb=padding_kb), r.get("category"))
+        recipe_paths.append(path)
+    for n, start in enumerate(range(0, len(recipe_paths), per_listing)):
+        pages[f"/recettes/recherche.aspx?page={n + 1}"] = (render_listing(recipe_paths[start:start + per_listing]), None)
+    return pages, recipe_paths
+
+
+def load_recorded(directory):
+    """Pages enregistrées : chaque fichier *.html est servi sous /recettes/<nom du fichier>."""
+    pages = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".html"):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                pages[f"/recettes/{name}"] = (f.read(), None)
+    return pages
+
+
+class FixtureServer:
+    """Serveur HTTP local (thread) qui sert les pages en mémoire ; 404 pour le reste."""
+
+    def __init__(self, pages):
+        encoded = {path: body.encode("utf-8") for path, (body, _) in pages.items()}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = encoded.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="bench-http", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# Modules du projet (scraper, app, restore_data.py) importés tels quels : on mesure le vrai code
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "scraper"), os.path.join(ROOT, "app"), ROOT]
+
+from fetcher import RecipeFetcher
+from recipe_parser import parse_recipe, parse_many, parse_listing
+from sink import RecipeSink
+from snapshot import iter_snapshot, find_snapshot
+from queries import classic_query, fridge_query, paged_query
+from pantry import PantryIndex
+from suggest import build_suggestions
+from similar import tfidf_matrix, top_neighbours
+from ingredients import canonical_ingredients
+import restore_data
+
+from fixtures import FixtureServer, build_site, load_recorded
+from standins import connect
+
+BENCH_INDEX = "recipes-idx-bench"
+BENCH_COLLECTION = "recipes_bench"
+
+
+def summarize(samples_ms):
+    """p50 / p95 / p99 / moyenne d'une liste de durées en millisecondes."""
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"n": 0}
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {"n": len(ordered), "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99),
+            "mean_ms": round(sum(ordered) / len(ordered), 3)}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds else None
+
+
+# --- ÉTAPES MESURÉES ---
+def bench_fetch(server, recipe_paths, workers):
+    urls = [server.base_url + p for p in recipe_paths]
+    # Pas de délai de politesse : on mesure le débit du client, pas la courtoisie envers le site
+    fetcher = RecipeFetcher(workers=workers, max_per_host=workers, min_interval=0)
+    start = time.perf_counter()
+    pages, errors, size = [], 0, 0
+    for res in fetcher.fetch_all(urls):
+        if res.error:
+            errors += 1
+            continue
+        pages.append((res.html, res.url, None))
+        size += len(res.html)
+    seconds = time.perf_counter() - start
+    return pages, {"pages": len(pages), "errors": errors, "workers": workers, "seconds": round(seconds, 3),
+                   "pages_per_sec": rate(len(pages), seconds), "mb_per_sec": rate(size / 1e6, seconds)}
+
+
+def bench_extraction(listing_pages, pages, parse_workers):
+    listing = [timed(parse_listing, html)[1] for html in listing_pages]
+    single = [timed(parse_recipe, html, url, cat)[1] for html, url, cat in pages]
+    start = time.perf_counter()
+    parsed = sum(1 for _, recipe in parse_many(pages, workers=parse_workers) if recipe)
+    seconds = time.perf_counter() - start
+    return {
+        "listing_ms_per_page": summarize(listing),
+        "recipe_ms_per_page": summarize(single),
+        "parse_many": {"pages": parsed, "workers": parse_workers or os.cpu_count(),
+                       "seconds": round(seconds, 3), "pages_per_sec": rate(parsed, seconds)},
+    }
+
+
+def bench_save(db, es, recipes, snapshot_dir, batch_size):
+    start = time.perf_counter()
+    with RecipeSink(db, es, snapshot_path=snapshot_dir, batch_size=batch_size, flush_interval=1.0,
+                    index=BENCH_INDEX, collection=BENCH_COLLECTION) as sink:
+        for r in recipes:
+            sink.push(dict(r))
+    seconds = time.perf_counter() - start
+    return {"docs": sink.stats["flushed"], "batches": sink.stats["batches"], "errors": sink.stats["errors"],
+            "seconds": round(seconds, 3), "docs_per_sec": rate(sink.stats["flushed"], seconds)}
+
+
+def bench_restore(db, es, snapshot_dir, chunk_size):
+    build = {"source": "bench", "index": BENCH_INDEX + "-restore", "collection": BENCH_COLLECTION + "_restore"}
+    start = time.perf_counter()
+    progress, rejected, errors = restore_data.restore(snapshot_dir, ["mongo", "es"], chunk_size, db, es, build)
+    seconds = time.perf_counter() - start
+    result = {"docs": progress.counts["lues"], "rejected": len(rejected), "seconds": round(seconds, 3),
+              "docs_per_sec": rate(progress.counts["lues"], seconds),
+              "errors": {k: str(v) for k, v in errors.items()}}
+    for target in ("mongo", "es"):
+        if target in progress.done:
+            result[f"{target}_docs_per_sec"] = rate(progress.counts[target], progress.done[target])
+    return build, result
+
+
+def query_samples(recipes, n, seed=42):
+    rng = random.Random(seed)
+    words = sorted({w for r in recipes for w in r["name"].lower().split() if len(w) > 3 and w.isalpha()})
+    tokens = sorted({t for r in recipes for t in canonical_ingredients(r.get("ingredients"))})
+    classic = [rng.choice(words) for _ in range(n)]
+    fridge = [rng.sample(tokens, 3) for _ in range(n)]
+    return classic, fridge
+
+
+def bench_search(recipes, es, live_es, n, page_size):
+    classic, fridge = query_samples(recipes, n)
+    results = {
+        "classique_build": summarize([timed(lambda q: paged_query(classic_query(q), 1, page_size), q)[1]
+                                      for q in classic]),
+        "frigo_build": summarize([timed(lambda q: paged_query(fridge_query(q), 1, page_size), q)[1]
+                                  for q in fridge]),
+    }
+    # Mode Frigo de l'app : index en mémoire (construction + requête + première page)
+    index, build_ms = timed(PantryIndex.from_docs, recipes)
+    results["frigo_pantry_build_ms"] = round(build_ms, 3)
+
+    def pantry_page(pantry):
+        rows, matched, mask = index.query(pantry)
+        return [index.describe(r, matched, mask) for r in rows[:page_size]]
+    results["frigo_pantry"] = summarize([timed(pantry_page, q)[1] for q in fridge])
+
+    # Suggestions à la frappe : une requête par caractère tapé
+    (names, ingredients), build_ms = timed(build_suggestions, recipes)
+    results["suggest_build_ms"] = round(build_ms, 3)
+    keystrokes = [q[:i] for q in classic for i in range(1, len(q) + 1)]
+    results["suggest"] = summarize([timed(lambda t: (names.suggest(t), ingredients.suggest(t)), t)[1]
+                                    for t in keystrokes])
+
+    # Recettes similaires : calcul par lot (TF-IDF + k plus proches voisins par blocs), hors écriture Mongo
+    matrix, build_ms = timed(tfidf_matrix, recipes)
+    results["similar_tfidf_ms"] = round(build_ms, 3)
+    results["similar_knn_ms"] = round(timed(lambda m: sum(1 for _ in top_neighbours(m)), matrix)[1], 3)
+
+    if live_es:
+        es.indices.refresh(index=BENCH_INDEX)
+        def search(body):
+            return es.search(index=BENCH_INDEX, body=body)
+        results["classique_es"] = summarize([timed(search, paged_query(classic_query(q), 1, page_size))[1]
+                                             for q in classic])
+        results["frigo_es"] = summarize([timed(search, paged_query(fridge_query(q), 1, page_size))[1]
+                                         for q in fridge])
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(previous, current, path=""):
+    """Écarts relatifs sur les métriques de débit / latence entre deux runs."""
+    for key, value in current.items():
+        old = previous.get(key) if isinstance(previous, dict) else None
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict):
+            compare(old or {}, value, name)
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old \
+                and (key.endswith("_per_sec") or key.endswith("_ms")):
+            print(f"  {name:55s} {old:>10} -> {value:>10} ({(value - old) / old:+.1%})")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Banc de mesure hors ligne : fetch, parsing, écritures, recherche")
+    arg_parser.add_argument("--source", help="snapshot ou JSON de recettes servant à générer les pages "
+                                             "(défaut : marmiton_snapshot/, sinon marmiton_data.json)")
+    arg_parser.add_argument("--fixtures", help="dossier de pages recettes enregistrées (*.html) à servir telles quelles")
+    arg_parser.add_argument("--limit", type=int, default=500, help="nombre de recettes (défaut 500)")
+    arg_parser.add_argument("--workers", type=int, default=8, help="threads de téléchargement")
+    arg_parser.add_argument("--parse-workers", type=int, default=0, help="processus de parsing (0 = nb de CPU)")
+    arg_parser.add_argument("--queries", type=int, default=200, help="requêtes par mode de recherche")
+    arg_parser.add_argument("--mongo-host", default=os.getenv("BENCH_MONGO_HOST"),
+                            help="MongoDB réel (sinon mongomock)")
+    arg_parser.add_argument("--elastic-host", default=os.getenv("BENCH_ELASTIC_HOST"),
+                            help="Elasticsearch réel (sinon doublure)")
+    arg_parser.add_argument("--out", help="fichier JSON de résultats (défaut : bench/results/<horodatage>.json)")
+    arg_parser.add_argument("--compare", help="résultats d'un run précédent à comparer")
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+
+    source = args.source or find_snapshot(ROOT)
+    recipes = [r for _, r in zip(range(args.limit), iter_snapshot(source))]
+    if args.fixtures:
+        pages = load_recorded(args.fixtures)
+        recipe_paths = list(pages)
+    else:
+        pages, recipe_paths = build_site(recipes)
+    listing_pages = [html for path, (html, _) in pages.items() if "recherche" in path]
+    db, es, backends = connect(args.mongo_host, args.elastic_host)
+    print(f"Banc : {len(recipe_paths)} pages recettes, Mongo={backends['mongo']}, Elastic={backends['elastic']}")
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "backends": backends,
+        "params": {"recipes": len(recipes), "pages": len(recipe_paths), "workers": args.workers,
+                   "parse_workers": args.parse_workers, "queries": args.queries,
+                   "fixtures": args.fixtures or "generated"},
+        "results": {},
+    }
+    results = report["results"]
+    with FixtureServer(pages) as server, tempfile.TemporaryDirectory() as tmp:
+        print(" Téléchargement...")
+        fetched, results["fetch"] = bench_fetch(server, recipe_paths, args.workers)
+        print(" Extraction...")
+        results["extraction"] = bench_extraction(listing_pages, fetched, args.parse_workers or None)
+        print(" Écritures (save / sink)...")
+        snapshot_dir = os.path.join(tmp, "snapshot")
+        results["save"] = bench_save(db, es, recipes, snapshot_dir, batch_size=200)
+        print(" Écritures (restore_data.py)...")
+        build, results["restore"] = bench_restore(db, es, snapshot_dir, chunk_size=1000)
+        print(" Recherche...")
+        results["search"] = bench_search(recipes, es, backends["elastic"] == "elasticsearch",
+                                         args.queries, page_size=20)
+
+    # Nettoyage des données de test sur les vrais services
+    db.client.drop_database(db.name)
+    if backends["elastic"] == "elasticsearch":
+        for index in (BENCH_INDEX, build["index"]):
+            es.indices.delete(index=index, ignore=[404])
+
+    out = args.out or os.path.join(ROOT, "bench", "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Résultats écrits dans {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"Comparaison avec {args.compare} :")
+        compare(previous.get("results", {}), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json
+
+from elasticsearch.serializer import JSONSerializer
+
+# --- DOUBLURES MONGO / ELASTICSEARCH ---
+# Sans services locaux, le banc écrit dans mongomock et dans un faux client Elastic qui reçoit
+# les vraies requêtes bulk (sérialisation NDJSON comprise) et les acquitte sans les stocker.
+# Avec --mongo-host / --elastic-host, ce sont les vrais services (containers) qui sont mesurés.
+
+
+class _Transport:
+    serializer = JSONSerializer()
+
+
+class _Indices:
+    def __init__(self, client):
+        self.client = client
+
+    def exists(self, index):
+        return index in self.client.indices_docs or index in self.client.aliases
+
+    def create(self, index, body=None):
+        self.client.indices_docs[index] = 0
+        for alias in (body or {}).get("aliases", {}):
+            self.client.aliases[alias] = index
+
+    def delete(self, index, ignore=None):
+        self.client.indices_docs.pop(index, None)
+
+    def get(self, index):
+        prefix = index.rstrip("*")
+        return {name: {} for name in self.client.indices_docs if name.startswith(prefix)}
+
+    def get_index_template(self, name):
+        raise KeyError(name)
+
+    def put_index_template(self, name, body):
+        pass
+
+    def get_mapping(self, index):
+        return {self.client.resolve(index): {"mappings": {"_meta": {"template_version": None}}}}
+
+    def get_settings(self, index):
+        return {self.client.resolve(index): {"settings": {"index": {"refresh_interval": "1s", "number_of_replicas": "1"}}}}
+
+    def put_settings(self, index, body):
+        pass
+
+    def refresh(self, index):
+        pass
+
+    def put_alias(self, index, name):
+        self.client.aliases[name] = index
+
+    def exists_alias(self, name):
+        return name in self.client.aliases
+
+    def get_alias(self, name):
+        return {self.client.aliases[name]: {}}
+
+    def update_aliases(self, body):
+        for action in body["actions"]:
+            if "add" in action:
+                self.client.aliases[action["add"]["alias"]] = action["add"]["index"]
+
+
+class FakeElasticsearch:
+    """Client Elasticsearch minimal : bulk, count et les appels d'administration utilisés par indexing.py."""
+
+    transport = _Transport()
+
+    def __init__(self):
+        self.indices_docs = {}
+        self.aliases = {}
+        self.indices = _Indices(self)
+        self.bulk_requests = 0
+
+    def resolve(self, index):
+        return self.aliases.get(index, index)
+
+    def bulk(self, body, **kwargs):
+        lines = [line for line in body.split("\n") if line]
+        items = []
+        for action in lines[::2]:
+            meta = json.loads(action)["index"]
+            name = self.resolve(meta["_index"])
+            self.indices_docs[name] = self.indices_docs.get(name, 0) + 1
+            items.append({"index": {"_index": name, "_id": meta.get("_id"), "status": 201}})
+        self.bulk_requests += 1
+        return {"took": 0, "errors": False, "items": items}
+
+    def count(self, index):
+        return {"count": self.indices_docs.get(self.resolve(index), 0)}
+
+    def ping(self):
+        return True
+
+
+def connect(mongo_host=None, elastic_host=None):
+    """(db, es, backends) : vrais services si un hôte est donné, doublures sinon."""
+    if mongo_host:
+        from pymongo import MongoClient
+        client = MongoClient(f"mongodb://{mongo_host}:27017/", serverSelectionTimeoutMS=3000)
+        client.admin.command("ping")
+        db, mongo_backend = client["marmiton_bench"], "mongodb"
+    else:
+        import mongomock
+        db, mongo_backend = mongomock.MongoClient()["marmiton_bench"], "mongomock"
+    if elastic_host:
+        from elasticsearch import Elasticsearch
+        es, es_backend = Elasticsearch([f"http://{elastic_host}:9200"]), "elasticsearch"
+        if not es.ping():
+            raise ConnectionError(f"Elasticsearch injoignable sur {elastic_host}")
+    else:
+        es, es_backend = FakeElasticsearch(), "stand-in"
+    return db, es, {"mongo": mongo_backend, "elastic": es_backend}
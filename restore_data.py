@@ -1,54 +1,229 @@
-import json
 import os
+import sys
 import time
-from pymongo import MongoClient
+import queue
+import argparse
+import threading
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError
 from elasticsearch import Elasticsearch
 
+# Modules partagés avec le scraper (indexation Elastic, snapshot, stats)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraper"))
+from indexing import bulk_index, bulk_load, ensure_index
+from stats import refresh_recipe_stats
+from similar import refresh_similar
+from publish import bump_data_version, start_build, publish_build
+from ingredients import enrich
+from dedupe import NearDuplicateIndex
+from snapshot import find_snapshot, iter_snapshot
+
 # --- CONFIGURATION INTELLIGENTE ---
 # Si on est dans Docker, on utilise les noms de services. Sinon localhost.
 MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
 ELASTIC_HOST = os.getenv("ELASTIC_HOST", "localhost")
 
-print(f" Connexion à MongoDB sur : {MONGO_HOST}...")
-print(f"Connexion à Elastic sur : {ELASTIC_HOST}...")
-
-client = MongoClient(f"mongodb://{MONGO_HOST}:27017/")
-db = client["marmiton_db"]
-es = Elasticsearch([f"http://{ELASTIC_HOST}:9200"])
-
-# --- CHARGEMENT JSON ---
-print("Lecture du fichier marmiton_data.json...")
-try:
-    with open('marmiton_data.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    print(f"   -> {len(data)} recettes trouvées.")
-except FileNotFoundError:
-    print(" ERREUR : Le fichier JSON est introuvable !")
-    exit()
-
-# --- INSERTION MONGO ---
-print("Insertion dans MongoDB...")
-db["recipes"].delete_many({})  # On vide pour être propre
-if data:
-    db["recipes"].insert_many(data)
-print("MongoDB OK.")
-
-# --- INSERTION ELASTIC ---
-print("Indexation Elasticsearch...")
-try:
-    if es.indices.exists(index="recipes-idx"):
-        es.indices.delete(index="recipes-idx")
-    es.indices.create(index="recipes-idx")
-
-    for recipe in data:
-        doc = {k: v for k, v in recipe.items() if k != '_id'}
-        # On recrée les champs textes pour la recherche
-        doc['ingredients_text'] = ", ".join(recipe.get('ingredients', []))
-        doc['steps_text'] = " ".join(recipe.get('steps', []))
-        
-        es.index(index="recipes-idx", id=recipe['product_id'], document=doc)
-    print("  Elastic OK.")
-except Exception as e:
-    print(f" Warning Elastic: {e}")
-
-print("TOUT EST TERMINÉ ! Actualise ta page.")
\ No newline at end of file
+_STOP = object()
+
+
+def validate_recipe(doc):
+    """Problèmes bloquants d'une recette (liste vide = OK)."""
+    problems = []
+    if not doc.get("product_id"):
+        problems.append("product_id manquant")
+    if not doc.get("name"):
+        problems.append("name manquant")
+    for field in ("ingredients", "steps"):
+        if not isinstance(doc.get(field, []), list):
+            problems.append(f"{field} n'est pas une liste")
+    for field in ("rating", "duration_min", "reviews_count"):
+        value = doc.get(field)
+        if value is not None and not isinstance(value, (int, float)):
+            problems.append(f"{field} non numérique")
+    return problems
+
+
+class Progress:
+    """Compteurs partagés entre le lecteur et les workers, affichés périodiquement."""
+
+    def __init__(self, targets):
+        self.start = time.time()
+        self.counts = {"lues": 0, "rejetées": 0, **{t: 0 for t in targets}}
+        self.errors = {t: 0 for t in targets}
+        self.done = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, n=1):
+        with self._lock:
+            self.counts[key] += n
+
+    def finish(self, target):
+        self.done[target] = time.time() - self.start
+
+    def line(self):
+        elapsed = max(time.time() - self.start, 1e-6)
+        parts = [f"{k}: {v}" for k, v in self.counts.items()]
+        return f"  {' | '.join(parts)} ({self.counts['lues'] / elapsed:.0f} recettes/s)"
+
+
+def read_chunks(source, chunk_size, progress, rejected):
+    """Lecture en flux du snapshot, découpée en lots ; les recettes invalides sont écartées."""
+    chunk = []
+    dupes = NearDuplicateIndex()
+    for doc in iter_snapshot(source):
+        progress.add("lues")
+        problems = validate_recipe(doc)
+        if problems:
+            progress.add("rejetées")
+            rejected.append((doc.get("product_id") or doc.get("url"), problems))
+            continue
+        # Anciennes sauvegardes : jetons d'ingrédients canoniques et quasi-doublons calculés à la volée
+        doc = enrich(doc)
+        dupes.flag(doc)
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def drain(chunks):
+    """Lots d'une file jusqu'au signal de fin (mémorisé sur la file)."""
+    while True:
+        chunk = chunks.get()
+        if chunk is _STOP:
+            chunks.stopped = True
+            return
+        yield chunk
+
+
+def mongo_worker(db, build, chunks, progress):
+    # Upserts non ordonnés dans la collection de staging : un document en erreur n'arrête pas le lot,
+    # et une recette présente deux fois dans le snapshot n'est écrite qu'une fois
+    col = db[build["collection"]]
+    col.create_index("product_id")
+    for chunk in drain(chunks):
+        ops = [ReplaceOne({"product_id": d["product_id"]}, d, upsert=True) for d in chunk]
+        try:
+            col.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            progress.errors["mongo"] += len(e.details.get("writeErrors", []))
+        progress.add("mongo", len(chunk))
+    progress.finish("mongo")
+
+
+def es_worker(es, build, chunks, progress):
+    def stream():
+        for chunk in drain(chunks):
+            yield from chunk
+            progress.add("es", len(chunk))
+
+    ensure_index(es, build["index"])  # création avec le template (analyseur français, n-grams)
+    # Bulk parallèle, sans refresh ni réplique pendant le chargement
+    with bulk_load(es, build["index"]):
+        _, failures = bulk_index(es, stream(), index=build["index"])
+    progress.errors["es"] += len(failures)
+    progress.finish("es")
+
+
+def run_worker(name, target, args, errors):
+    try:
+        target(*args)
+    except Exception as e:
+        errors[name] = e
+        # Le lecteur ne doit pas rester bloqué sur une file pleine
+        chunks = args[2]
+        if not getattr(chunks, "stopped", False):
+            for _ in drain(chunks):
+                pass
+
+
+def restore(source, targets, chunk_size, db=None, es=None, build=None):
+    progress = Progress(targets)
+    rejected, worker_errors = [], {}
+    # Files bornées : la mémoire reste de l'ordre de quelques lots, quelle que soit la taille du snapshot
+    queues = {t: queue.Queue(maxsize=4) for t in targets}
+    workers = []
+    for t in targets:
+        target, client = (mongo_worker, db) if t == "mongo" else (es_worker, es)
+        thread = threading.Thread(target=run_worker, name=f"restore-{t}",
+                                  args=(t, target, (client, build, queues[t], progress), worker_errors),
+                                  daemon=True)
+        thread.start()
+        workers.append(thread)
+
+    last_report = time.time()
+    for chunk in read_chunks(source, chunk_size, progress, rejected):
+        for q in queues.values():
+            q.put(chunk)
+        if time.time() - last_report >= 1:
+            print(progress.line())
+            last_report = time.time()
+    for q in queues.values():
+        q.put(_STOP)
+    for thread in workers:
+        thread.join()
+    print(progress.line())
+    return progress, rejected, worker_errors
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Restaure un snapshot dans MongoDB et Elasticsearch")
+    arg_parser.add_argument("source", nargs="?", help="snapshot, .jsonl(.gz) ou ancien marmiton_data.json "
+                                                     "(défaut : marmiton_snapshot/, sinon marmiton_data.json)")
+    arg_parser.add_argument("--only", choices=["mongo", "es"], help="ne restaurer qu'une des deux bases")
+    arg_parser.add_argument("--dry-run", action="store_true", help="lit et valide le snapshot sans rien écrire")
+    arg_parser.add_argument("--force", action="store_true",
+                            help="publie même si la nouvelle génération est bien plus petite que la version en ligne")
+    arg_parser.add_argument("--chunk-size", type=int, default=1000, help="recettes par lot (défaut 1000)")
+    args = arg_parser.parse_args()
+
+    source = args.source or find_snapshot()
+    if source is None or not os.path.exists(source):
+        print(" ERREUR : Aucun snapshot ni fichier JSON trouvé !")
+        sys.exit(1)
+    print(f"Lecture de {source}...")
+
+    if args.dry_run:
+        progress, rejected, _ = restore(source, [], args.chunk_size)
+        print(f" Validation : {progress.counts['lues']} recettes lues, {len(rejected)} rejetées.")
+        for pid, problems in rejected[:20]:
+            print(f"   - {pid}: {', '.join(problems)}")
+        sys.exit(1 if rejected else 0)
+
+    targets = [args.only] if args.only else ["mongo", "es"]
+    print(f" Connexion à MongoDB sur : {MONGO_HOST}...")
+    client = MongoClient(f"mongodb://{MONGO_HOST}:27017/")
+    db = client["marmiton_db"]
+    es = None
+    if "es" in targets:
+        print(f"Connexion à Elastic sur : {ELASTIC_HOST}...")
+        es = Elasticsearch([f"http://{ELASTIC_HOST}:9200"])
+
+    # Écriture dans une nouvelle génération : l'app sert l'ancienne jusqu'à la bascule
+    build = start_build(db, es, "restore_data")
+    progress, rejected, worker_errors = restore(source, targets, args.chunk_size, db, es, build)
+
+    for t in targets:
+        if t in worker_errors:
+            print(f" Warning {t}: {worker_errors[t]}")
+        else:
+            seconds = progress.done[t]
+            print(f"  {t} OK : {progress.counts[t]} recettes en {seconds:.1f}s "
+                  f"({progress.counts[t] / max(seconds, 1e-6):.0f}/s, {progress.errors[t]} erreurs).")
+    if rejected:
+        print(f" {len(rejected)} recettes invalides ignorées (détail : --dry-run).")
+
+    if worker_errors or not publish_build(db, es, build, targets, force=args.force):
+        print(" Génération non publiée : la version en ligne est inchangée.")
+        sys.exit(1)
+    if "mongo" in targets:
+        refresh_recipe_stats(db)  # KPIs du dashboard
+        refresh_similar(db)  # "recettes similaires" des cartes de résultats
+    bump_data_version(db, "restore_data")  # l'app vide son cache de requêtes
+    print("TOUT EST TERMINÉ ! Actualise ta page.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import struct
+import hashlib
+from functools import lru_cache
+
+from ingredients import canonical_ingredients, fold, RE_WORD
+import metrics
+
+# --- QUASI-DOUBLONS (MINHASH / LSH) ---
+# Une recette = ensemble de "shingles" : ses ingrédients canoniques + les triplets de mots de ses
+# étapes. Deux reposts ou variantes mineures partagent l'essentiel de cet ensemble (Jaccard élevé).
+# Signature MinHash de NUM_PERM valeurs, découpée en BANDS bandes : deux recettes qui ont une bande
+# identique sont candidates, puis confirmées si leur similarité estimée dépasse le seuil.
+# La première recette vue d'un groupe est la référence ; les suivantes reçoivent `duplicate_of`.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.8"))
+MIN_SHINGLES = 5  # en dessous, trop peu d'information : jamais marquée comme doublon
+
+# NUM_PERM fonctions de hachage indépendantes = NUM_PERM mots de 32 bits d'un même digest SHAKE-128
+_UNPACK = struct.Struct(f"<{NUM_PERM}I").unpack
+
+
+def shingles(recipe):
+    tokens = {"i:" + tok for tok in recipe.get("ingredients_canon") or canonical_ingredients(recipe.get("ingredients"))}
+    words = RE_WORD.findall(fold(" ".join(recipe.get("steps") or [])))
+    tokens.update("s:" + " ".join(words[i:i + 3]) for i in range(len(words) - 2))
+    return tokens
+
+
+@lru_cache(maxsize=1 << 16)
+def _hashes(token):
+    # Ingrédients et tournures d'étapes ("faire fondre le") reviennent d'une recette à l'autre
+    return _UNPACK(hashlib.shake_128(token.encode("utf-8")).digest(4 * NUM_PERM))
+
+
+def signature(tokens):
+    # Minimum colonne par colonne : une valeur par fonction de hachage
+    return list(map(min, zip(*map(_hashes, tokens))))
+
+
+def similarity(sig_a, sig_b):
+    """Estimation du Jaccard : part des valeurs MinHash identiques."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """Index LSH des recettes déjà ingérées, alimenté au fil de l'eau (sink du scraper, restore_data.py).
+
+    `flag(recipe)` pose `duplicate_of` (product_id de la référence, ou None) et renvoie cette valeur.
+    Une recette déjà vue (même product_id, ex: reprise --resume) garde sa décision d'origine.
+    """
+
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        self.bands = [{} for _ in range(BANDS)]
+        self.signatures = {}
+        self.decisions = {}
+        self.stats = {"checked": 0, "duplicates": 0}
+
+    @classmethod
+    def from_collection(cls, collection, **kwargs):
+        """Index pré-rempli avec une collection existante (run incrémental sur la version en ligne)."""
+        index = cls(**kwargs)
+        for doc in collection.find({}, {"_id": 0, "product_id": 1, "ingredients_canon": 1, "ingredients": 1,
+                                        "steps": 1, "duplicate_of": 1}):
+            index.flag(doc)
+        return index
+
+    def _candidates(self, sig):
+        found = set()
+        for band, table in enumerate(self.bands):
+            found.update(table.get(tuple(sig[band * ROWS:(band + 1) * ROWS]), ()))
+        return found
+
+    def _add(self, pid, sig):
+        self.signatures[pid] = sig
+        for band, table in enumerate(self.bands):
+            table.setdefault(tuple(sig[band * ROWS:(band + 1) * ROWS]), []).append(pid)
+
+    def flag(self, recipe):
+        pid = recipe.get("product_id")
+        if pid is not None and pid in self.decisions:
+            recipe["duplicate_of"] = self.decisions[pid]
+            return recipe["duplicate_of"]
+        self.stats["checked"] += 1
+
+        tokens = shingles(recipe)
+        sig = signature(tokens) if len(tokens) >= MIN_SHINGLES else None
+        if "duplicate_of" in recipe:
+            # Décision déjà prise à l'ingestion (snapshot récent) : on la garde telle quelle
+            original = recipe["duplicate_of"]
+        else:
+            original = None
+            if sig is not None:
+                best = 0.0
+                for other in self._candidates(sig):
+                    score = similarity(sig, self.signatures[other])
+                    if score >= self.threshold and score > best:
+                        original, best = other, score
+            recipe["duplicate_of"] = original
+
+        self.decisions[pid] = original
+        if original is not None:
+            self.stats["duplicates"] += 1
+            metrics.inc("near_duplicates_total")
+        elif sig is not None:
+            # Seules les références sont indexées : un doublon pointe toujours vers l'original
+            self._add(pid, sig)
+        return original
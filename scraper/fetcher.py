@@ -0,0 +1,125 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import requests
+
+import metrics
+from scheduler import AimdRateLimiter
+
+logger = logging.getLogger("ScraperBot")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    html: str = ""
+    status: int = 0
+    via: str = "http"
+    error: str = ""
+    etag: str = ""
+    last_modified: str = ""
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+class RecipeFetcher:
+    """Télécharge les pages recettes en parallèle en HTTP simple.
+
+    Les pages qui ne contiennent pas le contenu attendu (rendu JS, anti-bot...)
+    sont rechargées via `browser_fetch` (le driver Selenium), un appel à la fois.
+    """
+
+    def __init__(self, workers=8, max_per_host=4, min_interval=0.2, timeout=20,
+                 browser_fetch=None, needs_browser=None, force_browser=False, limiter=None):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        # Limiteur partagé avec la pagination (même hôte) ; sinon débit initial = 1 / min_interval
+        self.politeness = limiter or AimdRateLimiter(max_per_host, initial_rate=1 / min_interval if min_interval else None)
+        self.browser_fetch = browser_fetch
+        self.needs_browser = needs_browser or (lambda html: False)
+        self.force_browser = force_browser
+        self._browser_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session n'est pas thread-safe : une session par thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "fr-FR,fr;q=0.9"})
+            self._local.session = session
+        return session
+
+    def _http_get(self, url, validators=None):
+        host = urlparse(url).netloc
+        headers = {}
+        if validators:
+            # Requête conditionnelle : le site répond 304 sans contenu si la page n'a pas bougé
+            if validators.get("etag"): headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"): headers["If-Modified-Since"] = validators["last_modified"]
+        self.politeness.acquire(host)
+        ok = False
+        try:
+            with metrics.span("scraper_fetch", via="http"):
+                resp = self._session().get(url, timeout=self.timeout, headers=headers)
+            metrics.inc("scraper_fetch_responses_total", via="http", status=resp.status_code)
+            ok = not AimdRateLimiter.is_failure(resp.status_code)
+            return FetchResult(url=url, html=resp.text, status=resp.status_code,
+                               etag=resp.headers.get("ETag", ""),
+                               last_modified=resp.headers.get("Last-Modified", ""))
+        finally:
+            # Timeout, erreur réseau, 429 ou 5xx : l'hôte est ralenti
+            self.politeness.release(host, ok)
+
+    def _browser_get(self, url):
+        host = urlparse(url).netloc
+        with self._browser_lock:
+            self.politeness.acquire(host)
+            ok = False
+            try:
+                with metrics.span("scraper_fetch", via="selenium"):
+                    html = self.browser_fetch(url)
+                metrics.inc("scraper_fetch_responses_total", via="selenium", status=200)
+                ok = True
+                return FetchResult(url=url, html=html, status=200, via="selenium")
+            finally:
+                self.politeness.release(host, ok)
+
+    def fetch(self, url, validators=None):
+        try:
+            if self.force_browser and self.browser_fetch:
+                return self._browser_get(url)
+
+            result = self._http_get(url, validators)
+            if result.not_modified:
+                return result
+            if self.browser_fetch and (result.status != 200 or self.needs_browser(result.html)):
+                logger.info(f" Secours Selenium ({result.status}) : {url}")
+                return self._browser_get(url)
+            return result
+        except Exception as e:
+            if self.browser_fetch and not self.force_browser:
+                try:
+                    return self._browser_get(url)
+                except Exception as e2:
+                    e = e2
+            metrics.inc("scraper_fetch_failures_total", type=type(e).__name__)
+            return FetchResult(url=url, error=f"{type(e).__name__}: {e}")
+
+    def fetch_all(self, urls, validators_for=None):
+        """Renvoie les FetchResult au fur et à mesure qu'ils arrivent (ordre non garanti).
+
+        `validators_for(url)` peut fournir l'ETag / Last-Modified connus pour une URL.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.fetch, url, validators_for(url) if validators_for else None)
+                       for url in urls]
+            for fut in as_completed(futures):
+                yield fut.result()
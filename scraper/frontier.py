@@ -0,0 +1,169 @@
+import re
+import json
+import time
+import sqlite3
+import logging
+
+import metrics
+
+logger = logging.getLogger("ScraperBot")
+
+RE_ERROR_TYPE = re.compile(r"^(\w+): ")
+
+
+def error_type(error):
+    """Type d'une erreur pour les métriques : classe de l'exception, ou préfixe "Type: message"."""
+    if isinstance(error, BaseException):
+        return type(error).__name__
+    match = RE_ERROR_TYPE.match(str(error))
+    return match.group(1) if match else "Other"
+
+# Une ligne par URL pour tout le crawl : une recette listée dans plusieurs catégories n'est
+# téléchargée qu'une fois ; toutes ses catégories sont gardées dans `categories`.
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url             TEXT PRIMARY KEY,
+    category        TEXT NOT NULL,              -- première catégorie où l'URL a été trouvée
+    kind            TEXT NOT NULL,              -- 'listing' ou 'recipe'
+    page            INTEGER,
+    status          TEXT NOT NULL DEFAULT 'pending',   -- pending / done / failed
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    result          TEXT,                       -- recette extraite (JSON), pour la reprise
+    updated_at      REAL
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_status ON frontier (kind, status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS categories (
+    url             TEXT NOT NULL,
+    category        TEXT NOT NULL,
+    PRIMARY KEY (url, category)
+);
+"""
+
+
+class CrawlFrontier:
+    """État persistant du crawl (SQLite) : pages de liste et recettes à faire / faites / en échec.
+
+    Chaque changement d'état est commité tout de suite : après un crash, `--resume`
+    repart de là où le run s'est arrêté au lieu de tout recommencer.
+    """
+
+    def __init__(self, path="crawl_state.db", max_attempts=4, backoff_base=30, backoff_max=900):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Ancien format (une ligne par URL et par catégorie) : état non réutilisable, on repart de zéro
+            self.conn.executescript("DROP TABLE IF EXISTS frontier; DROP TABLE IF EXISTS categories;")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+
+    def reset(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.execute("DELETE FROM categories")
+
+    def close(self):
+        self.conn.close()
+
+    # --- AJOUT ---
+    def add_listing(self, url, category, page):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO frontier (url, category, kind, page, updated_at) VALUES (?, ?, 'listing', ?, ?)",
+                (url, category, page, time.time()))
+
+    def add_recipes(self, urls, category):
+        """Ajoute les URLs inconnues du crawl et note la catégorie de toutes.
+
+        Renvoie le nombre de liens nouveaux *pour cette catégorie* (couples url / catégorie ajoutés) :
+        une recette déjà vue dans une autre catégorie compte, pour que la pagination continue.
+        """
+        now = time.time()
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO categories (url, category) VALUES (?, ?)",
+                                  [(u, category) for u in urls])
+            added = self.conn.total_changes - before
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO frontier (url, category, kind, updated_at) VALUES (?, ?, 'recipe', ?)",
+                [(u, category, now) for u in urls])
+            return added
+
+    # --- LECTURE ---
+    def due(self, kind, category=None):
+        """URLs à traiter maintenant : en attente, ou en échec dont le délai de backoff est écoulé."""
+        query = ("SELECT url FROM frontier WHERE kind = ? AND "
+                 "(status = 'pending' OR (status = 'failed' AND attempts < ? AND next_attempt_at <= ?))")
+        params = [kind, self.max_attempts, time.time()]
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        return [r[0] for r in self.conn.execute(query + " ORDER BY page, rowid", params)]
+
+    def is_due(self, url):
+        """Une URL précise est-elle encore à traiter (en attente, ou en échec réessayable) ?"""
+        row = self.conn.execute("SELECT status, attempts FROM frontier WHERE url = ?", (url,)).fetchone()
+        return row is not None and (row[0] == "pending" or (row[0] == "failed" and row[1] < self.max_attempts))
+
+    def next_retry_delay(self, kind):
+        """Secondes avant la prochaine URL en échec réessayable (None s'il n'y en a plus)."""
+        row = self.conn.execute(
+            "SELECT MIN(next_attempt_at) FROM frontier WHERE kind = ? AND status = 'failed' AND attempts < ?",
+            (kind, self.max_attempts)).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def categories_of(self, urls):
+        """{url: [catégories dans l'ordre de découverte]} pour un lot d'URLs."""
+        found = {}
+        urls = list(urls)
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT url, category FROM categories WHERE url IN ({','.join('?' * len(chunk))}) ORDER BY rowid",
+                chunk)
+            for url, category in rows:
+                found.setdefault(url, []).append(category)
+        return found
+
+    def results(self):
+        """Recettes déjà extraites, avec les catégories connues à ce jour."""
+        rows = self.conn.execute("SELECT url, result FROM frontier WHERE kind = 'recipe' AND status = 'done' "
+                                 "AND result IS NOT NULL")
+        for url, raw in rows:
+            recipe = json.loads(raw)
+            recipe["categories"] = self.categories_of([url]).get(url, recipe.get("categories", []))
+            yield recipe
+
+    def counts(self):
+        rows = self.conn.execute("SELECT kind, status, COUNT(*) FROM frontier GROUP BY kind, status")
+        return {f"{kind}:{status}": n for kind, status, n in rows}
+
+    # --- MISE À JOUR ---
+    def mark_done(self, url, result=None):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE frontier SET status = 'done', last_error = NULL, result = ?, updated_at = ? WHERE url = ?",
+                (json.dumps(result, ensure_ascii=False) if result is not None else None, time.time(), url))
+
+    def mark_failed(self, url, error):
+        row = self.conn.execute("SELECT attempts, kind FROM frontier WHERE url = ?", (url,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        metrics.inc("scraper_failures_total", kind=row[1] if row else "unknown", type=error_type(error))
+        # Backoff exponentiel : 30 s, 1 min, 2 min... plafonné à backoff_max
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        with self.conn:
+            self.conn.execute(
+                "UPDATE frontier SET status = 'failed', attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                "WHERE url = ?",
+                (attempts, time.time() + delay, str(error)[:500], time.time(), url))
+        if attempts >= self.max_attempts:
+            logger.error(f" Abandon après {attempts} essais : {url} ({error})")
@@ -0,0 +1,173 @@
+import io
+import os
+import sys
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+import metrics
+
+logger = logging.getLogger("ScraperBot")
+
+# --- VIGNETTES DES RECETTES ---
+# Chaque image est téléchargée une seule fois pendant le crawl, réduite (320x240 par défaut) et
+# écrite en WebP dans THUMB_DIR/<2 premiers caractères>/<product_id>.webp (volume partagé avec l'app,
+# qui les sert avec des en-têtes de cache). Le placeholder Unsplash commun n'est téléchargé qu'une
+# fois : les recettes sans image reçoivent un lien physique vers la même vignette.
+
+THUMB_DIR = os.getenv("THUMB_DIR", "thumbs")
+THUMB_SIZE = tuple(int(x) for x in os.getenv("THUMB_SIZE", "320x240").split("x"))
+THUMB_FORMAT = os.getenv("THUMB_FORMAT", "webp").lower()  # webp ou jpeg
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "75"))
+EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+
+def thumb_relpath(product_id, fmt=THUMB_FORMAT):
+    """Chemin d'une vignette relatif à THUMB_DIR (aussi son URL relative côté app)."""
+    return f"{product_id[:2]}/{product_id}{EXTENSIONS[fmt]}"
+
+
+def thumb_path(product_id, root=THUMB_DIR, fmt=THUMB_FORMAT):
+    return os.path.join(root, thumb_relpath(product_id, fmt))
+
+
+def make_thumbnail(data, size=THUMB_SIZE, fmt=THUMB_FORMAT, quality=THUMB_QUALITY):
+    """Octets d'une image -> vignette (proportions gardées, au plus `size`)."""
+    from PIL import Image  # dépendance du scraper seulement (l'app ne fait que servir les fichiers)
+
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        img.thumbnail(size, Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "webp":
+            img.save(out, "WEBP", quality=quality, method=4)
+        else:
+            img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+class ThumbnailPipeline:
+    """Étape "images" du crawl : télécharge et réduit les images en tâche de fond.
+
+    `submit(recipe)` ne bloque pas ; une vignette déjà présente n'est jamais retéléchargée.
+    Les requêtes passent par le limiteur de débit par hôte du fetcher s'il est fourni.
+    """
+
+    def __init__(self, root=THUMB_DIR, workers=4, limiter=None, timeout=15, fmt=THUMB_FORMAT):
+        self.root = root
+        self.limiter = limiter
+        self.timeout = timeout
+        self.fmt = fmt
+        self.stats = {"downloaded": 0, "cached": 0, "errors": 0}
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._placeholder_lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbs")
+        # File bornée : si les images prennent du retard, le crawl attend plutôt que d'empiler en mémoire
+        self._slots = threading.BoundedSemaphore(workers * 8)
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            from fetcher import USER_AGENT
+            session = self._local.session = requests.Session()
+            session.headers.update({"User-Agent": USER_AGENT})
+        return session
+
+    def submit(self, recipe):
+        url = recipe.get("image_url")
+        if not url or not url.startswith("http") or not recipe.get("product_id"):
+            return
+        pid = recipe["product_id"]
+        with self._lock:
+            if pid in self._seen:
+                return
+            self._seen.add(pid)
+        if os.path.exists(thumb_path(pid, self.root, self.fmt)):
+            self.stats["cached"] += 1
+            return
+        self._slots.acquire()
+        self._pool.submit(self._run, pid, url)
+
+    def _run(self, pid, url):
+        from recipe_parser import DEFAULT_IMAGE
+
+        try:
+            if url == DEFAULT_IMAGE:
+                self._link_placeholder(pid, url)
+            else:
+                self._write(pid, self._download(url))
+        except Exception as e:
+            self.stats["errors"] += 1
+            metrics.inc("scraper_thumbnails_total", outcome="error")
+            logger.warning(f" Vignette {pid} : {type(e).__name__}: {e}")
+        finally:
+            self._slots.release()
+
+    def _link_placeholder(self, pid, url):
+        shared = thumb_path("__placeholder", self.root, self.fmt)
+        with self._placeholder_lock:
+            if not os.path.exists(shared):
+                self._write("__placeholder", self._download(url))
+        path = thumb_path(pid, self.root, self.fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(shared, path)
+        except FileExistsError:
+            pass
+        self.stats["cached"] += 1
+
+    def _download(self, url):
+        host = urlparse(url).netloc
+        ok = False
+        if self.limiter:
+            self.limiter.acquire(host)
+        try:
+            with metrics.span("scraper_thumbnail"):
+                resp = self._session().get(url, timeout=self.timeout)
+                resp.raise_for_status()
+                ok = True
+                return make_thumbnail(resp.content, fmt=self.fmt)
+        finally:
+            if self.limiter:
+                self.limiter.release(host, ok)
+
+    def _write(self, pid, data):
+        path = thumb_path(pid, self.root, self.fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # l'app ne voit jamais de fichier à moitié écrit
+        self.stats["downloaded"] += 1
+        metrics.inc("scraper_thumbnails_total", outcome="downloaded")
+        metrics.inc("scraper_thumbnail_bytes_total", len(data))
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        logger.info(f" Vignettes : {self.stats['downloaded']} téléchargées, {self.stats['cached']} déjà en cache, "
+                    f"{self.stats['errors']} erreurs.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    # Rattrapage : vignettes des recettes d'un snapshot (ex: données restaurées sans crawl)
+    from snapshot import find_snapshot, iter_snapshot
+    from scheduler import limiter_from_env
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    source = sys.argv[1] if len(sys.argv) > 1 else find_snapshot()
+    if source is None:
+        sys.exit("Aucun snapshot trouvé.")
+    with ThumbnailPipeline(limiter=limiter_from_env()) as pipeline:
+        for recipe in iter_snapshot(source):
+            pipeline.submit(recipe)
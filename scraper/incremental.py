@@ -0,0 +1,93 @@
+import json
+import time
+import hashlib
+import logging
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger("ScraperBot")
+
+# Champs qui ne décrivent pas le contenu de la recette (ignorés dans l'empreinte)
+VOLATILE_FIELDS = {"_id", "updated_at"}
+
+
+def content_hash(recipe):
+    payload = {k: v for k, v in recipe.items() if k not in VOLATILE_FIELDS}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def url_id(url):
+    # Même clé que product_id (hash MD5 de l'URL)
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+class FingerprintStore:
+    """Empreintes par product_id (hash du contenu + ETag/Last-Modified) pour le mode incrémental.
+
+    Les empreintes ne sont écrites qu'au `commit()`, une fois les recettes sauvegardées :
+    un run interrompu ne marque donc jamais une recette comme à jour à tort.
+    """
+
+    def __init__(self, db, collection="recipe_fingerprints", load=True):
+        # `load=False` : empreintes du dernier passage ignorées (rebuild complet, tout est réécrit)
+        self.col = db[collection]
+        self.known = {doc["_id"]: doc for doc in self.col.find({}, {"hash": 1, "etag": 1, "last_modified": 1})} \
+            if load else {}
+        self.seen = set()
+        self.pending = {}
+        self.summary = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0}
+
+    def validators_for(self, url):
+        return self.known.get(url_id(url))
+
+    def mark_unchanged(self, url):
+        """Réponse 304 : la page n'a pas bougé depuis le dernier passage."""
+        pid = url_id(url)
+        self.seen.add(pid)
+        self.summary["unchanged"] += 1
+        self.pending[pid] = {"seen_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    def classify(self, recipe, etag="", last_modified=""):
+        """Renvoie "new", "changed" ou "unchanged" et prépare l'empreinte à enregistrer."""
+        pid = recipe["product_id"]
+        digest = content_hash(recipe)
+        previous = self.known.get(pid)
+        if previous is None:
+            status = "new"
+        elif previous.get("hash") != digest:
+            status = "changed"
+        else:
+            status = "unchanged"
+
+        self.seen.add(pid)
+        self.summary[status] += 1
+        self.pending[pid] = {
+            "hash": digest,
+            "etag": etag,
+            "last_modified": last_modified,
+            "seen_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        return status
+
+    def removed_ids(self):
+        return [pid for pid in self.known if pid not in self.seen]
+
+    def commit(self):
+        if self.pending:
+            ops = [UpdateOne({"_id": pid}, {"$set": fields}, upsert=True) for pid, fields in self.pending.items()]
+            self.col.bulk_write(ops, ordered=False)
+            self.pending = {}
+
+    def forget(self, ids):
+        if ids:
+            self.col.delete_many({"_id": {"$in": list(ids)}})
+
+    def reset(self):
+        self.col.delete_many({})
+        self.known = {}
+
+    def report(self):
+        s = self.summary
+        logger.info(f" Bilan incrémental : {s['new']} nouvelles, {s['changed']} modifiées, "
+                    f"{s['unchanged']} inchangées, {s['removed']} disparues.")
@@ -0,0 +1,197 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+from elasticsearch import helpers
+from elasticsearch.exceptions import RequestError
+
+logger = logging.getLogger("ScraperBot")
+
+INDEX_NAME = "recipes-idx"
+# L'app interroge toujours l'alias ; il pointe sur une génération `recipes-idx-<horodatage>`
+INDEX_ALIAS = "recipes"
+BULK_CHUNK_SIZE = int(os.getenv("ES_BULK_CHUNK_SIZE", "500"))
+BULK_THREADS = int(os.getenv("ES_BULK_THREADS", "4"))
+
+
+def generation_index(stamp=None):
+    return f"{INDEX_NAME}-{stamp or time.strftime('%Y%m%d%H%M%S')}"
+
+
+def es_document(recipe):
+    """Document Elasticsearch d'une recette : champs Mongo + textes concaténés pour la recherche."""
+    doc = {k: v for k, v in recipe.items() if k != '_id'}
+    doc['ingredients_text'] = ", ".join(recipe.get('ingredients', []))
+    doc['steps_text'] = " ".join(recipe.get('steps', []))
+    return doc
+
+
+TEMPLATE_NAME = "recipes-template"
+TEMPLATE_VERSION = 3
+
+# --- MAPPING EXPLICITE (analyseur français + sous-champ n-gram pour le mode Frigo) ---
+FRENCH_TEXT = {"type": "text", "analyzer": "french_folded"}
+KEYWORD_TEXT = {"type": "text", "analyzer": "french_folded", "fields": {"keyword": {"type": "keyword"}}}
+
+INDEX_TEMPLATE = {
+    "index_patterns": [f"{INDEX_NAME}*"],
+    "version": TEMPLATE_VERSION,
+    "template": {
+        "settings": {
+            "analysis": {
+                "filter": {
+                    "french_elision": {
+                        "type": "elision",
+                        "articles_case": True,
+                        "articles": ["l", "m", "t", "qu", "n", "s", "j", "d", "c",
+                                     "jusqu", "quoiqu", "lorsqu", "puisqu"],
+                    },
+                    # "1oeuf" -> "1", "oeuf" (remplace l'ancien wildcard *oeuf*)
+                    "split_numbers": {"type": "word_delimiter_graph", "split_on_numerics": True,
+                                      "generate_number_parts": False, "adjust_offsets": False},
+                    "french_stop": {"type": "stop", "stopwords": "_french_"},
+                    "french_stemmer": {"type": "stemmer", "language": "light_french"},
+                    "ingredient_edge_ngram": {"type": "edge_ngram", "min_gram": 2, "max_gram": 15},
+                },
+                "analyzer": {
+                    # "œufs", "oeufs", "Oeuf" -> "oeuf"
+                    "french_folded": {
+                        "tokenizer": "standard",
+                        "filter": ["french_elision", "split_numbers", "lowercase", "asciifolding",
+                                   "french_stop", "french_stemmer"],
+                    },
+                    "ingredient_ngram": {
+                        "tokenizer": "standard",
+                        "filter": ["french_elision", "split_numbers", "lowercase", "asciifolding",
+                                   "ingredient_edge_ngram"],
+                    },
+                    "ingredient_search": {
+                        "tokenizer": "standard",
+                        "filter": ["french_elision", "split_numbers", "lowercase", "asciifolding"],
+                    },
+                },
+            }
+        },
+        "mappings": {
+            "_meta": {"template_version": TEMPLATE_VERSION},
+            "properties": {
+                "product_id": {"type": "keyword"},
+                "name": FRENCH_TEXT,
+                "category": KEYWORD_TEXT,
+                "categories": {"type": "keyword"},
+                "duplicate_of": {"type": "keyword"},
+                "difficulty": KEYWORD_TEXT,
+                "url": {"type": "keyword", "index": False},
+                "image_url": {"type": "keyword", "index": False},
+                "rating": {"type": "float"},
+                "reviews_count": {"type": "integer"},
+                "duration_min": {"type": "integer"},
+                "ingredients": FRENCH_TEXT,
+                "steps": FRENCH_TEXT,
+                "ingredients_text": {
+                    **FRENCH_TEXT,
+                    "fields": {"ngram": {"type": "text", "analyzer": "ingredient_ngram",
+                                         "search_analyzer": "ingredient_search"}},
+                },
+                "steps_text": FRENCH_TEXT,
+                "ingredients_canon": {"type": "keyword"},
+                "updated_at": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||strict_date_optional_time"},
+            },
+        },
+    },
+}
+
+
+def ensure_template(es):
+    """Installe (ou met à jour) le template d'index si sa version a changé."""
+    try:
+        current = es.indices.get_index_template(name=TEMPLATE_NAME)["index_templates"][0]["index_template"]
+        if current.get("version") == TEMPLATE_VERSION:
+            return
+    except Exception:
+        pass
+    es.indices.put_index_template(name=TEMPLATE_NAME, body=INDEX_TEMPLATE)
+    logger.info(f" Template Elastic {TEMPLATE_NAME} v{TEMPLATE_VERSION} installé.")
+
+
+def _create_index(es, index, body=None):
+    # Plusieurs workers du crawl distribué peuvent arriver en même temps : l'index déjà créé par un autre suffit
+    try:
+        es.indices.create(index=index, body=body)
+    except RequestError as e:
+        if e.error != "resource_already_exists_exception":
+            raise
+
+
+def ensure_index(es, index=INDEX_ALIAS):
+    ensure_template(es)
+    if not es.indices.exists(index=index):
+        if index == INDEX_ALIAS and es.indices.exists(index=INDEX_NAME):
+            # Index d'avant les générations : on le met derrière l'alias tel quel
+            es.indices.put_alias(index=INDEX_NAME, name=INDEX_ALIAS)
+        elif index == INDEX_ALIAS:
+            # Premier lancement : une génération vide, déjà derrière l'alias
+            _create_index(es, generation_index(), body={"aliases": {INDEX_ALIAS: {}}})
+        else:
+            _create_index(es, index)
+        return
+    # `index` peut être l'alias : la réponse est indexée par nom d'index réel
+    for name, mapping in es.indices.get_mapping(index=index).items():
+        if mapping["mappings"].get("_meta", {}).get("template_version") != TEMPLATE_VERSION:
+            logger.warning(f" L'index {name} n'utilise pas le mapping v{TEMPLATE_VERSION} : "
+                           f"relancer restore_data.py ou un scraping complet pour le recréer.")
+
+
+def _actions(recipes, index):
+    for recipe in recipes:
+        yield {"_index": index, "_id": recipe['product_id'], "_source": es_document(recipe)}
+
+
+def bulk_index(es, recipes, index=INDEX_ALIAS, chunk_size=None, thread_count=None):
+    """Indexe un itérable de recettes via l'API bulk ; renvoie (nb indexés, liste des échecs).
+
+    Avec plusieurs threads on passe par `parallel_bulk`, sinon par `streaming_bulk`.
+    Les échecs document par document sont loggués et renvoyés, jamais avalés.
+    """
+    chunk_size = chunk_size or BULK_CHUNK_SIZE
+    thread_count = thread_count or BULK_THREADS
+    actions = _actions(recipes, index)
+    if thread_count > 1:
+        results = helpers.parallel_bulk(es, actions, thread_count=thread_count, chunk_size=chunk_size,
+                                        raise_on_error=False, raise_on_exception=False)
+    else:
+        results = helpers.streaming_bulk(es, actions, chunk_size=chunk_size,
+                                         raise_on_error=False, raise_on_exception=False)
+
+    indexed, failures = 0, []
+    for ok, info in results:
+        if ok:
+            indexed += 1
+        else:
+            failures.append(info)
+
+    for info in failures[:10]:
+        logger.error(f"Erreur Elastic (document): {info}")
+    if len(failures) > 10:
+        logger.error(f"... et {len(failures) - 10} autres échecs d'indexation.")
+    return indexed, failures
+
+
+@contextmanager
+def bulk_load(es, index=INDEX_ALIAS):
+    """Réglages de chargement massif : pas de refresh ni de réplique pendant l'import.
+
+    Les valeurs d'origine sont remises à la sortie (même en cas d'erreur), puis l'index est rafraîchi.
+    """
+    current = next(iter(es.indices.get_settings(index=index).values()))["settings"]["index"]
+    previous = {
+        "refresh_interval": current.get("refresh_interval"),
+        "number_of_replicas": current.get("number_of_replicas"),
+    }
+    es.indices.put_settings(index=index, body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}})
+    try:
+        yield
+    finally:
+        es.indices.put_settings(index=index, body={"index": previous})
+        es.indices.refresh(index=index)
@@ -0,0 +1,102 @@
+import re
+import unicodedata
+
+# --- NORMALISATION DES INGRÉDIENTS ---
+# "6 oeufs de poule" -> "oeuf", "2 cuillères à soupe de mayonnaise (light)" -> "mayonnaise",
+# "1 bocal d' asperge" -> "asperge", "huile d'olive" -> "huile olive"
+
+UNITS = (
+    r"k?g|gr|grammes?|kilos?|mg|[cdm]?l|litres?|centilitres?|"
+    r"cuill?(?:e|ie)res?(?:\s+a\s+(?:soupe|cafe|dessert))?|c\.?\s*a\.?\s*[sc]\.?|cas|cac|"
+    r"pincees?|sachets?|boites?|pots?|bocal|bocaux|tranches?|feuilles?|brins?|gousses?|"
+    r"morceaux?|verres?|tasses?|bols?|bottes?|bouquets?|poignees?|filets?|noix|noisettes?|"
+    r"paquets?|rouleaux?|barquettes?|boules?|branches?|cubes?|zestes?|traits?|doses?|"
+    r"louches?|carres?|tablettes?|plaquettes?|briques?|boites?|conserves?|rondelles?"
+)
+RE_QUANTITY = re.compile(r"^[\d\s/.,½¼¾⅓⅔\u2044-]+")
+RE_UNIT = re.compile(rf"^(?:(?:gros|grosse|petit|petite|bon|bonne|belle|demi|beau)s?\s+)?(?:{UNITS})\.?\s*(?:(?:rase|bombee|pleine)s?\s+)?(?:\b(?:de|des|du)\b|d')\s*")
+RE_MEASURE = re.compile(r"^(?:k?g|gr|mg|[cdm]?l)\b\.?\s*")
+RE_ARTICLE = re.compile(r"^(?:(?:de|du|des|la|le|les|un|une)\b\s*|[dl]'\s*)")
+RE_CUT = re.compile(r"\(|,|;|\s+ou\s+|\s+pour\s+|\s+selon\s+|\s+facultatif")
+RE_WORD = re.compile(r"[a-z]+")
+RE_AND = re.compile(r"\s+et\s+|\s*\+\s*")
+
+STOPWORDS = {"de", "du", "des", "la", "le", "les", "a", "au", "aux", "et", "en", "d", "l",
+             "un", "une", "sur", "avec", "sans", "bien", "tres"}
+ADJECTIVES = {"gros", "grosse", "petit", "petite", "beau", "belle", "bon", "bonne", "jeune", "demi",
+              "quelques", "environ"}
+# Mots qui se terminent par s/x au singulier
+INVARIABLE = {"noix", "riz", "ananas", "jus", "gras", "frais", "mais", "anchois", "radis", "pois", "cassis",
+              "couscous", "brebis", "ris", "bois", "paris", "tapas", "croix", "gros", "epais", "coulis"}
+COMPOUNDS = {
+    "pomme terre", "huile olive", "huile tournesol", "creme fraiche", "creme liquide", "sucre glace",
+    "sucre vanille", "sucre roux", "levure chimique", "levure boulanger", "pate feuilletee",
+    "pate brisee", "pate sablee", "pate pizza", "fromage blanc", "fromage rape", "jaune oeuf",
+    "blanc oeuf", "chocolat noir", "chocolat blanc", "chocolat lait", "lait coco", "poivre noir",
+    "vinaigre balsamique", "sauce soja", "jus citron", "zeste citron", "pignon pin", "fleur sel",
+    "herbe provence", "fond veau", "noix coco", "noix muscade", "poudre amande", "vin blanc", "vin rouge",
+    "pois chiche", "haricot vert", "petit pois", "sucre cassonade", "lait concentre",
+    "concentre tomate", "blanc poulet", "bouquet garni", "coulis tomate", "sauce tomate", "clou girofle",
+}
+
+
+def fold(text):
+    """Minuscules, ligatures (œ, æ) dépliées, accents supprimés, apostrophes unifiées."""
+    text = text.lower().replace("œ", "oe").replace("æ", "ae").replace("’", "'")
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def singular(word):
+    if word in INVARIABLE or len(word) <= 3:
+        return word
+    if word.endswith(("s", "x")):
+        return word[:-1]
+    return word
+
+
+def _strip_prefixes(text):
+    # Quantités et unités peuvent s'enchaîner : "1 boîte de 400 g de macédoine"
+    while True:
+        before = text
+        text = RE_QUANTITY.sub("", text)
+        text = RE_UNIT.sub("", text)
+        text = RE_MEASURE.sub("", text) if RE_QUANTITY.match(before) else text
+        text = RE_ARTICLE.sub("", text)
+        if text == before:
+            return text
+
+
+def normalize_ingredient(raw):
+    """Ingrédient brut -> jeton canonique (nom principal, ou composé connu), None si rien d'exploitable."""
+    text = RE_CUT.split(fold(raw), 1)[0].strip()
+    text = _strip_prefixes(text)
+    words = [singular(w) for w in RE_WORD.findall(text) if w not in STOPWORDS]
+    # Composé connu d'abord ("petits pois"), puis on saute les adjectifs ("2 gros oignons")
+    if " ".join(words[:2]) in COMPOUNDS:
+        return " ".join(words[:2])
+    while len(words) > 1 and words[0] in ADJECTIVES:
+        words = words[1:]
+    if not words:
+        return None
+    if " ".join(words[:2]) in COMPOUNDS:
+        return " ".join(words[:2])
+    return words[0]
+
+
+def canonical_ingredients(ingredients):
+    """Liste triée et dédoublonnée des jetons canoniques d'une recette ("sel et poivre" -> sel, poivre)."""
+    tokens = set()
+    for raw in ingredients or []:
+        for part in RE_AND.split(raw):
+            token = normalize_ingredient(part)
+            if token:
+                tokens.add(token)
+    return sorted(tokens)
+
+
+def enrich(recipe):
+    """Ajoute les jetons canoniques (`ingredients_canon`) à un document recette, si absents."""
+    if "ingredients_canon" not in recipe:
+        recipe["ingredients_canon"] = canonical_ingredients(recipe.get("ingredients"))
+    return recipe
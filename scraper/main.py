@@ -2,30 +2,85 @@ import time
 import os
 import logging
 import random
-import hashlib
-import re 
-import json 
+import argparse
+import signal
+import sys
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from bs4 import BeautifulSoup
-from pymongo import MongoClient, UpdateOne
+from pymongo import MongoClient
 from elasticsearch import Elasticsearch
+from urllib.parse import urlparse
+from fetcher import RecipeFetcher
+from scheduler import ListingBudget, budget_from_env, limiter_from_env
+from recipe_parser import parse_many, parse_listing, parse_pool
+from incremental import FingerprintStore
+from frontier import CrawlFrontier
+from workqueue import WorkQueue, POLL_INTERVAL
+from sink import RecipeSink
+from dedupe import NearDuplicateIndex
+from images import ThumbnailPipeline
+from snapshot import DEFAULT_SNAPSHOT, export_snapshot, staging_path, promote_snapshot
+from indexing import INDEX_ALIAS, ensure_index
+from stats import refresh_recipe_stats
+from similar import refresh_similar
+import metrics
+from publish import bump_data_version, start_build, current_build, publish_build, fingerprints_collection
 
 # --- CONFIG LOGGING ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("ScraperBot")
 
+# Cartes de résultats d'une page de liste (mêmes liens que XP_RECIPE_LINKS du parser)
+RESULT_CARDS = "a[href*='/recettes/recette_']"
+
 class MarmitonScraper:
-    def __init__(self):
+    def __init__(self, browser=True, local_frontier=True):
+        # `browser=False` : coordinateur du crawl distribué, qui ne charge aucune page (pas de Chrome)
         self.mongo_host = os.getenv("MONGO_HOST", "localhost")
         self.elastic_host = os.getenv("ELASTIC_HOST", "localhost")
         self.db = None
         self.es = None
-
+        self.driver = None
+        if browser:
+            self._start_driver()
+
+        # Budgets du crawl : catégories, pages max par catégorie, arrêt après N pages sans lien nouveau
+        budget = budget_from_env()
+        self.categories = budget["categories"]
+        self.pages_per_cat = budget["pages_per_cat"]
+        self.empty_pages_stop = budget["empty_stop"]
+
+        # Débit par hôte (AIMD) partagé par la pagination Selenium et les téléchargements HTTP
+        self.limiter = limiter_from_env()
+
+        # Visite des recettes : HTTP en parallèle, Chrome seulement en secours
+        self.fetcher = RecipeFetcher(
+            workers=int(os.getenv("SCRAPER_WORKERS", "8")),
+            limiter=self.limiter,
+            browser_fetch=self.browser_fetch,
+            needs_browser=self.needs_browser,
+            force_browser=os.getenv("SCRAPER_FETCH", "http") == "selenium",
+        )
+        # Processus d'extraction : nb de CPU par défaut, 0 ou 1 = extraction dans le processus du crawl
+        parse_workers = os.getenv("SCRAPER_PARSE_WORKERS", "")
+        self.parse_workers = int(parse_workers) if parse_workers else None
+        self.parse_pool = None  # pool partagé par les lots d'un crawl (voir `parsing`)
+        # Vignettes des images (THUMB_DIR), téléchargées une fois en tâche de fond ; SCRAPER_THUMBNAILS=0 pour couper
+        self.images = ThumbnailPipeline(limiter=self.limiter) \
+            if browser and os.getenv("SCRAPER_THUMBNAILS", "1") != "0" else None
+        self.fingerprints = None
+        self.validators = {}
+
+        # Frontière persistante du crawl (reprise après crash avec --resume) ; en crawl distribué,
+        # remplacée après la connexion par la file de travail partagée dans Mongo (WorkQueue)
+        self.frontier = CrawlFrontier(os.getenv("CRAWL_STATE_PATH", "crawl_state.db")) if local_frontier else None
+
+    def _start_driver(self):
         chrome_options = Options()
         chrome_options.add_argument("--headless=new") 
         chrome_options.add_argument("--disable-search-engine-choice-screen")
@@ -40,11 +95,6 @@ class MarmitonScraper:
         self.driver.set_page_load_timeout(30)
         self.wait = WebDriverWait(self.driver, 10)
 
-        self.categories = ["entree", "plat-principal", "dessert"]
-        
-        
-        self.pages_per_cat = 33 
-
     def connect(self):
         for i in range(30):
             try:
@@ -64,258 +114,508 @@ class MarmitonScraper:
                 time.sleep(2)
         return False
 
-    def scrape(self):
-        all_recipes = []
-        cookies_accepted = False
+    def scrape(self, sink, fingerprints=None, resume=False):
+        """Lance le crawl et pousse chaque recette extraite dans `sink` (rien n'est gardé en mémoire).
+
+        Avec un FingerprintStore, les recettes inchangées ne sont pas poussées.
+        L'avancement est enregistré dans la frontière SQLite ; avec `resume=True` on
+        reprend le run précédent (pages et recettes déjà faites sautées, échecs réessayés).
+        Renvoie le nombre de recettes poussées.
+        """
+        self.fingerprints = fingerprints
+        self.validators = {}
+        if not resume:
+            self.frontier.reset()
+
+        pushed = 0
+        if resume:
+            # Les recettes déjà extraites sont renvoyées au sink (upserts idempotents) :
+            # celles du dernier lot non flushé avant le crash ne sont pas perdues.
+            for recipe in self.frontier.results():
+                if self.fingerprints is not None:
+                    self.fingerprints.classify(recipe)
+                sink.push(recipe)
+                self.fetch_thumbnail(recipe)
+                pushed += 1
+            logger.info(f" Reprise : {pushed} recettes déjà extraites ({self.frontier.counts()})")
+
+        self.open_site()
+
+        # --- DÉCOUVERTE (PAGINATION DE TOUTES LES CATÉGORIES) ---
+        # La frontière est commune au crawl : une recette listée dans plusieurs catégories
+        # n'y entre qu'une fois, avec la liste de ses catégories
+        for cat in self.categories:
+            logger.info(f"Traitement de la catégorie : {cat.upper()} ...")
 
-        # Init site
+            # Pages ajoutées à la frontière au fur et à mesure : on s'arrête dès que la liste
+            # ne donne plus de lien nouveau, sans charger les pages restantes du budget
+            budget = ListingBudget(self.pages_per_cat, self.empty_pages_stop)
+            total_links = 0
+            for page_num in budget.pages():
+                url_search = self._listing_url(cat, page_num)
+                self.frontier.add_listing(url_search, cat, page_num)
+                if not self.frontier.is_due(url_search):
+                    continue  # déjà faite (reprise --resume)
+                added = self.visit_listing(url_search, cat)
+                if added is None:
+                    continue
+                total_links += added
+                budget.record(added)
+
+            if budget.stopped_early:
+                metrics.inc("scraper_listing_early_stops_total", category=cat)
+                logger.info(f" Pagination arrêtée après {budget.empty_streak} pages sans nouveau lien "
+                            f"({budget.visited} pages chargées sur {self.pages_per_cat}).")
+            logger.info(f"TOTAL nouveaux liens pour {cat}: {total_links}")
+
+        # --- VISITE RECETTES (TÉLÉCHARGEMENT + PARSING EN PARALLÈLE) ---
+        # Chaque URL une seule fois pour tout le crawl. Passe principale, puis nouvelles passes
+        # sur les échecs une fois leur backoff écoulé
+        with self.parsing():
+            while True:
+                urls_to_visit = self.frontier.due("recipe")
+                if not urls_to_visit:
+                    delay = self.frontier.next_retry_delay("recipe")
+                    if delay is None:
+                        break
+                    logger.info(f" Nouvel essai des échecs dans {int(delay)}s...")
+                    time.sleep(delay)
+                    continue
+                pushed += self.visit_recipes(urls_to_visit, sink)
+
+        return pushed
+
+    def open_site(self):
+        """Page d'accueil + bandeau cookies, avant la première page de liste."""
         try:
             self.driver.get("https://www.marmiton.org")
-            if not cookies_accepted:
-                try:
-                    btn = self.wait.until(EC.element_to_be_clickable((By.ID, "didomi-notice-agree-button")))
-                    btn.click()
-                    cookies_accepted = True
-                    time.sleep(1)
-                except: pass
+            try:
+                btn = self.wait.until(EC.element_to_be_clickable((By.ID, "didomi-notice-agree-button")))
+                btn.click()
+                self.wait.until(EC.invisibility_of_element_located((By.ID, "didomi-notice-agree-button")))
+            except: pass
         except Exception as e:
             logger.error(f"Erreur init site: {e}")
 
-        for cat in self.categories:
-            logger.info(f"Traitement de la catégorie : {cat.upper()} ...")
-            
-            urls_to_visit = []
-            seen = set()
-
-            # --- PAGINATION ---
-            for page_num in range(1, self.pages_per_cat + 1):
-                try:
-                    url_search = f"https://www.marmiton.org/recettes/recherche.aspx?aqt={cat}&page={page_num}"
-                    logger.info(f" Chargement de la page {page_num}...")
-                    
-                    try:
-                        self.driver.get(url_search)
-                    except TimeoutException:
-                        logger.warning(" Timeout liste. On continue.")
-                    
-                    time.sleep(1.5)
-                    self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
-                    time.sleep(0.5)
-
-                    soup = BeautifulSoup(self.driver.page_source, "html.parser")
-                    links = soup.find_all("a", href=True)
-                    
-                    count_before = len(urls_to_visit)
-                    
-                    for l in links:
-                        href = l['href']
-                        if "/recettes/recette_" in href:
-                            full = "https://www.marmiton.org" + href if href.startswith("/") else href
-                            if full not in seen:
-                                urls_to_visit.append(full)
-                                seen.add(full)
-                    
-                    logger.info(f"-> {len(urls_to_visit) - count_before} nouveaux liens trouvés.")
-
-                except Exception as e:
-                    logger.error(f" Erreur page {page_num}: {e}")
+    def visit_listing(self, url, cat):
+        """Charge une page de liste et ajoute ses recettes à la frontière ; renvoie le nombre de liens
+        nouveaux pour `cat` (même déjà vus dans une autre catégorie), ou None si la page est en échec."""
+        try:
+            logger.info(f" Chargement de {url}...")
+            found = self.load_listing(url)
+            added = self.frontier.add_recipes(found, cat)
+            metrics.inc("scraper_listing_links_total", len(found), category=cat)
+            self.frontier.mark_done(url)
+            logger.info(f"-> {added} nouveaux liens trouvés.")
+            return added
+        except Exception as e:
+            logger.error(f" Erreur page {url}: {e}")
+            self.frontier.mark_failed(url, e)
+            return None
+
+    def visit_recipes(self, urls, sink):
+        """Télécharge et analyse un lot de recettes de la frontière ; renvoie le nombre de recettes poussées."""
+        pushed = 0
+        categories = self.frontier.categories_of(urls)
+        pages = self._fetched_pages(urls, categories)
+        for url, recipe in parse_many(pages, workers=self.parse_workers, pool=self.parse_pool):
+            cat = categories[url][0]
+            if recipe is None:
+                metrics.inc("scraper_recipes_total", outcome="failed", category=cat)
+                self.frontier.mark_failed(url, "NoRecipe: page sans recette exploitable")
+                continue
+            recipe["categories"] = categories[url]
+            if not recipe["duration_min"]:
+                metrics.inc("scraper_duration_missing_total", category=cat)
+
+            self.fetch_thumbnail(recipe)  # aussi pour les recettes inchangées : rattrapage des vignettes manquantes
+            if self.fingerprints is not None:
+                etag, last_modified = self.validators.pop(url, ("", ""))
+                if self.fingerprints.classify(recipe, etag, last_modified) == "unchanged":
+                    metrics.inc("scraper_recipes_total", outcome="unchanged", category=cat)
+                    self.frontier.mark_done(url)
                     continue
-            
-            logger.info(f"TOTAL liens à visiter pour {cat}: {len(urls_to_visit)}")
-
-            # --- VISITE RECETTES ---
-            for url in urls_to_visit:
-                try:
-                    logger.info(f" Visite : {url}")
-                    try:
-                        self.driver.get(url)
-                    except TimeoutException:
-                        logger.warning("Timeout page. Analyse partielle.")
-                    
-                    time.sleep(1) 
-                    page_soup = BeautifulSoup(self.driver.page_source, "html.parser")
-                    
-                    # 1. ID & TITRE
-                    p_id = hashlib.md5(url.encode()).hexdigest()
-                    h1 = page_soup.find("h1")
-                    title = h1.get_text(strip=True) if h1 else "Recette Inconnue"
-                    if title == "Recette Inconnue": continue
-
-                    # 2. INGREDIENTS 
-                    ingredients = [d.get_text(" ", strip=True) for d in page_soup.select(".item__ingredient .ingredient-name")]
-                    if not ingredients: ingredients = [d.get_text(" ", strip=True) for d in page_soup.select(".card-ingredient-title")]
-                    
-                    steps = [s.get_text(strip=True) for s in page_soup.select(".recipe-step-list__container p")]
-
-                    # 3. IMAGE
-                    img_url = ""
-                    meta_img = page_soup.find("meta", property="og:image")
-                    if meta_img: img_url = meta_img.get("content", "")
-
-                    mots_interdits = ["placeholder", "logo", "default", "no-photo", "p_global_en_tete"]
-                    est_mauvaise_image = False
-                    if not img_url: est_mauvaise_image = True
-                    else:
-                        for mot in mots_interdits:
-                            if mot in img_url.lower():
-                                est_mauvaise_image = True
-                                break
-                    if est_mauvaise_image:
-                        img_url = "https://images.unsplash.com/photo-1546069901-ba9599a7e63c?q=80&w=800&auto=format&fit=crop"
-
-                    # 4. INFOS & DIFFICULTÉ
-                    difficulty = "Moyen"
-                    infos_items = [i.get_text(strip=True).lower() for i in page_soup.select(".recipe-primary__item")]
-                    
-                    for info in infos_items:
-                        if "très facile" in info:
-                            difficulty = "Très facile"
-                            break
-                        elif "facile" in info:
-                            difficulty = "Facile"
-                            break
-                        elif "difficile" in info:
-                            difficulty = "Difficile"
-                            break
-                        elif "moyen" in info:
-                            difficulty = "Moyen"
-                            break
-
-                    
-                    duration = 0
-                    header_text = " ".join(infos_items).lower().replace("heure", "h")
-                    
-                    if not any(char.isdigit() for char in header_text):
-                        header_text = page_soup.get_text(" ", strip=True).lower()[:1000].replace("heure", "h")
-
-                    try:
-                        p_hour = re.search(r'(\d+)\s*h', header_text)
-                        if p_hour: duration += int(p_hour.group(1)) * 60
-                        
-                        p_min = re.search(r'(\d+)\s*min', header_text) 
-                        if p_min:
-                            duration += int(p_min.group(1))
-                        elif not p_hour: 
-                            p_min_short = re.search(r'temps\s*[:\s]\s*(\d+)\s*m', header_text)
-                            if p_min_short: duration += int(p_min_short.group(1))
-                    except Exception:
-                        duration = 0
-                    
-                    if duration == 0:
-                        logger.warning(f"TEMPS NON TROUVÉ (0 min) pour : {url}")
-
-                    # 6. REVIEWS & NOTE
-                    reviews_count = 0
-                    try:
-                        rev_tag = page_soup.select_one(".recipe-header__rating-count")
-                        if rev_tag:
-                            nums = re.findall(r'\d+', rev_tag.get_text())
-                            if nums: reviews_count = int(nums[0])
-                    except: pass
-
-                    rating = 0.0
-                    match_rate = page_soup.select_one(".recipe-header__rating-text")
-                    if match_rate:
-                        try: rating = float(match_rate.get_text().strip().replace("/5", "").replace(",", "."))
-                        except: pass
-
-                    recipe = {
-                        "product_id": p_id,
-                        "name": title,
-                        "category": cat,
-                        "url": url,
-                        "image_url": img_url,
-                        "difficulty": difficulty,
-                        "rating": rating,
-                        "reviews_count": reviews_count,
-                        "duration_min": duration,      
-                        "ingredients": ingredients,
-                        "steps": steps,
-                        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    
-                    all_recipes.append(recipe)
-                    logger.info(f"     + {title[:20]}... ({rating} | {duration}m)")
 
-                except Exception as e:
-                    logger.error(f"Erreur: {e}")
+            metrics.inc("scraper_recipes_total", outcome="pushed", category=cat)
+            self.frontier.mark_done(url, recipe)
+            sink.push(recipe)
+            pushed += 1
+            logger.info(f"     + {recipe['name'][:20]}... ({recipe['rating']} | {recipe['duration_min']}m)")
+        return pushed
+
+    @contextmanager
+    def parsing(self):
+        """Un seul pool d'extraction pour tous les lots du bloc, au lieu d'un pool créé par lot."""
+        self.parse_pool = parse_pool(self.parse_workers)
+        try:
+            yield
+        finally:
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+            self.parse_pool = None
+
+    # --- CRAWL DISTRIBUÉ ---
+    def coordinate(self, queue, collection, resume=False):
+        """Coordinateur : sème les premières pages de liste, puis attend que les workers aient vidé la file.
+
+        Les recettes marquées faites mais absentes de `collection` (worker tué avant d'écrire son dernier
+        lot) sont remises en file, jusqu'à ce qu'il n'en manque plus aucune.
+        """
+        if not resume or not queue.counts():
+            queue.reset()
+            for cat in self.categories:
+                queue.add_listing(self._listing_url(cat, 1), cat, 1)
+        grace = 3 * float(os.getenv("SINK_FLUSH_INTERVAL", "5"))
+        while True:
+            for key, n in queue.counts().items():
+                kind, status = key.split(":")
+                metrics.set_gauge("scraper_queue_items", n, kind=kind, status=status)
+            if queue.outstanding() == 0:
+                time.sleep(grace)  # derniers lots des sinks des workers
+                if queue.outstanding() == 0 and not queue.requeue_missing(collection):
+                    break
+            time.sleep(POLL_INTERVAL)
+        logger.info(f" File de travail vidée : {queue.counts()}")
+
+    def work(self, queue, run, sink, fingerprints=None):
+        """Worker : réserve des URLs dans la file partagée et les traite jusqu'à la fin du run.
+
+        Une page de liste faite ajoute la suivante à la file, avec le même budget que le crawl local
+        (pages max, arrêt après N pages sans lien nouveau). Le run est relu avant chaque réservation :
+        s'il a été remplacé (coordinateur relancé sans --resume), on s'arrête tout de suite.
+        Renvoie le nombre de recettes poussées.
+        """
+        self.frontier = queue
+        self.fingerprints = fingerprints
+        self.validators = {}
+        self.open_site()
+        pushed = 0
+        with queue.heartbeat(), self.parsing():
+            while True:
+                state = queue.run()
+                if state is None or state.get("run_id") != run["run_id"]:
+                    logger.warning(" Run remplacé par le coordinateur : arrêt des écritures de ce run.")
+                    break
+                items = queue.claim()
+                if not items:
+                    if state["status"] != "running":
+                        break
+                    time.sleep(POLL_INTERVAL)
                     continue
+                for item in items:
+                    if item["kind"] == "listing":
+                        self._next_listing(queue, run, item, self.visit_listing(item["url"], item["category"]))
+                recipes = [item["url"] for item in items if item["kind"] == "recipe"]
+                if recipes:
+                    pushed += self.visit_recipes(recipes, sink)
+        return pushed
+
+    def _next_listing(self, queue, run, item, added):
+        if added is None:
+            return  # page réessayée par la file ; la suivante sera ajoutée à ce moment-là
+        cat, page = item["category"], item["page"]
+        streak = 0 if added else item.get("empty_streak", 0) + 1
+        if page >= run["pages_per_cat"]:
+            return
+        if run["empty_stop"] and streak >= run["empty_stop"]:
+            metrics.inc("scraper_listing_early_stops_total", category=cat)
+            logger.info(f" Pagination {cat} arrêtée après {streak} pages sans nouveau lien (page {page}).")
+            return
+        queue.add_listing(self._listing_url(cat, page + 1), cat, page + 1, empty_streak=streak)
+
+    @staticmethod
+    def _listing_url(cat, page_num):
+        return f"https://www.marmiton.org/recettes/recherche.aspx?aqt={cat}&page={page_num}"
+
+    def _fetched_pages(self, urls, categories):
+        validators_for = self.fingerprints.validators_for if self.fingerprints is not None else None
+        for res in self.fetcher.fetch_all(urls, validators_for):
+            logger.info(f" Visite : {res.url} ({res.via})")
+            if res.error:
+                logger.error(f"Erreur: {res.error}")
+                self.frontier.mark_failed(res.url, res.error)
+                continue
+            if res.not_modified:
+                self.fingerprints.mark_unchanged(res.url)
+                self.frontier.mark_done(res.url)
+                continue
+            self.validators[res.url] = (res.etag, res.last_modified)
+            # `category` = première catégorie où la recette est apparue ; `categories` = toutes
+            yield res.html, res.url, categories[res.url][0]
+
+    def _page_ready(self, selector):
+        """Attend l'élément `selector`, ou la fin du chargement s'il n'apparaît pas (page vide)."""
+        def ready(driver):
+            return driver.find_elements(By.CSS_SELECTOR, selector) or \
+                driver.execute_script("return document.readyState") == "complete"
+        try:
+            self.wait.until(ready)
+        except TimeoutException:
+            logger.warning(" Page incomplète. Analyse partielle.")
+
+    def load_listing(self, url):
+        """Charge une page de résultats et renvoie ses liens recettes, sans pause fixe.
+
+        On attend les cartes de résultats, puis que leur nombre se stabilise après le scroll
+        (chargement différé). Passe par le limiteur de l'hôte : un timeout ralentit la pagination.
+        """
+        host = urlparse(url).netloc
+        self.limiter.acquire(host)
+        ok = True
+        try:
+            try:
+                with metrics.span("scraper_listing"):
+                    self.driver.get(url)
+            except TimeoutException:
+                ok = False
+                logger.warning(" Timeout liste. On continue.")
+            self._page_ready(RESULT_CARDS)
+            if self.driver.find_elements(By.CSS_SELECTOR, RESULT_CARDS):
+                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
+                counts = []
+
+                def settled(driver):
+                    counts.append(len(driver.find_elements(By.CSS_SELECTOR, RESULT_CARDS)))
+                    return len(counts) >= 2 and counts[-1] == counts[-2]
+                try:
+                    WebDriverWait(self.driver, 3, poll_frequency=0.2).until(settled)
+                except TimeoutException:
+                    pass
+            return parse_listing(self.driver.page_source)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.limiter.release(host, ok)
 
-        return all_recipes
+    def browser_fetch(self, url):
+        """Chargement d'une page via Chrome (secours pour les pages qui ont besoin du JS)."""
+        try:
+            self.driver.get(url)
+        except TimeoutException:
+            logger.warning("Timeout page. Analyse partielle.")
+        self._page_ready("h1")
+        return self.driver.page_source
+
+    @staticmethod
+    def needs_browser(html):
+        # Page statique exploitable = titre + liste d'ingrédients présents dans le HTML
+        return "<h1" not in html or "ingredient" not in html
+
+    def open_sink(self, append=False, with_snapshot=True, build=None):
+        # `build` : génération en construction (rebuild complet), sinon écriture directe dans la version en ligne
+        # (les quasi-doublons sont alors cherchés aussi parmi les recettes déjà en ligne)
+        return RecipeSink(
+            self.db, self.es,
+            index=build["index"] if build else INDEX_ALIAS,
+            collection=build["collection"] if build else "recipes",
+            # Snapshot écrit à côté de l'actuel : remplacé seulement après publication (`promote_snapshot`)
+            snapshot_path=staging_path(DEFAULT_SNAPSHOT) if with_snapshot else None,
+            append=append,
+            batch_size=int(os.getenv("SINK_BATCH_SIZE", "200")),
+            flush_interval=float(os.getenv("SINK_FLUSH_INTERVAL", "5")),
+            dedupe=None if build else NearDuplicateIndex.from_collection(self.db["recipes"]),
+        )
 
     def save(self, data):
+        """Sauvegarde d'une liste déjà constituée (même chemin que le crawl : sink par lots)."""
         if not data:
             logger.warning(" Aucune donnée.")
             return
 
         logger.info(f" Traitement de {len(data)} recettes...")
+        with self.open_sink() as sink:
+            for d in data:
+                sink.push(d)
+        promote_snapshot(DEFAULT_SNAPSHOT)
+        self.refresh_stats()
 
-        # --- 1. SAUVEGARDE JSON (SÉCURITÉ) ---
+    def refresh_stats(self):
+        """Met à jour les KPIs matérialisés et publie une nouvelle version des données (cache de l'app)."""
         try:
-            with open("marmiton_data.json", "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-            logger.info(" Fichier JSON créé !")
+            refresh_recipe_stats(self.db)
+            refresh_similar(self.db)
+            bump_data_version(self.db, "scraper")
         except Exception as e:
-            logger.error(f"Erreur JSON: {e}")
+            logger.error(f"Erreur stats Mongo: {e}")
 
-        # --- 2. MONGODB ---
+    def export_backup(self):
+        """Snapshot complet depuis Mongo (en incrémental, le sink n'a écrit que le delta)."""
         try:
-            ops = [UpdateOne({'product_id': d['product_id']}, {'$set': d}, upsert=True) for d in data]
-            self.db["recipes"].bulk_write(ops)
-            logger.info(" MongoDB OK")
+            export_snapshot(self.db["recipes"].find({}, {"_id": 0}), DEFAULT_SNAPSHOT)
         except Exception as e:
-            logger.error(f"Erreur Mongo: {e}")
+            logger.error(f"Erreur export snapshot: {e}")
+
+    def finish_incremental(self, prune=False):
+        """Enregistre les empreintes du run et traite les recettes disparues du site.
+
+        Pour un rebuild, les empreintes vont dans la collection de la génération : elles ne passent en
+        ligne qu'avec elle (`publish_build`).
+        """
+        fp = self.fingerprints
+        removed = fp.removed_ids()
+        fp.summary["removed"] = len(removed)
+        if prune and removed:
+            self.db["recipes"].delete_many({"product_id": {"$in": removed}})
+            for pid in removed:
+                try:
+                    self.es.delete(index=INDEX_ALIAS, id=pid, ignore=[404])
+                except Exception as e:
+                    logger.error(f"Erreur Elastic: {e}")
+            fp.forget(removed)
+            logger.info(f" {len(removed)} recettes disparues supprimées.")
+        fp.commit()
+        fp.report()
 
-        # --- 3. ELASTICSEARCH ---
-        try:
-            if not self.es.indices.exists(index="recipes-idx"):
-                self.es.indices.create(index="recipes-idx")
-            for d in data:
-                clean_doc = {k:v for k,v in d.items() if k != '_id'}
-                clean_doc['ingredients_text'] = ", ".join(d['ingredients'])
-                clean_doc['steps_text'] = " ".join(d['steps'])
-                self.es.index(index="recipes-idx", id=d['product_id'], document=clean_doc)
-            logger.info("  Elasticsearch OK")
-        except Exception as e:
-            logger.error(f"Erreur Elastic: {e}")
+    def fetch_thumbnail(self, recipe):
+        if self.images is not None:
+            self.images.submit(recipe)
 
     def close(self):
+        if self.images is not None:
+            self.images.close()
         if self.driver:
             self.driver.quit()
             logger.info("Driver Chrome fermé.")
 
 
+def stop_on_sigterm(signum, frame):
+    # `docker stop` / réduction de --scale : arrêt propre (dernier lot écrit, URLs réservées rendues)
+    raise KeyboardInterrupt
+
+
+def run_coordinator(args):
+    """Crawl distribué, coordinateur : génération cible, file de travail, puis publication une fois la file vide."""
+    bot = MarmitonScraper(browser=False, local_frontier=False)
+    try:
+        if not bot.connect():
+            return
+        queue = WorkQueue(bot.db)
+        build = None
+        if not args.incremental:
+            build = current_build(bot.db, "scraper") if args.resume else None
+            if build is None:
+                build = start_build(bot.db, bot.es, "scraper")
+        else:
+            # Alias (et première génération si besoin) créés une seule fois, avant l'arrivée des workers
+            ensure_index(bot.es)
+            if args.prune:
+                logger.warning(" --prune n'est pas géré en crawl distribué (empreintes réparties entre les workers).")
+        # Reprise de la file seulement pour le même run (même génération, même mode)
+        previous = queue.run() if args.resume else None
+        resume = previous is not None and previous.get("run_id") is not None and \
+            previous.get("build") == build and previous.get("incremental") == args.incremental
+        # Les workers lisent ici la génération où écrire et les budgets de pagination
+        queue.start_run(run_id=previous["run_id"] if resume else None, build=build, incremental=args.incremental,
+                        pages_per_cat=bot.pages_per_cat, empty_stop=bot.empty_pages_stop)
+        logger.info(f" Coordinateur : file de travail prête pour {', '.join(bot.categories)}.")
+        bot.coordinate(queue, bot.db[build["collection"] if build else "recipes"], resume=resume)
+        queue.finish_run()
+        published = build is None or publish_build(bot.db, bot.es, build)
+        bot.refresh_stats()
+        if published:  # génération refusée : la sauvegarde précédente reste en place
+            bot.export_backup()  # les workers n'écrivent pas de snapshot : export complet depuis Mongo
+    except KeyboardInterrupt:
+        logger.warning("Arrêt du coordinateur (reprise avec --coordinator --resume).")
+    finally:
+        bot.close()
+        if os.getenv("METRICS_FILE"):
+            metrics.write_metrics_file(os.getenv("METRICS_FILE"))
+
+
+def run_worker():
+    """Crawl distribué, worker : traite la file partagée et écrit ses recettes dans la génération du run."""
+    bot = MarmitonScraper(local_frontier=False)
+    queue = None
+    try:
+        if not bot.connect():
+            return
+        queue = WorkQueue(bot.db)
+        while True:
+            run = queue.wait_for_run()
+            logger.info(f" Worker {queue.worker} : run {run['run_id']} "
+                        f"({'incrémental' if run['incremental'] else 'complet'}).")
+            # Empreintes connues seulement en incrémental : un run complet réécrit toutes les recettes,
+            # et enregistre les siennes avec sa génération
+            fingerprints = FingerprintStore(bot.db, fingerprints_collection(run["build"]), load=run["incremental"])
+            # Sink ouvert par run : sa génération (collection de staging, index) est celle du run
+            with metrics.profiling("scraper"), bot.open_sink(with_snapshot=False, build=run["build"]) as sink:
+                count = bot.work(queue, run, sink, fingerprints)
+            logger.info(f" Worker {queue.worker} : {count} recettes poussées.")
+            if not queue.is_current(run):
+                continue  # nouveau run : on s'y rattache avec un nouveau sink
+            fingerprints.commit()
+            break
+    except KeyboardInterrupt:
+        logger.warning("Arrêt du worker.")
+    finally:
+        if queue is not None:
+            queue.release()
+        bot.close()
+        if os.getenv("METRICS_FILE"):
+            metrics.write_metrics_file(os.getenv("METRICS_FILE"))
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scraper Marmiton")
+    parser.add_argument("--incremental", action="store_true",
+                        help="ne met à jour que les recettes nouvelles ou modifiées (pas de remise à zéro)")
+    parser.add_argument("--prune", action="store_true",
+                        help="en incrémental, supprime les recettes qui n'apparaissent plus sur le site")
+    parser.add_argument("--resume", action="store_true",
+                        help="reprend le dernier run interrompu depuis la frontière (crawl_state.db)")
+    parser.add_argument("--coordinator", action="store_true",
+                        help="crawl distribué : remplit la file de travail Mongo, attend les workers puis publie")
+    parser.add_argument("--worker", action="store_true",
+                        help="crawl distribué : traite les URLs de la file de travail jusqu'à la fin du run")
+    args = parser.parse_args()
+
+    # Métriques : METRICS_PORT (endpoint Prometheus) et/ou METRICS_FILE ; PROFILE=cprofile|pyinstrument
+    metrics.start_exporter_from_env()
+    if args.coordinator or args.worker:
+        signal.signal(signal.SIGTERM, stop_on_sigterm)
+        if args.coordinator:
+            run_coordinator(args)
+        else:
+            run_worker()
+        sys.exit(0)
     bot = MarmitonScraper()
     
     # 1. On se connecte
     if bot.connect():
         
-        # --- ETAPE 1 : ON NETTOIE D'ABORD (MÉNAGE) ---
-        print("NETTOYAGE EN COURS (AVANT SCRAPING)...")
-        
-        # A. On vide MongoDB
-        bot.db["recipes"].drop()
-        print("MongoDB vidé.")
-        
-        # B. On vide Elasticsearch
-        try:
-            if bot.es.indices.exists(index="recipes-idx"):
-                bot.es.indices.delete(index="recipes-idx")
-                print("Elasticsearch vidé.")
-        except Exception as e:
-            print(f"Info Elastic: {e}")
-            
-        print(" Bases de données prêtes à recevoir les nouvelles données !")
-       
+        # --- ETAPE 1 : NOUVELLE GÉNÉRATION (BLEU/VERT) ---
+        # Un run complet écrit dans un index horodaté + une collection de staging : l'app continue
+        # de servir la version en ligne pendant tout le crawl, jusqu'à la bascule finale.
+        build = None
+        if not args.incremental:
+            build = current_build(bot.db, "scraper") if args.resume else None
+            if build is None:
+                build = start_build(bot.db, bot.es, "scraper")
 
         # --- ETAPE 2 : ON LANCE LE SCRAPING ---
         logger.info(" Démarrage du Scraper HYBRIDE (Gros Volume)...")
         try:
-            data = bot.scrape()     # On récupère les données
-            bot.save(data)          # On sauvegarde les données
+            # Les recettes sont sauvegardées par lots pendant le crawl (snapshot + Mongo + Elastic)
+            # Même en mode complet on calcule les empreintes, pour que le prochain run incrémental en profite
+            # (en incrémental le snapshot complet est réexporté depuis Mongo à la fin)
+            with metrics.profiling("scraper"), \
+                    bot.open_sink(append=args.resume, with_snapshot=not args.incremental, build=build) as sink:
+                # Rebuild : empreintes recalculées dans la génération, mises en ligne avec elle
+                count = bot.scrape(sink, FingerprintStore(bot.db, fingerprints_collection(build), load=build is None),
+                                   resume=args.resume)
+            if args.incremental and not count:
+                logger.info(" Rien de nouveau depuis le dernier passage.")
+            bot.finish_incremental(prune=args.incremental and args.prune)
+            if build and publish_build(bot.db, bot.es, build):  # validation + bascule alias / collection
+                promote_snapshot(DEFAULT_SNAPSHOT)  # le snapshot du run remplace le précédent
+            bot.refresh_stats()                 # KPIs du dashboard (collection recipe_stats)
+            if args.incremental:
+                bot.export_backup()
         except KeyboardInterrupt:
             logger.warning("Arrêt manuel.")
         finally:
             bot.close()
-            logger.info(" Terminé. Les données sont sauvegardées et sécurisées.")
\ No newline at end of file
+            if os.getenv("METRICS_FILE"):
+                metrics.write_metrics_file(os.getenv("METRICS_FILE"))  # état final du run
+            logger.info(" Terminé. Les données sont sauvegardées et sécurisées.")
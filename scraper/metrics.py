@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger("ScraperBot")
+
+# --- MÉTRIQUES (FORMAT PROMETHEUS) ---
+# Compteurs, jauges et histogrammes en mémoire, exposés en texte Prometheus sur un petit
+# serveur HTTP (METRICS_PORT) et/ou réécrits périodiquement dans un fichier (METRICS_FILE).
+# Partagé par le scraper et l'app ; sans configuration, rien n'est exposé et le coût est négligeable.
+
+# Bornes en secondes : du parsing d'une page (ms) au chargement Selenium (dizaines de s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels_key(labels))] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(hist["buckets"]):
+                if value <= bound:
+                    hist["counts"][i] += 1
+                    break
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def render(self):
+        """Texte d'exposition Prometheus (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({n for n, _ in series}):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (n, key), value in sorted(series.items()):
+                        if n == name:
+                            lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted({n for n, _ in self._histograms}):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for (n, key), hist in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(hist["buckets"], hist["counts"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist['sum']:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+describe = REGISTRY.describe
+
+
+def set_gauge(name, value, **labels):
+    REGISTRY.set(name, value, **labels)
+
+
+@contextmanager
+def span(name, **labels):
+    """Chronomètre un bloc : histogramme `<name>_seconds`, et `<name>_errors_total{type=...}` si exception."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        REGISTRY.inc(f"{name}_errors_total", type=type(e).__name__, **labels)
+        raise
+    finally:
+        REGISTRY.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+
+# --- EXPOSITION ---
+def start_http_server(port, registry=REGISTRY):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f" Métriques Prometheus sur :{port}/metrics")
+    return httpd
+
+
+def write_metrics_file(path, registry=REGISTRY):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+def start_file_flusher(path, interval=15.0, registry=REGISTRY):
+    """Réécrit le fichier toutes les `interval` secondes (lisible par le textfile collector de node_exporter)."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_metrics_file(path, registry)
+            except OSError as e:
+                logger.error(f"Erreur écriture métriques: {e}")
+
+    threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+    logger.info(f" Métriques écrites toutes les {interval:.0f}s dans {path}")
+
+
+def start_exporter_from_env():
+    """METRICS_PORT -> endpoint HTTP, METRICS_FILE (+ METRICS_FLUSH_INTERVAL) -> fichier ; rien sinon."""
+    if os.getenv("METRICS_PORT"):
+        start_http_server(int(os.getenv("METRICS_PORT")))
+    if os.getenv("METRICS_FILE"):
+        start_file_flusher(os.getenv("METRICS_FILE"), float(os.getenv("METRICS_FLUSH_INTERVAL", "15")))
+
+
+# --- PROFILAGE ---
+@contextmanager
+def profiling(name):
+    """Profil du bloc si PROFILE=cprofile ou PROFILE=pyinstrument (fichier dans PROFILE_DIR)."""
+    mode = os.getenv("PROFILE", "").lower()
+    out_dir = os.getenv("PROFILE_DIR", ".")
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(out_dir, f"{name}-{stamp}.prof")
+            profiler.dump_stats(path)
+            top = pstats.Stats(profiler).sort_stats("cumulative")
+            logger.info(f" Profil cProfile écrit dans {path} (snakeviz / pstats pour l'explorer)")
+            top.print_stats(25)
+    elif mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning(" PROFILE=pyinstrument mais pyinstrument n'est pas installé : profilage ignoré.")
+            yield
+            return
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = os.path.join(out_dir, f"{name}-{stamp}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            logger.info(f" Profil pyinstrument écrit dans {path}")
+    else:
+        yield
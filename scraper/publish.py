@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+
+from pymongo import ReturnDocument
+
+from indexing import INDEX_NAME, INDEX_ALIAS, ensure_index, generation_index
+
+logger = logging.getLogger("ScraperBot")
+
+META_COLLECTION = "meta"
+DATA_VERSION_ID = "data_version"
+
+
+def bump_data_version(db, source):
+    """Signale une nouvelle version des données (l'app vide son cache de requêtes en la voyant)."""
+    doc = db[META_COLLECTION].find_one_and_update(
+        {"_id": DATA_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": time.strftime("%Y-%m-%d %H:%M:%S"), "source": source}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    logger.info(f" Version des données publiée : v{doc['version']} ({source})")
+    return doc["version"]
+
+
+def get_data_version(db):
+    doc = db[META_COLLECTION].find_one({"_id": DATA_VERSION_ID}, {"version": 1})
+    return doc["version"] if doc else 0
+
+
+# --- PUBLICATION BLEU/VERT ---
+# Un rebuild complet écrit dans une génération à part (index `recipes-idx-<ts>` + collection
+# `recipes_staging_<ts>`) pendant que l'app continue de servir la version en ligne. Une fois la
+# génération validée : bascule atomique de l'alias Elastic `recipes`, puis renommage de la
+# collection de staging en `recipes` (dropTarget). Les empreintes du mode incrémental calculées
+# pendant un rebuild suivent le même chemin (`recipe_fingerprints_staging_<ts>`) : une génération
+# refusée ne laisse pas d'empreintes décrivant des recettes jamais mises en ligne.
+
+LIVE_COLLECTION = "recipes"
+STAGING_PREFIX = "recipes_staging_"
+FINGERPRINTS_COLLECTION = "recipe_fingerprints"
+FINGERPRINTS_STAGING_PREFIX = "recipe_fingerprints_staging_"
+KEEP_GENERATIONS = int(os.getenv("KEEP_GENERATIONS", "2"))
+# Une génération beaucoup plus petite que la version en ligne est suspecte (crawl interrompu, site modifié)
+PUBLISH_MIN_RATIO = float(os.getenv("PUBLISH_MIN_RATIO", "0.5"))
+
+
+def start_build(db, es, source):
+    """Nouvelle génération pour `source` (remplace une génération inachevée du même source)."""
+    previous = current_build(db, source)
+    if previous:
+        abandon_build(db, es, previous)
+    stamp = time.strftime("%Y%m%d%H%M%S")
+    build = {
+        "source": source,
+        "index": generation_index(stamp),
+        "collection": STAGING_PREFIX + stamp,
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    # Index créé ici, une seule fois : les workers du crawl distribué n'ont plus qu'à y écrire
+    if es is not None:
+        ensure_index(es, build["index"])
+    db[META_COLLECTION].replace_one({"_id": f"build:{source}"}, build, upsert=True)
+    logger.info(f" Nouvelle génération : {build['index']} / {build['collection']}")
+    return build
+
+
+def fingerprints_collection(build=None):
+    """Collection des empreintes où écrire : celle de la génération `build`, sinon celle en ligne."""
+    if build is None:
+        return FINGERPRINTS_COLLECTION
+    return FINGERPRINTS_STAGING_PREFIX + build["collection"][len(STAGING_PREFIX):]
+
+
+def current_build(db, source):
+    """Génération en cours de construction pour `source` (reprise --resume), ou None."""
+    doc = db[META_COLLECTION].find_one({"_id": f"build:{source}"})
+    if doc:
+        doc.pop("_id")
+    return doc
+
+
+def abandon_build(db, es, build):
+    db[build["collection"]].drop()
+    db[fingerprints_collection(build)].drop()
+    if es is not None and build["index"] not in live_indices(es):
+        es.indices.delete(index=build["index"], ignore=[404])
+    db[META_COLLECTION].delete_one({"_id": f"build:{build['source']}"})
+    logger.info(f" Génération abandonnée : {build['index']} / {build['collection']}")
+
+
+def live_indices(es):
+    if not es.indices.exists_alias(name=INDEX_ALIAS):
+        return []
+    return list(es.indices.get_alias(name=INDEX_ALIAS))
+
+
+def validate_build(db, es, build, targets=("mongo", "es")):
+    """Problèmes qui empêchent de publier la génération (liste vide = publiable)."""
+    problems = []
+    staged = None
+    if "mongo" in targets:
+        staged = db[build["collection"]].count_documents({})
+        live = db[LIVE_COLLECTION].estimated_document_count()
+        if not staged:
+            problems.append(f"collection {build['collection']} vide")
+        elif staged < PUBLISH_MIN_RATIO * live:
+            problems.append(f"{staged} recettes contre {live} en ligne (< {PUBLISH_MIN_RATIO:.0%})")
+    if "es" in targets:
+        es.indices.refresh(index=build["index"])
+        indexed = es.count(index=build["index"])["count"]
+        if not indexed:
+            problems.append(f"index {build['index']} vide")
+        elif staged is not None and indexed != staged:
+            problems.append(f"{indexed} documents Elastic pour {staged} recettes Mongo")
+        elif staged is None and live_indices(es):
+            live = es.count(index=INDEX_ALIAS)["count"]
+            if indexed < PUBLISH_MIN_RATIO * live:
+                problems.append(f"{indexed} documents contre {live} en ligne (< {PUBLISH_MIN_RATIO:.0%})")
+    return problems
+
+
+def publish_build(db, es, build, targets=("mongo", "es"), force=False):
+    """Valide puis met en ligne la génération ; renvoie False (version en ligne conservée) si refusée."""
+    problems = validate_build(db, es, build, targets)
+    if problems and not force:
+        for p in problems:
+            logger.error(f" Génération refusée : {p}")
+        logger.error(" Publication annulée, la version en ligne reste servie (staging conservé pour analyse).")
+        return False
+
+    if "es" in targets:
+        # Un seul appel _aliases : les recherches passent de l'ancienne à la nouvelle génération sans trou
+        actions = [{"remove": {"index": name, "alias": INDEX_ALIAS}} for name in live_indices(es)]
+        actions.append({"add": {"index": build["index"], "alias": INDEX_ALIAS}})
+        es.indices.update_aliases(body={"actions": actions})
+    if "mongo" in targets:
+        db[build["collection"]].rename(LIVE_COLLECTION, dropTarget=True)
+        # Empreintes du rebuild (scraper) : en ligne en même temps que les recettes qu'elles décrivent
+        if fingerprints_collection(build) in db.list_collection_names():
+            db[fingerprints_collection(build)].rename(FINGERPRINTS_COLLECTION, dropTarget=True)
+    db[META_COLLECTION].delete_one({"_id": f"build:{build['source']}"})
+    logger.info(f" Génération publiée : {build['index']} / {build['collection']} -> {INDEX_ALIAS}")
+    prune_generations(db, es)
+    return True
+
+
+def prune_generations(db, es, keep=KEEP_GENERATIONS):
+    """Supprime les vieilles générations : on garde la version en ligne et les `keep - 1` précédentes."""
+    building = list(db[META_COLLECTION].find({"_id": {"$regex": "^build:"}}))
+    kept = {b["collection"] for b in building} | {fingerprints_collection(b) for b in building}
+    for name in db.list_collection_names():
+        if name.startswith((STAGING_PREFIX, FINGERPRINTS_STAGING_PREFIX)) and name not in kept:
+            db[name].drop()
+    if es is None:
+        return
+    protected = set(live_indices(es)) | {b["index"] for b in building}
+    older = sorted((name for name in es.indices.get(index=f"{INDEX_NAME}*") if name not in protected),
+                   reverse=True)
+    for name in older[max(keep - 1, 0):]:
+        es.indices.delete(index=name, ignore=[404])
+        logger.info(f" Ancienne génération supprimée : {name}")
@@ -0,0 +1,337 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+from lxml import html as lxml_html
+
+import metrics
+
+logger = logging.getLogger("ScraperBot")
+
+DEFAULT_IMAGE = "https://images.unsplash.com/photo-1546069901-ba9599a7e63c?q=80&w=800&auto=format&fit=crop"
+MOTS_INTERDITS = ("placeholder", "logo", "default", "no-photo", "p_global_en_tete")
+SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+
+# --- SÉLECTEURS PRÉCOMPILÉS ---
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+XP_H1 = etree.XPath("(//h1)[1]")
+XP_INGREDIENTS = etree.XPath(f"//*[{_has_class('item__ingredient')}]//*[{_has_class('ingredient-name')}]")
+XP_INGREDIENTS_ALT = etree.XPath(f"//*[{_has_class('card-ingredient-title')}]")
+XP_STEPS = etree.XPath(f"//*[{_has_class('recipe-step-list__container')}]//p")
+XP_OG_IMAGE = etree.XPath("(//meta[@property='og:image'])[1]/@content")
+XP_CANONICAL = etree.XPath("(//link[@rel='canonical']/@href | //meta[@property='og:url']/@content)[1]")
+XP_INFOS = etree.XPath(f"//*[{_has_class('recipe-primary__item')}]")
+XP_REVIEWS = etree.XPath(f"(//*[{_has_class('recipe-header__rating-count')}])[1]")
+XP_RATING = etree.XPath(f"(//*[{_has_class('recipe-header__rating-text')}])[1]")
+XP_JSONLD = etree.XPath("//script[@type='application/ld+json']/text()")
+XP_RECIPE_LINKS = etree.XPath("//a[contains(@href, '/recettes/recette_')]/@href")
+
+# --- REGEX PRÉCOMPILÉES ---
+RE_HOURS = re.compile(r'(\d+)\s*h')
+RE_MINUTES = re.compile(r'(\d+)\s*min')
+RE_MINUTES_SHORT = re.compile(r'temps\s*[:\s]\s*(\d+)\s*m')
+RE_DIGITS = re.compile(r'\d+')
+RE_ISO_DURATION = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:\d+(?:\.\d+)?S)?)?$')
+
+
+# --- HELPERS TEXTE (équivalents de BeautifulSoup.get_text) ---
+def _text(el, sep=""):
+    return sep.join(s.strip() for s in el.itertext() if s.strip())
+
+
+def _leading_text(root, limit=1000):
+    """Texte visible du début de page, en s'arrêtant dès que `limit` caractères sont lus."""
+    parts, size, skip = [], 0, 0
+    for event, el in etree.iterwalk(root, events=("start", "end")):
+        tag = el.tag if isinstance(el.tag, str) else None
+        if event == "start":
+            if tag is None or tag in SKIP_TAGS:
+                skip += 1
+                continue
+            chunk = el.text
+        else:
+            if tag is None or tag in SKIP_TAGS:
+                skip -= 1
+            chunk = el.tail
+        if skip or not chunk or not chunk.strip():
+            continue
+        parts.append(chunk.strip())
+        size += len(chunk) + 1
+        if size >= limit:
+            break
+    return " ".join(parts)[:limit]
+
+
+# --- SCHEMA.ORG (JSON-LD) ---
+def _find_recipe_node(data):
+    if isinstance(data, list):
+        for item in data:
+            found = _find_recipe_node(item)
+            if found: return found
+    elif isinstance(data, dict):
+        types = data.get("@type")
+        types = types if isinstance(types, list) else [types]
+        if "Recipe" in types:
+            return data
+        if "@graph" in data:
+            return _find_recipe_node(data["@graph"])
+    return None
+
+
+def _jsonld_recipe(root):
+    for raw in XP_JSONLD(root):
+        try:
+            node = _find_recipe_node(json.loads(raw))
+        except ValueError:
+            continue
+        if node:
+            return node
+    return None
+
+
+def _instructions(value):
+    steps = []
+    if isinstance(value, str):
+        return [value.strip()] if value.strip() else []
+    for item in value or []:
+        if isinstance(item, str):
+            if item.strip(): steps.append(item.strip())
+        elif isinstance(item, dict):
+            if item.get("itemListElement"):
+                steps.extend(_instructions(item["itemListElement"]))
+            elif str(item.get("text", "")).strip():
+                steps.append(str(item["text"]).strip())
+    return steps
+
+
+def _image(value):
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    if isinstance(value, dict):
+        value = value.get("url", "")
+    return value or ""
+
+
+def iso_duration_minutes(value):
+    m = RE_ISO_DURATION.match(value or "")
+    if not m:
+        return 0
+    days, hours, minutes = (int(g) if g else 0 for g in m.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def _number(value, cast):
+    try:
+        return cast(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+# --- EXTRACTION HTML ---
+def _difficulty(infos_items):
+    for info in infos_items:
+        if "très facile" in info: return "Très facile"
+        if "facile" in info: return "Facile"
+        if "difficile" in info: return "Difficile"
+        if "moyen" in info: return "Moyen"
+    return "Moyen"
+
+
+def _html_duration(root, infos_items):
+    header_text = " ".join(infos_items).replace("heure", "h")
+    if not any(char.isdigit() for char in header_text):
+        header_text = _leading_text(root).lower().replace("heure", "h")
+
+    duration = 0
+    p_hour = RE_HOURS.search(header_text)
+    if p_hour: duration += int(p_hour.group(1)) * 60
+
+    p_min = RE_MINUTES.search(header_text)
+    if p_min:
+        duration += int(p_min.group(1))
+    elif not p_hour:
+        p_min_short = RE_MINUTES_SHORT.search(header_text)
+        if p_min_short: duration += int(p_min_short.group(1))
+    return duration
+
+
+def _clean_image(img_url):
+    if not img_url or any(mot in img_url.lower() for mot in MOTS_INTERDITS):
+        return DEFAULT_IMAGE
+    return img_url
+
+
+def parse_recipe(html, url=None, category=None):
+    """Transforme le HTML d'une page recette en document (ou None si ce n'est pas une recette).
+
+    Le bloc schema.org JSON-LD est prioritaire quand il existe ; le HTML sert de
+    complément (difficulté) et de secours pour les champs absents.
+    """
+    if not html or not html.strip():
+        return None
+    try:
+        root = lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return None
+
+    if not url:
+        canonical = XP_CANONICAL(root)
+        url = canonical[0] if canonical else ""
+    ld = _jsonld_recipe(root) or {}
+
+    # 1. TITRE
+    title = str(ld.get("name") or "").strip()
+    if not title:
+        h1 = XP_H1(root)
+        title = _text(h1[0]) if h1 else ""
+    if not title:
+        return None
+
+    # 2. INGREDIENTS & ÉTAPES
+    ingredients = [str(i).strip() for i in ld.get("recipeIngredient") or [] if str(i).strip()]
+    if not ingredients:
+        ingredients = [_text(d, " ") for d in XP_INGREDIENTS(root)]
+    if not ingredients:
+        ingredients = [_text(d, " ") for d in XP_INGREDIENTS_ALT(root)]
+
+    steps = _instructions(ld.get("recipeInstructions"))
+    if not steps:
+        steps = [_text(s) for s in XP_STEPS(root)]
+
+    # 3. IMAGE
+    img_url = _image(ld.get("image"))
+    if not img_url:
+        og = XP_OG_IMAGE(root)
+        img_url = og[0] if og else ""
+
+    # 4. DIFFICULTÉ & DURÉE
+    infos_items = [_text(i).lower() for i in XP_INFOS(root)]
+    difficulty = _difficulty(infos_items)
+
+    duration = iso_duration_minutes(ld.get("totalTime"))
+    if not duration:
+        duration = _html_duration(root, infos_items)
+    if duration == 0:
+        logger.warning(f"TEMPS NON TROUVÉ (0 min) pour : {url}")
+
+    # 5. NOTE & AVIS
+    agg = ld.get("aggregateRating") or {}
+    rating = _number(agg.get("ratingValue"), float)
+    if rating is None:
+        tag = XP_RATING(root)
+        rating = _number(_text(tag[0]).replace("/5", ""), float) if tag else None
+
+    reviews_count = _number(agg.get("ratingCount") or agg.get("reviewCount"), int)
+    if reviews_count is None:
+        tag = XP_REVIEWS(root)
+        nums = RE_DIGITS.findall(_text(tag[0])) if tag else []
+        reviews_count = int(nums[0]) if nums else 0
+
+    return {
+        "product_id": hashlib.md5(url.encode()).hexdigest(),
+        "name": title,
+        "category": category,
+        "url": url,
+        "image_url": _clean_image(img_url),
+        "difficulty": difficulty,
+        "rating": rating or 0.0,
+        "reviews_count": reviews_count,
+        "duration_min": duration,
+        "ingredients": ingredients,
+        "steps": steps,
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+# --- TRAITEMENT PAR LOT ---
+def parse_listing(html, base="https://www.marmiton.org"):
+    """Liens de recettes d'une page de résultats (URLs absolues, dans l'ordre de la page)."""
+    try:
+        root = lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return []
+    return [base + href if href.startswith("/") else href for href in XP_RECIPE_LINKS(root)]
+
+
+def _parse_item(item):
+    # Exécuté dans un processus du pool : le temps et l'erreur éventuelle remontent au parent (métriques)
+    html, url, category = item
+    start = time.perf_counter()
+    try:
+        return url, parse_recipe(html, url, category), time.perf_counter() - start, None
+    except Exception as e:
+        logger.error(f"Erreur parsing {url}: {e}")
+        return url, None, time.perf_counter() - start, type(e).__name__
+
+
+def _observed(results):
+    for url, recipe, seconds, error in results:
+        metrics.observe("scraper_parse_seconds", seconds)
+        if error:
+            metrics.inc("scraper_parse_errors_total", type=error)
+        yield url, recipe
+
+
+def _parse_chunk(chunk):
+    return [_parse_item(item) for item in chunk]
+
+
+def parse_pool(workers=None):
+    """Pool de processus à passer à plusieurs `parse_many` (None si `workers` <= 1 : parsing sans pool)."""
+    if workers is not None and workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+
+
+def parse_many(items, workers=None, chunksize=8, pool=None):
+    """Parse des tuples (html, url, category) sur un pool de processus, dans l'ordre d'entrée.
+
+    Renvoie des couples (url, recette) ; recette vaut None si la page n'a pas pu être extraite.
+    `items` est consommé au fil de l'eau : au plus 2 lots de `chunksize` pages par processus sont en
+    cours, la mémoire ne dépend pas de la taille du crawl. `workers` <= 1 : parsing sans pool.
+    `pool` (voir `parse_pool`) : pool gardé entre les appels au lieu d'en créer un à chaque fois.
+    """
+    if pool is None:
+        pool = parse_pool(workers)
+        if pool is None:
+            yield from _observed(map(_parse_item, items))
+            return
+        with pool:
+            yield from parse_many(items, workers, chunksize, pool)
+        return
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+    pending = deque()
+    items = iter(items)
+    while True:
+        while len(pending) < max_pending:
+            chunk = list(islice(items, chunksize))
+            if not chunk:
+                break
+            pending.append(pool.submit(_parse_chunk, chunk))
+        if not pending:
+            return
+        yield from _observed(pending.popleft().result())
+
+
+def _read_file(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read(), None, None
+
+
+if __name__ == "__main__":
+    # Re-parsing hors ligne de pages HTML stockées : python recipe_parser.py pages/*.html > recettes.jsonl
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    for _, recipe in parse_many(map(_read_file, sys.argv[1:])):
+        if recipe:
+            print(json.dumps(recipe, ensure_ascii=False))
@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import threading
+
+import metrics
+
+logger = logging.getLogger("ScraperBot")
+
+# --- ORDONNANCEMENT DU CRAWL ---
+# Débit par hôte en AIMD (comme TCP) : le débit monte d'environ `increase` req/s par seconde
+# de succès et il est divisé par deux sur timeout / erreur / 429 / 5xx. Le crawl va donc aussi
+# vite que le site le supporte, et ralentit tout seul dès qu'il se plaint.
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class AimdRateLimiter:
+    """Seau à jetons par hôte, débit ajusté en AIMD, et requêtes simultanées plafonnées.
+
+    `initial_rate=None` (ou 0) désactive la limitation de débit (banc de mesure, tests).
+    """
+
+    def __init__(self, max_per_host=4, initial_rate=5.0, min_rate=0.2, max_rate=20.0,
+                 increase=0.5, decrease=0.5, burst=2):
+        self.max_per_host = max_per_host
+        self.initial_rate = initial_rate or None
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, initial_rate or 0)
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._buckets = {}
+
+    def _state(self, host):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+                self._buckets[host] = {"rate": self.initial_rate, "tokens": 1.0, "at": time.monotonic()}
+            return self._slots[host], self._buckets[host]
+
+    def rate(self, host):
+        return self._state(host)[1]["rate"]
+
+    def acquire(self, host):
+        slots, bucket = self._state(host)
+        slots.acquire()
+        if bucket["rate"] is None:
+            return
+        # Un jeton par requête, regénéré à `rate` par seconde ; dette possible = attente réservée
+        with self._lock:
+            now = time.monotonic()
+            bucket["tokens"] = min(self.burst, bucket["tokens"] + (now - bucket["at"]) * bucket["rate"])
+            bucket["at"] = now
+            bucket["tokens"] -= 1
+            delay = -bucket["tokens"] / bucket["rate"] if bucket["tokens"] < 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self, host, ok=True):
+        """Libère le créneau et ajuste le débit selon l'issue de la requête."""
+        slots, bucket = self._state(host)
+        if bucket["rate"] is not None:
+            with self._lock:
+                if ok:
+                    bucket["rate"] = min(self.max_rate, bucket["rate"] + self.increase / max(bucket["rate"], 1.0))
+                else:
+                    bucket["rate"] = max(self.min_rate, bucket["rate"] * self.decrease)
+                    # On repart sans avance : pas de rafale juste après un refus
+                    bucket["tokens"] = min(bucket["tokens"], 0.0)
+                    logger.info(f" Ralentissement {host} : {bucket['rate']:.2f} req/s")
+            metrics.set_gauge("scraper_host_rate", round(bucket["rate"], 3), host=host)
+        slots.release()
+
+    @staticmethod
+    def is_failure(status=None, error=None):
+        return error is not None or status in RETRYABLE_STATUS
+
+
+class ListingBudget:
+    """Pagination d'une catégorie : s'arrête au budget de pages, ou après `empty_stop` pages
+    consécutives sans aucun lien nouveau (la suite de la liste est déjà connue ou vide)."""
+
+    def __init__(self, max_pages=33, empty_stop=2):
+        self.max_pages = max_pages
+        self.empty_stop = empty_stop
+        self.empty_streak = 0
+        self.visited = 0
+        self.stopped_early = False
+
+    def record(self, new_links):
+        self.visited += 1
+        self.empty_streak = self.empty_streak + 1 if new_links == 0 else 0
+
+    def pages(self):
+        """Numéros de page à parcourir, calculés au fil de l'eau (lire `record` entre deux)."""
+        for page_num in range(1, self.max_pages + 1):
+            if self.empty_stop and self.empty_streak >= self.empty_stop:
+                self.stopped_early = True
+                return
+            yield page_num
+
+
+def budget_from_env():
+    """Catégories et budgets du crawl (SCRAPER_CATEGORIES, SCRAPER_PAGES_PER_CAT, SCRAPER_EMPTY_PAGES_STOP)."""
+    categories = [c.strip() for c in os.getenv("SCRAPER_CATEGORIES", "entree,plat-principal,dessert").split(",")
+                  if c.strip()]
+    return {
+        "categories": categories,
+        "pages_per_cat": int(os.getenv("SCRAPER_PAGES_PER_CAT", "33")),
+        "empty_stop": int(os.getenv("SCRAPER_EMPTY_PAGES_STOP", "2")),
+    }
+
+
+def limiter_from_env():
+    """Débit par hôte : SCRAPER_HOST_RATE (initial), SCRAPER_HOST_MIN_RATE, SCRAPER_HOST_MAX_RATE, en req/s."""
+    return AimdRateLimiter(
+        max_per_host=int(os.getenv("SCRAPER_MAX_PER_HOST", "4")),
+        initial_rate=float(os.getenv("SCRAPER_HOST_RATE", "5")),
+        min_rate=float(os.getenv("SCRAPER_HOST_MIN_RATE", "0.2")),
+        max_rate=float(os.getenv("SCRAPER_HOST_MAX_RATE", "20")),
+    )
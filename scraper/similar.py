@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from ingredients import canonical_ingredients, fold, singular, RE_WORD, STOPWORDS
+
+logger = logging.getLogger("ScraperBot")
+
+# --- RECETTES SIMILAIRES (TF-IDF) ---
+# Calcul par lot après chaque crawl / restauration : une recette = vecteur TF-IDF creux de ses
+# ingrédients canoniques et des mots de ses étapes, normé (cosinus = produit scalaire). Les k plus
+# proches voisins sont calculés par blocs de lignes (produit creux x creux, puis top-k vectorisé) :
+# la mémoire reste bornée à BLOCK x N scores. Résultat dans `recipe_similar`, un document par
+# recette : l'app n'a plus qu'une lecture par product_id.
+
+SIMILAR_COLLECTION = "recipe_similar"
+SIMILAR_K = int(os.getenv("SIMILAR_K", "6"))
+SIMILAR_BLOCK = int(os.getenv("SIMILAR_BLOCK", "512"))
+INGREDIENT_WEIGHT = 2.0  # un ingrédient commun compte plus qu'un mot d'étape commun
+MIN_SCORE = 0.05
+SIMILAR_FIELDS = {"_id": 0, "product_id": 1, "name": 1, "url": 1, "rating": 1,
+                  "ingredients_canon": 1, "ingredients": 1, "steps": 1}
+
+
+def terms(recipe):
+    """{terme: occurrences} : ingrédients canoniques ("i:") et mots des étapes ("s:")."""
+    counts = {}
+    for tok in recipe.get("ingredients_canon") or canonical_ingredients(recipe.get("ingredients")):
+        counts["i:" + tok] = 1
+    for word in RE_WORD.findall(fold(" ".join(recipe.get("steps") or []))):
+        if len(word) > 2 and word not in STOPWORDS:
+            key = "s:" + singular(word)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def tfidf_matrix(docs):
+    """Matrice CSR (recettes x termes), lignes normées L2 ; tf sous-linéaire, idf lissé."""
+    from scipy import sparse  # dépendance du scraper seulement (l'app ne lit que `recipe_similar`)
+
+    vocab, indptr, indices, values, weights = {}, [0], [], [], []
+    for doc in docs:
+        for term, count in terms(doc).items():
+            indices.append(vocab.setdefault(term, len(vocab)))
+            values.append(count)
+            weights.append(INGREDIENT_WEIGHT if term.startswith("i:") else 1.0)
+        indptr.append(len(indices))
+    indices = np.asarray(indices, dtype=np.int32)
+    tf = (1.0 + np.log(np.asarray(values, dtype=np.float32))) * np.asarray(weights, dtype=np.float32)
+    matrix = sparse.csr_matrix((tf, indices, np.asarray(indptr, dtype=np.int64)),
+                               shape=(len(docs), len(vocab)), dtype=np.float32)
+    df = np.bincount(indices, minlength=len(vocab))
+    matrix = matrix @ sparse.diags(np.log((1 + len(docs)) / (1 + df)).astype(np.float32) + 1)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def top_neighbours(matrix, k=SIMILAR_K, block=SIMILAR_BLOCK):
+    """Génère (ligne, voisins, scores) : les k plus proches voisins de chaque ligne, meilleurs d'abord."""
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return
+    transposed = matrix.T.tocsr()
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        scores = (matrix[start:stop] @ transposed).toarray()
+        scores[np.arange(stop - start), np.arange(start, stop)] = -1.0  # pas soi-même
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for i in range(stop - start):
+            yield start + i, best[i], best_scores[i]
+
+
+def refresh_similar(db, source="recipes", k=SIMILAR_K):
+    """Recalcule `recipe_similar` pour les recettes en ligne (quasi-doublons exclus)."""
+    start = time.time()
+    docs = list(db[source].find({"duplicate_of": None}, SIMILAR_FIELDS))
+    col = db[SIMILAR_COLLECTION]
+    if not docs:
+        col.delete_many({})
+        return 0
+    matrix = tfidf_matrix(docs)
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    ops = []
+    for row, neighbours, scores in top_neighbours(matrix, k):
+        similar = [{"product_id": docs[j]["product_id"], "name": docs[j].get("name"), "url": docs[j].get("url"),
+                    "rating": docs[j].get("rating"), "score": round(float(s), 4)}
+                   for j, s in zip(neighbours, scores) if s >= MIN_SCORE]
+        ops.append(ReplaceOne({"_id": docs[row]["product_id"]}, {"similar": similar, "updated_at": now}, upsert=True))
+        if len(ops) >= 1000:
+            col.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        col.bulk_write(ops, ordered=False)
+    col.delete_many({"_id": {"$nin": [d["product_id"] for d in docs]}})
+    logger.info(f" Recettes similaires recalculées ({len(docs)} recettes, {matrix.shape[1]} termes, "
+                f"{time.time() - start:.2f}s).")
+    return len(docs)
+
+
+if __name__ == "__main__":
+    # Recalcul à la demande (ex: après une modification manuelle de la collection)
+    from pymongo import MongoClient
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    client = MongoClient(f"mongodb://{os.getenv('MONGO_HOST', 'localhost')}:27017/")
+    sys.exit(0 if refresh_similar(client["marmiton_db"]) else 1)
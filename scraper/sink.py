@@ -0,0 +1,137 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import UpdateOne
+
+from indexing import INDEX_ALIAS, ensure_index, bulk_index
+from ingredients import enrich
+from dedupe import NearDuplicateIndex
+from snapshot import SnapshotWriter
+import metrics
+
+logger = logging.getLogger("ScraperBot")
+
+_STOP = object()
+BATCH_BUCKETS = (1, 10, 50, 100, 200, 500, 1000)
+
+
+class RecipeSink:
+    """Écrit les recettes au fil de l'eau, par lots, vers un snapshot (JSONL gzip shardé), MongoDB et Elasticsearch.
+
+    `push()` ne bloque pas le crawl : un thread dédié vide la file et déclenche un flush
+    dès que `batch_size` recettes sont en attente ou que `flush_interval` secondes sont écoulées.
+    Les trois cibles d'un lot sont écrites en parallèle. Chaque recette est comparée aux
+    précédentes (`dedupe`, MinHash/LSH) et reçoit `duplicate_of` si c'est un quasi-doublon.
+    """
+
+    def __init__(self, db, es, snapshot_path="marmiton_snapshot", append=False,
+                 batch_size=200, flush_interval=5.0, index=INDEX_ALIAS, collection="recipes", dedupe=None):
+        self.db = db
+        self.es = es
+        self.index = index
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedupe = dedupe if dedupe is not None else NearDuplicateIndex()
+        self.snapshot = SnapshotWriter(snapshot_path, append=append) if snapshot_path else None
+        self.stats = {"pushed": 0, "flushed": 0, "batches": 0, "errors": 0}
+
+        if self.es is not None:
+            ensure_index(self.es, self.index)
+        if self.db is not None:
+            # Upserts par product_id : sans index, chaque écriture parcourt toute la collection
+            self.db[self.collection].create_index("product_id")
+
+        self._queue = queue.Queue(maxsize=batch_size * 4)
+        self._writers = ThreadPoolExecutor(max_workers=3)
+        self._thread = threading.Thread(target=self._run, name="recipe-sink", daemon=True)
+        self._thread.start()
+
+    def push(self, recipe):
+        recipe = enrich(recipe)
+        self.dedupe.flag(recipe)
+        self._queue.put(recipe)
+        self.stats["pushed"] += 1
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._writers.shutdown()
+        if self.snapshot:
+            self.snapshot.close()
+        logger.info(f" Sink fermé : {self.stats['flushed']} recettes écrites en {self.stats['batches']} lots "
+                    f"({self.stats['errors']} erreurs, {self.dedupe.stats['duplicates']} quasi-doublons).")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- THREAD D'ÉCRITURE ---
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                break
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        targets = {name: write for name, write, client in (("snapshot", self._write_snapshot, self.snapshot),
+                                                           ("mongo", self._write_mongo, self.db),
+                                                           ("es", self._write_es, self.es)) if client is not None}
+        metrics.observe("sink_batch_size", len(batch), buckets=BATCH_BUCKETS)
+        metrics.set_gauge("sink_queue_depth", self._queue.qsize())
+        futures = [self._writers.submit(self._timed, name, t, batch) for name, t in targets.items()]
+        for fut in futures:
+            try:
+                fut.result()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Erreur écriture lot: {e}")
+        self.stats["flushed"] += len(batch)
+        self.stats["batches"] += 1
+
+    @staticmethod
+    def _timed(name, write, batch):
+        with metrics.span("sink_write", target=name):
+            write(batch)
+        metrics.inc("sink_docs_written_total", len(batch), target=name)
+
+    def _write_snapshot(self, batch):
+        if self.snapshot is None:
+            return
+        self.snapshot.write_many(batch)
+        self.snapshot.flush()
+
+    def _write_mongo(self, batch):
+        if self.db is None:
+            return
+        ops = [UpdateOne({'product_id': d['product_id']}, {'$set': d}, upsert=True) for d in batch]
+        self.db[self.collection].bulk_write(ops, ordered=False)
+
+    def _write_es(self, batch):
+        if self.es is None:
+            return
+        # Lots déjà petits : un seul thread, l'index reste rafraîchi pour être consultable pendant le crawl
+        _, failures = bulk_index(self.es, batch, index=self.index, thread_count=1)
+        self.stats["errors"] += len(failures)
+        metrics.inc("sink_es_rejected_total", len(failures))
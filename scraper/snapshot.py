@@ -0,0 +1,221 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import logging
+
+logger = logging.getLogger("ScraperBot")
+
+# --- FORMAT DE SAUVEGARDE ---
+# marmiton_snapshot/
+#   manifest.json            version du schéma, liste des shards, nombre de recettes, sha256
+#   part-00000.jsonl.gz      une recette JSON par ligne, compressée gzip
+#   part-00001.jsonl.gz ...
+# Écriture et lecture en flux : jamais plus d'une recette en mémoire.
+# Un nouveau snapshot complet s'écrit à côté (marmiton_snapshot.next/) et ne remplace le précédent
+# qu'une fois validé (`promote_snapshot`) : un crawl raté ne détruit jamais la dernière bonne sauvegarde.
+
+SCHEMA_VERSION = 1
+MANIFEST = "manifest.json"
+SHARD_SIZE = int(os.getenv("SNAPSHOT_SHARD_SIZE", "5000"))
+DEFAULT_SNAPSHOT = os.getenv("SNAPSHOT_PATH", "marmiton_snapshot")
+LEGACY_FILES = ("marmiton_data.jsonl", "marmiton_data.json")
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("schema_version", 0) > SCHEMA_VERSION:
+        raise ValueError(f"Snapshot {path} en version {manifest['schema_version']}, "
+                         f"ce code ne lit que jusqu'à la v{SCHEMA_VERSION}")
+    return manifest
+
+
+class SnapshotWriter:
+    """Écrit un snapshot shardé (JSONL gzip + manifest) au fil de l'eau.
+
+    Un shard est écrit dans un fichier temporaire puis renommé et ajouté au manifest
+    une fois complet : après un crash, le snapshot reste lisible (shards terminés).
+    `append=True` reprend un snapshot existant (scraper lancé avec --resume).
+    """
+
+    def __init__(self, path=DEFAULT_SNAPSHOT, shard_size=SHARD_SIZE, append=False, compresslevel=6):
+        self.path = path
+        self.shard_size = shard_size
+        self.compresslevel = compresslevel
+        os.makedirs(path, exist_ok=True)
+
+        if append and os.path.exists(os.path.join(path, MANIFEST)):
+            self.manifest = read_manifest(path)
+        else:
+            for name in os.listdir(path):
+                if name.startswith("part-") or name == MANIFEST:
+                    os.remove(os.path.join(path, name))
+            self.manifest = {"schema_version": SCHEMA_VERSION, "format": "jsonl.gz", "shards": [], "count": 0}
+        self._shard = None
+        self._shard_count = 0
+
+    def _open_shard(self):
+        name = f"part-{len(self.manifest['shards']):05d}.jsonl.gz"
+        self._shard_name = name
+        self._shard = gzip.open(os.path.join(self.path, name + ".tmp"), "wt", encoding="utf-8",
+                                compresslevel=self.compresslevel)
+        self._shard_count = 0
+
+    def _close_shard(self):
+        if self._shard is None:
+            return
+        self._shard.close()
+        self._shard = None
+        tmp = os.path.join(self.path, self._shard_name + ".tmp")
+        final = os.path.join(self.path, self._shard_name)
+        if not self._shard_count:
+            os.remove(tmp)
+            return
+        os.replace(tmp, final)
+        self.manifest["shards"].append({
+            "file": self._shard_name,
+            "count": self._shard_count,
+            "bytes": os.path.getsize(final),
+            "sha256": _sha256(final),
+        })
+        self.manifest["count"] += self._shard_count
+        self._write_manifest()
+
+    def _write_manifest(self):
+        self.manifest["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        tmp = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def write(self, doc):
+        if self._shard is None:
+            self._open_shard()
+        doc.pop("_id", None)
+        self._shard.write(json.dumps(doc, ensure_ascii=False) + "\n")
+        self._shard_count += 1
+        if self._shard_count >= self.shard_size:
+            self._close_shard()
+
+    def write_many(self, docs):
+        for d in docs:
+            self.write(d)
+
+    def flush(self):
+        if self._shard is not None:
+            self._shard.flush()
+
+    def close(self):
+        self._close_shard()
+        if not self.manifest["shards"]:
+            self._write_manifest()
+        return self.manifest["count"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def staging_path(path=DEFAULT_SNAPSHOT):
+    """Dossier où s'écrit le prochain snapshot de `path`, en attendant `promote_snapshot`."""
+    return path.rstrip("/\\") + ".next"
+
+
+def promote_snapshot(path=DEFAULT_SNAPSHOT):
+    """Met en place le snapshot écrit dans `staging_path(path)` ; l'ancien est gardé jusqu'à la bascule."""
+    staging = staging_path(path)
+    if not os.path.exists(os.path.join(staging, MANIFEST)):
+        logger.warning(f" Aucun snapshot terminé dans {staging} : {path} inchangé.")
+        return False
+    old = path.rstrip("/\\") + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(staging, path)
+    shutil.rmtree(old, ignore_errors=True)
+    logger.info(f" Snapshot {path} remplacé par le nouveau.")
+    return True
+
+
+def export_snapshot(docs, path=DEFAULT_SNAPSHOT):
+    """Réécrit un snapshot complet à partir d'un itérable (ex: curseur Mongo), sans tout charger.
+
+    L'export passe par `staging_path(path)` : le snapshot précédent reste lisible jusqu'à la fin.
+    """
+    with SnapshotWriter(staging_path(path)) as writer:
+        writer.write_many(docs)
+    promote_snapshot(path)
+    logger.info(f" Snapshot {path} : {writer.manifest['count']} recettes en {len(writer.manifest['shards'])} shards.")
+    return writer.manifest["count"]
+
+
+def verify_snapshot(path):
+    """Liste des shards absents ou dont le sha256 ne correspond pas au manifest."""
+    bad = []
+    for shard in read_manifest(path)["shards"]:
+        file = os.path.join(path, shard["file"])
+        if not os.path.exists(file) or _sha256(file) != shard["sha256"]:
+            bad.append(shard["file"])
+    return bad
+
+
+def _iter_lines(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _iter_raw(path):
+    if os.path.isdir(path):
+        for shard in read_manifest(path)["shards"]:
+            with gzip.open(os.path.join(path, shard["file"]), "rt", encoding="utf-8") as f:
+                yield from _iter_lines(f)
+    elif path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            yield from _iter_lines(f)
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            yield from _iter_lines(f)
+    else:
+        # Ancien format : tableau JSON indenté, forcément chargé d'un bloc
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def iter_snapshot(path, dedupe=True):
+    """Recettes d'un snapshot (dossier shardé), d'un JSONL (.gz ou non) ou de l'ancien marmiton_data.json.
+
+    Avec `dedupe`, une recette déjà vue (même product_id, ex: reprise --resume) est ignorée.
+    """
+    seen = set()
+    for doc in _iter_raw(path):
+        pid = doc.get("product_id")
+        if dedupe and pid is not None:
+            if pid in seen:
+                continue
+            seen.add(pid)
+        yield doc
+
+
+def find_snapshot(root="."):
+    """Source de restauration par défaut : snapshot shardé, sinon anciens exports JSONL / JSON."""
+    # `.old` : crash entre les deux renommages de promote_snapshot
+    candidates = [DEFAULT_SNAPSHOT, DEFAULT_SNAPSHOT + ".old"] + list(LEGACY_FILES)
+    for name in candidates:
+        path = os.path.join(root, name)
+        if os.path.exists(os.path.join(path, MANIFEST)) or os.path.isfile(path):
+            return path
+    return None
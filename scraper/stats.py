@@ -0,0 +1,85 @@
+import time
+import logging
+
+logger = logging.getLogger("ScraperBot")
+
+STATS_COLLECTION = "recipe_stats"
+
+
+def kpi_pipeline(categories=None):
+    """Agrégation $facet projetée : comptes, sommes et distributions par catégorie, côté Mongo."""
+    pipeline = []
+    if categories is not None:
+        pipeline.append({"$match": {"category": {"$in": list(categories)}}})
+    pipeline += [
+        {"$project": {"_id": 0, "category": 1, "rating": 1, "difficulty": 1, "duration_min": 1}},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": "$category",
+                "count": {"$sum": 1},
+                "rating_sum": {"$sum": "$rating"},
+                "duration_sum": {"$sum": "$duration_min"},
+            }}],
+            "difficulty": [{"$group": {"_id": {"category": "$category", "value": "$difficulty"}, "count": {"$sum": 1}}}],
+            "rating": [{"$group": {"_id": {"category": "$category", "value": "$rating"}, "count": {"$sum": 1}}}],
+        }},
+    ]
+    return pipeline
+
+
+def compute_category_stats(collection, categories=None):
+    """Renvoie {catégorie: stats} à partir d'une seule agrégation."""
+    return stats_from_facets(next(collection.aggregate(kpi_pipeline(categories)), None))
+
+
+def stats_from_facets(result):
+    """Résultat de `kpi_pipeline` (document $facet) -> {catégorie: stats}. Partagé avec l'API (Motor)."""
+    result = result or {}
+    stats = {}
+    for row in result.get("totals", []):
+        stats[row["_id"]] = {
+            "count": row["count"],
+            "rating_sum": row["rating_sum"],
+            "duration_sum": row["duration_sum"],
+            "difficulty_counts": [],
+            "rating_counts": [],
+        }
+    # Distributions stockées en listes {value, count} (une note comme 4.8 ne peut pas servir de clé Mongo)
+    for facet, field in (("difficulty", "difficulty_counts"), ("rating", "rating_counts")):
+        for row in result.get(facet, []):
+            cat = row["_id"].get("category")
+            if cat in stats:
+                stats[cat][field].append({"value": row["_id"].get("value"), "count": row["count"]})
+    return stats
+
+
+def refresh_recipe_stats(db, source="recipes"):
+    """Recalcule la collection matérialisée `recipe_stats` (un document par catégorie)."""
+    start = time.time()
+    stats = compute_category_stats(db[source])
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    col = db[STATS_COLLECTION]
+    for cat, doc in stats.items():
+        col.replace_one({"_id": cat}, {**doc, "updated_at": now}, upsert=True)
+    col.delete_many({"_id": {"$nin": list(stats)}})
+    logger.info(f" Stats dashboard recalculées ({len(stats)} catégories, {time.time() - start:.2f}s).")
+    return stats
+
+
+def merge_stats(per_category):
+    """Fusionne les stats de plusieurs catégories en KPIs prêts à afficher."""
+    count = sum(s["count"] for s in per_category)
+    difficulty, rating = {}, {}
+    for s in per_category:
+        for row in s["difficulty_counts"]:
+            difficulty[row["value"]] = difficulty.get(row["value"], 0) + row["count"]
+        for row in s["rating_counts"]:
+            rating[row["value"]] = rating.get(row["value"], 0) + row["count"]
+    return {
+        "count": count,
+        "rating_avg": sum(s["rating_sum"] for s in per_category) / count if count else 0.0,
+        "duration_avg": sum(s["duration_sum"] for s in per_category) / count if count else 0.0,
+        "top_difficulty": max(difficulty, key=difficulty.get) if difficulty else "N/A",
+        "difficulty_counts": difficulty,
+        "rating_counts": rating,
+    }
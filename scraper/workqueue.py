@@ -0,0 +1,243 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from frontier import error_type
+from incremental import url_id
+import metrics
+
+logger = logging.getLogger("ScraperBot")
+
+# --- FILE DE TRAVAIL PARTAGÉE (CRAWL DISTRIBUÉ) ---
+# Même rôle que la frontière SQLite, mais dans Mongo pour N workers : un document par URL.
+# Un worker réserve des URLs avec un bail (lease) limité dans le temps, qu'il prolonge tant qu'il
+# est vivant (heartbeat). S'il meurt, le bail expire et un autre worker reprend l'URL : rien n'est
+# perdu. Les échecs repassent en file après un backoff exponentiel, comme dans la frontière.
+# Clé d'un document : "<run_id>:<url>" ; un worker resté sur un run remplacé ne peut ni réserver
+# ni modifier les URLs du nouveau run.
+
+QUEUE_COLLECTION = "crawl_queue"
+RUN_ID = "crawl_run"
+LEASE_SECONDS = float(os.getenv("SCRAPER_LEASE_SECONDS", "120"))
+CLAIM_BATCH = int(os.getenv("SCRAPER_CLAIM_BATCH", "16"))
+POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "5"))
+
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """File d'URLs (pages de liste et recettes) partagée par le coordinateur et les workers.
+
+    Expose les mêmes méthodes que `CrawlFrontier` utilisées pendant la visite (`add_recipes`,
+    `categories_of`, `mark_done`, `mark_failed`) : le scraper l'utilise à la place de la frontière.
+    """
+
+    def __init__(self, db, worker=None, lease_seconds=LEASE_SECONDS, max_attempts=4,
+                 backoff_base=30, backoff_max=900):
+        self.col = db[QUEUE_COLLECTION]
+        self.meta = db["meta"]
+        self.worker = worker or worker_id()
+        self.run_id = None  # run dont on traite les URLs
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.col.create_index([("run", ASCENDING), ("status", ASCENDING), ("kind", ASCENDING), ("page", ASCENDING)])
+        self.col.create_index([("owner", ASCENDING), ("status", ASCENDING)])
+
+    # --- RUN (COORDINATEUR) ---
+    def start_run(self, run_id=None, **info):
+        """Publie les paramètres du run (génération cible, budgets) : les workers attendent ce document.
+
+        Sans `run_id` (pas de reprise), nouvel id : les workers encore sur l'ancien run s'arrêtent.
+        """
+        self.run_id = run_id or uuid.uuid4().hex
+        run = {**info, "run_id": self.run_id, "status": "running", "started_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        self.meta.replace_one({"_id": RUN_ID}, run, upsert=True)
+        return run
+
+    def run(self):
+        return self.meta.find_one({"_id": RUN_ID})
+
+    def wait_for_run(self, poll=POLL_INTERVAL):
+        """Worker : attend un run en cours et s'y rattache."""
+        run = self.run()
+        while run is None or run["status"] != "running":
+            logger.info(" En attente d'un run du coordinateur...")
+            time.sleep(poll)
+            run = self.run()
+        self.run_id = run["run_id"]
+        return run
+
+    def is_current(self, run):
+        """Le run est-il toujours celui du coordinateur (pas remplacé par un nouveau run) ?"""
+        state = self.run()
+        return state is not None and state.get("run_id") == run["run_id"]
+
+    def finish_run(self):
+        self.meta.update_one({"_id": RUN_ID}, {"$set": {"status": "finished",
+                                                        "finished_at": time.strftime("%Y-%m-%d %H:%M:%S")}})
+
+    def reset(self):
+        self.col.delete_many({})
+
+    def _key(self, url):
+        return f"{self.run_id}:{url}"
+
+    # --- AJOUT ---
+    def add_listing(self, url, category, page, empty_streak=0):
+        self.col.update_one({"_id": self._key(url)}, {"$setOnInsert": {
+            "url": url, "kind": "listing", "category": category, "categories": [category], "page": page,
+            "empty_streak": empty_streak, **self._fresh()}}, upsert=True)
+
+    def add_recipes(self, urls, category):
+        """Ajoute les URLs inconnues du crawl et note la catégorie de toutes ; renvoie le nombre de liens
+        nouveaux pour cette catégorie (comme `CrawlFrontier.add_recipes`)."""
+        if not urls:
+            return 0
+        ops = [UpdateOne({"_id": self._key(u)},
+                         {"$setOnInsert": {"url": u, "kind": "recipe", "category": category, "page": None,
+                                           **self._fresh()},
+                          "$addToSet": {"categories": category}}, upsert=True)
+               for u in urls]
+        result = self.col.bulk_write(ops, ordered=False)
+        # URL nouvelle (upsert) ou déjà en file sans cette catégorie ($addToSet effectif)
+        return result.upserted_count + result.modified_count
+
+    def _fresh(self):
+        return {"run": self.run_id, "status": "pending", "attempts": 0, "leases": 0, "next_attempt_at": 0.0, "owner": None}
+
+    # --- RÉSERVATION ---
+    def _claimable(self, now):
+        return {"run": self.run_id, "$or": [
+            {"status": "pending"},
+            {"status": "failed", "attempts": {"$lt": self.max_attempts}, "next_attempt_at": {"$lte": now}},
+            # Bail expiré : worker mort ou bloqué ; abandon si l'URL fait tomber les workers à chaque fois
+            {"status": "leased", "lease_until": {"$lt": now}, "leases": {"$lt": self.max_attempts}},
+        ]}
+
+    def claim(self, limit=CLAIM_BATCH):
+        """Réserve jusqu'à `limit` URLs (pages de liste d'abord) ; chaque réservation est atomique."""
+        items = []
+        for _ in range(limit):
+            now = time.time()
+            doc = self.col.find_one_and_update(
+                self._claimable(now),
+                {"$set": {"status": "leased", "owner": self.worker, "lease_until": now + self.lease_seconds},
+                 "$inc": {"leases": 1}},
+                sort=[("kind", ASCENDING), ("page", ASCENDING)],
+                return_document=ReturnDocument.AFTER)
+            if doc is None:
+                break
+            if doc["leases"] > 1:
+                metrics.inc("scraper_queue_reclaimed_total", kind=doc["kind"])
+            items.append(doc)
+        return items
+
+    def extend_leases(self):
+        return self.col.update_many({"run": self.run_id, "owner": self.worker, "status": "leased"},
+                                    {"$set": {"lease_until": time.time() + self.lease_seconds}}).modified_count
+
+    @contextmanager
+    def heartbeat(self):
+        """Prolonge les baux du worker en tâche de fond tant que le bloc s'exécute."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    self.extend_leases()
+                except Exception as e:
+                    logger.warning(f" Heartbeat file de travail : {e}")
+
+        thread = threading.Thread(target=beat, name="queue-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def release(self):
+        """Arrêt propre : les URLs réservées et pas encore faites repassent en file tout de suite."""
+        released = self.col.update_many({"run": self.run_id, "owner": self.worker, "status": "leased"},
+                                        {"$set": {"status": "pending", "owner": None}, "$inc": {"leases": -1}})
+        if released.modified_count:
+            logger.info(f" {released.modified_count} URLs rendues à la file.")
+
+    # --- MISE À JOUR ---
+    def categories_of(self, urls):
+        return {doc["url"]: doc.get("categories") or [doc["category"]]
+                for doc in self.col.find({"_id": {"$in": [self._key(u) for u in urls]}},
+                                         {"url": 1, "categories": 1, "category": 1})}
+
+    def _owned(self, url):
+        # Bail toujours à nous : un worker dont le bail a expiré ne touche pas l'URL reprise par un autre
+        return {"_id": self._key(url), "owner": self.worker, "status": "leased"}
+
+    def _lease_lost(self, url):
+        logger.warning(f" Bail perdu pour {url} (reprise par un autre worker) : résultat ignoré.")
+        return False
+
+    def mark_done(self, url, result=None):
+        # `pushed` : la recette est partie dans le sink (vérifiée par le coordinateur en fin de run)
+        updated = self.col.update_one(self._owned(url), {"$set": {"status": "done", "owner": None, "last_error": None,
+                                                                  "pushed": result is not None,
+                                                                  "done_at": time.time()}})
+        return bool(updated.modified_count) or self._lease_lost(url)
+
+    def mark_failed(self, url, error):
+        doc = self.col.find_one(self._owned(url), {"attempts": 1, "kind": 1})
+        if doc is None:
+            return self._lease_lost(url)
+        attempts = doc["attempts"] + 1
+        metrics.inc("scraper_failures_total", kind=doc["kind"], type=error_type(error))
+        # Backoff exponentiel : 30 s, 1 min, 2 min... plafonné à backoff_max
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        updated = self.col.update_one(self._owned(url), {"$set": {"status": "failed", "attempts": attempts,
+                                                                  "owner": None, "next_attempt_at": time.time() + delay,
+                                                                  "last_error": str(error)[:500]}})
+        if not updated.modified_count:
+            return self._lease_lost(url)
+        if attempts >= self.max_attempts:
+            logger.error(f" Abandon après {attempts} essais : {url} ({error})")
+        return True
+
+    # --- SUIVI (COORDINATEUR) ---
+    def outstanding(self):
+        """URLs encore à faire : en attente, réservées, ou en échec réessayable."""
+        return self.col.count_documents({"run": self.run_id, "$or": [
+            {"status": "pending"},
+            {"status": "leased", "$or": [{"lease_until": {"$gte": time.time()}},
+                                         {"leases": {"$lt": self.max_attempts}}]},
+            {"status": "failed", "attempts": {"$lt": self.max_attempts}},
+        ]})
+
+    def counts(self):
+        rows = self.col.aggregate([{"$match": {"run": self.run_id}}, {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "n": {"$sum": 1}}}])
+        return {f"{r['_id']['kind']}:{r['_id']['status']}": r["n"] for r in rows}
+
+    def requeue_missing(self, collection):
+        """Recettes marquées faites mais absentes de `collection` (worker mort avant l'écriture de son
+        lot) : remises en file. Renvoie leur nombre."""
+        urls = [doc["url"] for doc in self.col.find({"run": self.run_id, "kind": "recipe", "status": "done", "pushed": True},
+                                                    {"url": 1})]
+        missing = []
+        for i in range(0, len(urls), 1000):
+            chunk = {url_id(u): u for u in urls[i:i + 1000]}
+            present = {d["product_id"] for d in collection.find({"product_id": {"$in": list(chunk)}},
+                                                                 {"_id": 0, "product_id": 1})}
+            missing += [u for pid, u in chunk.items() if pid not in present]
+        if missing:
+            self.col.update_many({"_id": {"$in": [self._key(u) for u in missing]}}, {"$set": {"status": "pending", "owner": None}})
+            metrics.inc("scraper_queue_requeued_total", len(missing))
+            logger.warning(f" {len(missing)} recettes perdues par un worker remises en file.")
+        return len(missing)